@@ -0,0 +1,9 @@
+"""
+性能基准测试
+
+generate 按固定随机种子生成合成的家庭用药数据，scenarios 定义与界面操作对应的计时场景
+（添加、修改、搜索、加载表格、提醒检查、购买清单），run 在不同数据量下执行并把结果写成JSON，
+可以与之前版本的结果比较。只使用数据层，不需要图形界面。
+
+用法: python3 -m benchmarks [--sizes 1000 10000] [--out 结果.json] [--baseline 旧结果.json]
+"""
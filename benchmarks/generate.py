@@ -0,0 +1,108 @@
+"""
+合成家庭用药数据
+
+按固定随机种子生成 N 个家庭 × 每家2-4位使用人 × 每人1-6种常见慢性病药物，
+用量、每盒片数取自药物的常见规格，购药日期分布在基准日期之前的120天内，
+同样的种子和行数总是生成同样的数据，便于不同版本之间比较。
+
+命令行用法: python3 -m benchmarks.generate 数据库路径 --rows 10000 [--seed 1] [--today YYYY-MM-DD]
+"""
+
+import argparse
+import random
+import sys
+from datetime import date, timedelta
+from itertools import islice
+
+from family_medicine.repository import MedicineRepository, calculate_next_purchase_date
+
+DEFAULT_SEED = 20240501
+BATCH_SIZE = 5000
+# 购药日期距基准日期的最大天数
+MAX_PURCHASE_AGE_DAYS = 120
+
+ROLES = ("爸爸", "妈妈", "爷爷", "奶奶", "外婆", "外爷", "儿子", "女儿")
+
+# (品名及规格, 常见每日片数, 常见每盒片数)
+CATALOGUE = (
+    ("苯磺酸氨氯地平片 5mg", (1,), (7, 14, 28)),
+    ("硝苯地平控释片 30mg", (1,), (7, 12)),
+    ("缬沙坦胶囊 80mg", (1, 2), (7, 14, 28)),
+    ("厄贝沙坦片 150mg", (1,), (7, 14)),
+    ("酒石酸美托洛尔片 25mg", (1, 2), (20, 30)),
+    ("盐酸二甲双胍缓释片 0.5g", (2, 3, 4), (30, 60)),
+    ("阿卡波糖片 50mg", (3,), (30,)),
+    ("格列美脲片 2mg", (0.5, 1), (30,)),
+    ("阿托伐他汀钙片 20mg", (1,), (7, 28)),
+    ("瑞舒伐他汀钙片 10mg", (0.5, 1), (7, 28)),
+    ("阿司匹林肠溶片 100mg", (1,), (30, 60)),
+    ("硫酸氢氯吡格雷片 75mg", (1,), (7, 28)),
+    ("左甲状腺素钠片 50μg", (0.5, 1, 1.5, 2), (100,)),
+    ("别嘌醇片 0.1g", (1, 2, 3), (100,)),
+    ("非布司他片 40mg", (0.5, 1), (16,)),
+    ("呋塞米片 20mg", (0.5, 1), (100,)),
+    ("螺内酯片 20mg", (1, 2), (100,)),
+    ("单硝酸异山梨酯缓释片 40mg", (1,), (24,)),
+    ("碳酸钙D3片 600mg", (1, 2), (60,)),
+    ("骨化三醇软胶囊 0.25μg", (1, 2), (10,)),
+)
+
+
+def households(seed=DEFAULT_SEED, today=None):
+    """逐个家庭生成药物，返回写入参数（顺序同 MedicineRepository.add）的迭代器，行数不限"""
+    rng = random.Random(seed)
+    today = today or date.today()
+    household = 0
+    while True:
+        household += 1
+        for role in rng.sample(ROLES, rng.randint(2, 4)):
+            user_name = f"{household:07d}号家庭·{role}"
+            for name_spec, doses, box_sizes in rng.sample(CATALOGUE, rng.randint(1, 6)):
+                daily_pills = rng.choice(doses)
+                pills_per_box = rng.choice(box_sizes)
+                boxes_purchased = rng.randint(1, 6)
+                purchase_date = (today - timedelta(days=rng.randint(0, MAX_PURCHASE_AGE_DAYS))).isoformat()
+                notes = "饭后服用" if rng.random() < 0.2 else ""
+                yield (name_spec, user_name, daily_pills, pills_per_box, boxes_purchased, purchase_date,
+                       calculate_next_purchase_date(daily_pills, pills_per_box, boxes_purchased, purchase_date),
+                       notes)
+
+
+def medicines(rows, seed=DEFAULT_SEED, today=None):
+    """前 rows 行合成数据"""
+    return islice(households(seed, today), rows)
+
+
+def populate(repo, rows, seed=DEFAULT_SEED, today=None) -> int:
+    """把 rows 行合成数据分批写入数据库（一个事务），返回写入的行数"""
+    source = medicines(rows, seed, today)
+
+    def batches():
+        while True:
+            batch = list(islice(source, BATCH_SIZE))
+            if not batch:
+                return
+            yield batch
+
+    return repo.import_rows(batches())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="生成合成的家庭用药数据")
+    parser.add_argument('db', help="数据库路径（已有数据时追加或更新）")
+    parser.add_argument('--rows', type=int, default=10000, help="生成的药物行数，默认10000")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help="随机种子")
+    parser.add_argument('--today', type=date.fromisoformat, help="基准日期 YYYY-MM-DD，默认今天")
+    args = parser.parse_args(argv)
+
+    repo = MedicineRepository(args.db)
+    try:
+        count = populate(repo, args.rows, args.seed, args.today)
+    finally:
+        repo.close()
+    print(f"已生成 {count} 行到 {args.db}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+"""
+执行基准测试并输出JSON
+
+每个数据量先生成（或复用缓存的）合成数据库，复制一份后依次执行各场景：
+每个场景先预热，再重复执行直到达到重复次数或时间上限，记录每次耗时的中位数、p95、最小值等。
+结果写成JSON；指定 --baseline 时与之前的结果逐项比较，中位数变慢超过阈值的列为性能退化。
+
+命令行用法:
+    python3 -m benchmarks [--sizes 1000 10000 100000 1000000] [--scenarios search add]
+                          [--repeat 50] [--out 结果.json] [--baseline 旧结果.json] [--workdir 目录]
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+from family_medicine.repository import MedicineRepository
+
+from .generate import DEFAULT_SEED, populate
+from .scenarios import SCENARIOS, SCENARIOS_BY_NAME, Context
+
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+DEFAULT_REPEAT = 50
+WARMUP = 3
+# 每个场景的最长计时时间（秒），数据量大时减少重复次数
+TIME_LIMIT_SECONDS = 10
+# 中位数变慢超过此比例视为性能退化
+REGRESSION_THRESHOLD = 1.2
+# 结果文件格式版本
+FORMAT_VERSION = 1
+
+
+def percentile(sorted_values, fraction):
+    """已排序数据的百分位数（线性插值）"""
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(samples_ms):
+    values = sorted(samples_ms)
+    return {
+        'repeat': len(values),
+        'median_ms': round(statistics.median(values), 4),
+        'p95_ms': round(percentile(values, 0.95), 4),
+        'min_ms': round(values[0], 4),
+        'max_ms': round(values[-1], 4),
+        'mean_ms': round(statistics.fmean(values), 4),
+    }
+
+
+def time_scenario(scenario, ctx, repeat, time_limit=TIME_LIMIT_SECONDS, clock=time.perf_counter):
+    """执行一个场景，返回每次耗时（毫秒）"""
+    for _ in range(WARMUP):
+        scenario.run(ctx)
+    samples = []
+    deadline = clock() + time_limit
+    while len(samples) < repeat:
+        started = clock()
+        scenario.run(ctx)
+        samples.append((clock() - started) * 1000)
+        if clock() > deadline:
+            break
+    return samples
+
+
+def template_db(workdir, rows, seed, today, log):
+    """缓存的合成数据库（不存在时生成），同样的行数、种子和基准日期只生成一次"""
+    path = os.path.join(workdir, f"bench-{rows}-{seed}-{today.isoformat()}.db")
+    if os.path.exists(path):
+        return path
+    log(f"生成 {rows} 行合成数据...")
+    started = time.perf_counter()
+    temp_path = path + '.part'
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    repo = MedicineRepository(temp_path)
+    try:
+        populate(repo, rows, seed, today)
+    finally:
+        repo.close()
+    os.replace(temp_path, path)
+    log(f"生成完成，用时 {time.perf_counter() - started:.1f} 秒")
+    return path
+
+
+def run_size(workdir, rows, scenarios, repeat, seed, today, log):
+    """在 rows 行数据上执行各场景，返回结果列表"""
+    path = os.path.join(workdir, f"run-{rows}.db")
+    shutil.copyfile(template_db(workdir, rows, seed, today, log), path)
+    repo = MedicineRepository(path)
+    results = []
+    try:
+        ctx = Context(repo, rows, today, seed)
+        for scenario in scenarios:
+            stats = summarize(time_scenario(scenario, ctx, repeat))
+            log(f"{rows:>8} 行  {scenario.name:<20} 中位数 {stats['median_ms']:9.3f} ms  "
+                f"p95 {stats['p95_ms']:9.3f} ms  ({stats['repeat']} 次)")
+            results.append({'rows': rows, 'scenario': scenario.name, **stats})
+    finally:
+        repo.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    return results
+
+
+def git_revision():
+    """当前代码的git版本，不是git仓库时为None"""
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment():
+    return {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+    }
+
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """逐项比较中位数，返回 [(行数, 场景, 旧中位数, 新中位数, 比值, 是否退化)]"""
+    old = {(result['rows'], result['scenario']): result for result in baseline['results']}
+    rows = []
+    for result in current['results']:
+        previous = old.get((result['rows'], result['scenario']))
+        if previous is None or not previous['median_ms']:
+            continue
+        ratio = result['median_ms'] / previous['median_ms']
+        rows.append((result['rows'], result['scenario'], previous['median_ms'], result['median_ms'],
+                     ratio, ratio > threshold))
+    return rows
+
+
+def format_comparison(comparison):
+    lines = []
+    for rows, scenario, old_ms, new_ms, ratio, regressed in comparison:
+        flag = "  ← 变慢" if regressed else ""
+        lines.append(f"{rows:>8} 行  {scenario:<20} {old_ms:9.3f} → {new_ms:9.3f} ms  ×{ratio:.2f}{flag}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python3 -m benchmarks', description="数据层性能基准测试")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help="数据量（行数）")
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS_BY_NAME),
+                        help="只执行指定的场景，默认全部")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help="每个场景的重复次数")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help="合成数据的随机种子")
+    parser.add_argument('--today', type=date.fromisoformat, help="基准日期 YYYY-MM-DD，默认今天")
+    parser.add_argument('--workdir', help="合成数据库缓存目录，默认为系统临时目录下的 family-medicine-bench")
+    parser.add_argument('--out', help="结果JSON文件，默认只输出到终端")
+    parser.add_argument('--baseline', help="之前的结果JSON，比较后有性能退化时退出码为1")
+    args = parser.parse_args(argv)
+
+    today = args.today or date.today()
+    workdir = args.workdir or os.path.join(tempfile.gettempdir(), 'family-medicine-bench')
+    os.makedirs(workdir, exist_ok=True)
+    scenarios = [SCENARIOS_BY_NAME[name] for name in args.scenarios] if args.scenarios else SCENARIOS
+
+    def log(message):
+        print(message, file=sys.stderr)
+
+    results = []
+    for rows in args.sizes:
+        results.extend(run_size(workdir, rows, scenarios, args.repeat, args.seed, today, log))
+    report = {
+        'format': FORMAT_VERSION,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'seed': args.seed,
+        'today': today.isoformat(),
+        'environment': environment(),
+        'results': results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        log(f"结果已写入 {args.out}")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            comparison = compare(json.load(f), report)
+        log(format_comparison(comparison))
+        if any(regressed for *_, regressed in comparison):
+            return 1
+    return 0
@@ -0,0 +1,117 @@
+"""
+计时场景
+
+每个场景对应界面上的一个操作，只执行该操作访问数据层的部分（与界面代码调用的方法相同），
+一次调用就是一次计时。场景之间共享 Context：数据库、随机数和基准日期。
+"""
+
+import random
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple
+
+from family_medicine.days import to_day
+from family_medicine.report import purchase_list_text, reminder_text
+from family_medicine.repository import calculate_next_purchase_date
+
+# 与界面一致：VirtualTable 默认15行可见、前后各多读10行；搜索线程第一页50行
+TABLE_PAGE = 15 + 2 * 10
+SEARCH_PAGE = 50
+REMINDER_DAYS = 2
+
+# 搜索关键字：药名（FTS）、使用人、备注和短关键字（LIKE）
+SEARCH_TERMS = ("氨氯地平", "二甲双胍缓释片", "家庭·奶奶", "饭后服用", "0000042", "片", "钙")
+
+
+class Context:
+    """场景共享的状态"""
+
+    def __init__(self, repo, rows, today, seed=0):
+        self.repo = repo
+        self.rows = rows
+        self.today = today
+        self.today_day = to_day(today)
+        self.rng = random.Random(seed)
+        self.max_id = repo.conn.execute('SELECT IFNULL(MAX(id), 0) FROM medicines').fetchone()[0]
+        self.counter = 0
+
+    def random_id(self):
+        return self.rng.randint(1, self.max_id)
+
+
+class Scenario(NamedTuple):
+    name: str
+    description: str
+    run: Callable[[Context], object]
+
+
+def add(ctx):
+    """添加药物：重名检查 + 写入"""
+    ctx.counter += 1
+    user_name = f"基准测试·{ctx.counter}"
+    name_spec = "阿司匹林肠溶片 100mg"
+    purchase_date = ctx.today.isoformat()
+    if ctx.repo.name_exists(user_name, name_spec):
+        return None
+    return ctx.repo.add(name_spec, user_name, 1, 30, 2, purchase_date,
+                        calculate_next_purchase_date(1, 30, 2, purchase_date), "")
+
+
+def edit(ctx):
+    """修改药物：读取 + 重名检查 + 保存（购药日期变化，快照重置）"""
+    medicine = None
+    while medicine is None:
+        medicine = ctx.repo.get(ctx.random_id())
+    purchase_date = (ctx.today - timedelta(days=ctx.rng.randint(0, 30))).isoformat()
+    if ctx.repo.name_exists(medicine.user_name, medicine.name_spec, exclude_id=medicine.id):
+        return None
+    return ctx.repo.update(medicine.id, medicine.name_spec, medicine.user_name, medicine.daily_pills,
+                           medicine.pills_per_box, medicine.boxes_purchased, purchase_date,
+                           calculate_next_purchase_date(medicine.daily_pills, medicine.pills_per_box,
+                                                        medicine.boxes_purchased, purchase_date),
+                           medicine.notes)
+
+
+def search(ctx):
+    """搜索：结果数量 + 第一页（与后台搜索线程相同）"""
+    term = SEARCH_TERMS[ctx.rng.randrange(len(SEARCH_TERMS))]
+    return ctx.repo.count(term), ctx.repo.page(0, SEARCH_PAGE, term)
+
+
+def load_data(ctx):
+    """加载表格：总行数 + 可见窗口"""
+    return ctx.repo.count(), ctx.repo.page(0, TABLE_PAGE)
+
+
+def check_reminders(ctx):
+    """提醒检查：需要购买的药物 + 提醒内容"""
+    report = ctx.repo.due_report(ctx.today_day, REMINDER_DAYS)
+    return reminder_text(report) if report.total else ""
+
+
+def pending_reminders(ctx):
+    """增量提醒检查：只查询新出现或分组升级的提醒并记录（预热后为没有变化时的开销）"""
+    now = datetime.combine(ctx.today, datetime.min.time())
+    batch = ctx.repo.pending_reminders(ctx.today_day, REMINDER_DAYS, now)
+    if not batch.keys:
+        return ""
+    ctx.repo.mark_reminded(batch.keys, now)
+    return reminder_text(batch.report)
+
+
+def show_purchase_list(ctx):
+    """查看需要购买药物清单"""
+    return purchase_list_text(ctx.repo.due_report(ctx.today_day, REMINDER_DAYS))
+
+
+# 只读场景在前，写入场景在后，写入不影响只读场景的数据（pending_reminders 只写提醒状态表）
+SCENARIOS: List[Scenario] = [
+    Scenario('load_data', load_data.__doc__, load_data),
+    Scenario('search', search.__doc__, search),
+    Scenario('check_reminders', check_reminders.__doc__, check_reminders),
+    Scenario('pending_reminders', pending_reminders.__doc__, pending_reminders),
+    Scenario('show_purchase_list', show_purchase_list.__doc__, show_purchase_list),
+    Scenario('add', add.__doc__, add),
+    Scenario('edit', edit.__doc__, edit),
+]
+
+SCENARIOS_BY_NAME: Dict[str, Scenario] = {scenario.name: scenario for scenario in SCENARIOS}
@@ -0,0 +1,12 @@
+"""
+家庭慢性病患者药物管理系统 - 核心数据层
+Family Chronic Disease Patient Medication Management System - core package
+
+本包不依赖tkinter，可在无图形界面的环境中使用。
+
+作者: Baichua Wen
+邮箱: sccxboy@gmail.com
+许可证: GPL-3+
+"""
+
+__version__ = "1.0.0"
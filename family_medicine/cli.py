@@ -0,0 +1,174 @@
+"""
+无图形界面的买药提醒检查
+
+只导入数据层（不导入tkinter、tkcalendar），查询需要购买的药物后输出并退出，
+可以由cron或systemd定时器驱动，在没有桌面的机器上也能提醒。
+
+命令行用法:
+    family-medicine-manager --check [--notify] [--new-only] [--days N] [--db 数据库路径]
+    family-medicine-manager --list-due [--days N] [--db 数据库路径]
+    family-medicine-manager --check|--list-due --household 家庭名称 [--root 分库根目录]
+    family-medicine-manager --check|--list-due --all-households [--root 分库根目录] [--workers N]
+
+--check 有需要购买的药物时输出提醒内容，没有时不输出，
+加 --notify 时同时按设置的通知方式发送（默认桌面通知，见 notify.py），发送完成后才退出；
+适合cron（只有有输出时才发邮件）；加 --new-only 时只输出新出现或分组升级的提醒，并记录为已提醒
+（与图形界面共用提醒状态，见 repository.pending_reminders），频繁运行也不会重复提醒；
+同时加 --notify 时只有通知全部发送成功才记录，发送失败的提醒下次运行时重新发送。--list-due 每种药物输出一行，字段用制表符分隔。
+--all-households 用进程池并行检查分库根目录下的全部家庭（见 households.py），结果按家庭输出或归并成一个列表。
+退出码: 0 没有需要购买的药物，1 有需要购买的药物，2 出错（包括通知没有全部发送成功）。
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+from .days import to_day, today_day
+from .repository import BUCKET_NAMES, MedicineRepository
+from .report import reminder_text
+
+
+def send_notification(sinks, title, message) -> bool:
+    """按 sinks 发送通知并等待完成，全部发送成功时返回True，失败的原因输出到标准错误"""
+    # 只在需要通知时导入，不拖慢 --check 的启动
+    from .notify import notification, send_now
+    if send_now(sinks, notification(title, message, key='reminder')):
+        return True
+    print("通知没有全部发送成功", file=sys.stderr)
+    return False
+
+
+def check(repo, reminder_days, notify=None, out=sys.stdout, new_only=False) -> int:
+    """检查需要购买的药物，有时输出提醒内容并返回1，没有时返回0；notify 为通知渠道列表，发送失败时返回2
+
+    new_only 为True时只检查需要发出的提醒（新出现、分组升级或推迟到期），输出并发送成功后记录为已提醒。
+    """
+    if new_only:
+        now = datetime.now()
+        batch = repo.pending_reminders(to_day(now), reminder_days, now)
+        report = batch.report
+    else:
+        report = repo.due_report(today_day(), reminder_days)
+    if not report.total:
+        return 0
+    content = reminder_text(report)
+    out.write(content)
+    if notify and not send_notification(notify, "买药提醒", content):
+        # 不记录为已提醒，下次运行时重新发送
+        return 2
+    if new_only:
+        repo.mark_reminded(batch.keys, now)
+    return 1
+
+
+def list_due(repo, reminder_days, out=sys.stdout) -> int:
+    """每行输出一种需要购买的药物：状态、品名及规格、使用人、下次需买药时间、剩余天数"""
+    total = 0
+    for bucket, medicine in repo.iter_due(today_day(), reminder_days):
+        out.write(f"{BUCKET_NAMES[bucket]}\t{medicine.name_spec}\t{medicine.user_name}\t"
+                  f"{medicine.next_purchase_date}\t{medicine.days_left}\n")
+        total += 1
+    return 1 if total else 0
+
+
+def check_households(result, notify=None, out=sys.stdout) -> int:
+    """按家庭输出全部家庭的提醒内容，有需要购买的药物时返回1，通知发送失败时返回2"""
+    if not result.total:
+        return 0
+    for household, report in sorted(result.reports.items()):
+        out.write(f"【{household}】")
+        out.write(reminder_text(report))
+    if notify and not send_notification(
+            notify, "买药提醒", f"{len(result.reports)} 个家庭共 {result.total} 种药物需要购买"):
+        return 2
+    return 1
+
+
+def list_due_households(result, out=sys.stdout) -> int:
+    """全部家庭需要购买的药物归并成一个列表，每行第一列为家庭"""
+    for due in result.medicines():
+        medicine = due.medicine
+        out.write(f"{due.household}\t{BUCKET_NAMES[due.bucket]}\t{medicine.name_spec}\t{medicine.user_name}\t"
+                  f"{medicine.next_purchase_date}\t{medicine.days_left}\n")
+    return 1 if result.total else 0
+
+
+def sweep(args) -> int:
+    """--all-households：并行检查全部家庭（--notify 时只发送桌面通知，各家庭的通知设置不适用于汇总）"""
+    from .households import sweep_due
+    from .notify import DesktopSink
+
+    result = sweep_due(today_day(), args.days, root=args.root, workers=args.workers)
+    for household, error in sorted(result.errors.items()):
+        print(f"检查家庭 {household} 失败: {error}", file=sys.stderr)
+    status = check_households(result, [DesktopSink()] if args.notify else None) if args.check \
+        else list_due_households(result)
+    return 2 if result.errors else status
+
+
+def main(argv=None):
+    try:
+        return run(argv)
+    except BrokenPipeError:
+        # 输出被 head 等提前关闭：不再输出，也不打印异常
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+
+
+def run(argv=None):
+    parser = argparse.ArgumentParser(prog='family-medicine-manager',
+                                     description="不启动图形界面，检查需要购买的药物（不带参数时启动图形界面）")
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument('--check', action='store_true', help="有需要购买的药物时输出提醒内容")
+    action.add_argument('--list-due', action='store_true', help="列出需要购买的药物，每行一种")
+    parser.add_argument('--notify', action='store_true', help="同时按设置的通知方式发送（默认桌面通知），只用于 --check")
+    parser.add_argument('--new-only', action='store_true',
+                        help="只输出新出现或分组升级的提醒并记录为已提醒，只用于 --check（不支持 --all-households）")
+    parser.add_argument('--days', type=int, help="断药提前检测天数，默认使用程序中的设置")
+    database = parser.add_mutually_exclusive_group()
+    database.add_argument('--db', help="数据库路径，默认 ~/.family-medicine-manager/medicine.db")
+    database.add_argument('--household', help="检查指定家庭的分库")
+    database.add_argument('--all-households', action='store_true', help="并行检查全部家庭的分库")
+    parser.add_argument('--root', help="家庭分库根目录，默认 ~/.family-medicine-manager/households")
+    parser.add_argument('--workers', type=int, help="--all-households 使用的进程数，默认为CPU核数")
+    args = parser.parse_args(argv)
+
+    if args.all_households and args.new_only:
+        parser.error("--new-only 不能与 --all-households 同时使用")
+    if args.all_households:
+        return sweep(args)
+    db_path = args.db
+    try:
+        if args.household:
+            from .households import household_db_path
+            db_path = household_db_path(args.household, args.root)
+        repo = MedicineRepository(db_path)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+    except sqlite3.Error as e:
+        print(f"打开数据库失败: {str(e)}", file=sys.stderr)
+        return 2
+    try:
+        days = args.days if args.days is not None else int(repo.get_setting('reminder_days', '2'))
+        if args.check:
+            sinks = None
+            if args.notify:
+                from .notify import build_sinks
+                sinks = build_sinks(repo.get_setting)
+            return check(repo, days, sinks, new_only=args.new_only)
+        return list_due(repo, days)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+    except sqlite3.Error as e:
+        print(f"查询失败: {str(e)}", file=sys.stderr)
+        return 2
+    finally:
+        repo.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
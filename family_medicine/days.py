@@ -0,0 +1,41 @@
+"""
+日期与整数天数序号的转换
+
+天数序号与 date.toordinal() 一致（0001-01-01 为1），SQL中用 julianday(日期) - 1721424.5 计算。
+数据库中的 purchase_day / next_purchase_day 列保存这个序号，
+范围查询和剩余天数直接用整数比较、相减，不需要逐行解析日期字符串。
+"""
+
+from datetime import date, datetime
+
+# julianday('0001-01-01') = 1721425.5，减去此值即得到 date.toordinal()
+JULIAN_DAY_OFFSET = 1721424.5
+
+
+def sql_day(column):
+    """把 YYYY-MM-DD 文本列转换成天数序号的SQL表达式（日期无效时为NULL）"""
+    return f"CAST(julianday({column}) - {JULIAN_DAY_OFFSET} AS INTEGER)"
+
+
+def sql_date(expression):
+    """把天数序号转换成 YYYY-MM-DD 文本的SQL表达式（sql_day 的逆运算）"""
+    return f"date({expression} + {JULIAN_DAY_OFFSET})"
+
+
+def to_day(value):
+    """date、datetime 或 YYYY-MM-DD 字符串转换为天数序号"""
+    if isinstance(value, str):
+        value = date.fromisoformat(value)
+    elif isinstance(value, datetime):
+        value = value.date()
+    return value.toordinal()
+
+
+def from_day(day):
+    """天数序号转换为date"""
+    return date.fromordinal(day)
+
+
+def today_day():
+    """今天的天数序号"""
+    return date.today().toordinal()
@@ -0,0 +1,128 @@
+"""
+数据库连接管理
+
+界面线程、搜索线程、提醒线程和导入导出任务各自使用独立的连接（sqlite3连接不能在线程间共享使用），
+ConnectionPool 按线程分配连接：每个线程第一次访问时创建，之后一直复用，退出程序时统一关闭；
+线程没有调用 release() 就结束时，连接随线程局部变量一起回收并关闭。
+所有连接都使用WAL日志模式：读取不会被写入阻塞，写入也不会被读取阻塞，
+提醒扫描、后台搜索和界面上的增删改可以同时进行；同时写入时按 busy_timeout 等待而不是立即报“database is locked”。
+只读连接池（read_only=True，例如并行检查全部家庭时）用 mode=ro 打开，不修改数据库文件和日志模式。
+"""
+
+import os
+import sqlite3
+import threading
+import weakref
+from urllib.parse import quote
+
+# 等待其他连接释放写锁的最长时间（毫秒）
+BUSY_TIMEOUT_MS = 10000
+
+
+def configure_connection(conn):
+    """设置连接参数：WAL日志、写锁等待时间、同步级别"""
+    conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+    # WAL模式记录在数据库文件中，设置一次后对所有连接生效
+    conn.execute('PRAGMA journal_mode = WAL')
+    # WAL模式下NORMAL不会损坏数据库，断电时最多丢失最后几个事务，写入快得多
+    conn.execute('PRAGMA synchronous = NORMAL')
+
+
+def connect_read_only(db_path):
+    """只读打开数据库（文件不存在时报错，不会创建空数据库）"""
+    # 不用 urllib.request.pathname2url：导入它会连带导入 http.client 和 email，拖慢 --check 的启动
+    path = os.path.abspath(db_path).replace(os.sep, '/')
+    if not path.startswith('/'):
+        path = '/' + path    # Windows: C:/... -> /C:/...
+    uri = 'file:' + quote(path, safe='/:') + '?mode=ro'
+    conn = sqlite3.connect(uri, uri=True, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+    return conn
+
+
+class _ThreadConnection:
+    """保存在线程局部变量中的连接，线程结束时被回收"""
+    __slots__ = ('conn', '__weakref__')
+
+    def __init__(self, conn):
+        self.conn = conn
+
+
+class ConnectionPool:
+    """按线程分配的连接池
+
+    connection() 返回当前线程的连接；线程结束前可以调用 release() 归还（关闭）自己的连接，
+    close_all() 关闭所有线程的连接，之后不能再获取连接。
+    read_only 为True时所有连接都以只读方式打开。
+    """
+
+    def __init__(self, db_path, read_only=False):
+        self.db_path = db_path
+        self.read_only = read_only
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = {}  # 连接 -> (使用它的线程, 线程结束时关闭连接的 finalize)
+        self._closed = False
+
+    def connection(self):
+        """当前线程的连接，第一次调用时创建"""
+        holder = getattr(self._local, 'holder', None)
+        if holder is not None:
+            return holder.conn
+        with self._lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("连接池已关闭")
+            # 由连接池保证每个连接只在创建它的线程中使用；关闭时由主线程统一关闭
+            if self.read_only:
+                conn = connect_read_only(self.db_path)
+            else:
+                conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+                configure_connection(conn)
+            holder = _ThreadConnection(conn)
+            # 线程结束时线程局部变量被清除，holder 被回收后关闭连接并从连接池中移除
+            finalizer = weakref.finalize(holder, self._discard, conn)
+            self._connections[conn] = (threading.current_thread(), finalizer)
+        self._local.holder = holder
+        return conn
+
+    def release(self):
+        """关闭当前线程的连接（后台任务结束时调用）"""
+        holder = getattr(self._local, 'holder', None)
+        if holder is None:
+            return
+        self._local.holder = None
+        with self._lock:
+            entry = self._connections.pop(holder.conn, None)
+        if entry is not None:
+            entry[1].detach()
+        holder.conn.close()
+
+    def _discard(self, conn):
+        """线程没有 release() 就结束时关闭它的连接"""
+        with self._lock:
+            if self._connections.pop(conn, None) is None:
+                return
+        _close(conn)
+
+    def close_all(self):
+        """关闭全部连接
+
+        其他线程仍在使用的连接也会被关闭，调用前应先停止或等待使用数据库的后台线程。
+        """
+        with self._lock:
+            self._closed = True
+            entries, self._connections = list(self._connections.items()), {}
+        current = threading.current_thread()
+        for conn, (thread, finalizer) in entries:
+            finalizer.detach()
+            if thread is not current and thread.is_alive():
+                print(f"线程 {thread.name} 仍在使用数据库连接，关闭数据库后它的操作会失败")
+            _close(conn)
+        self._local = threading.local()
+
+
+def _close(conn):
+    try:
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"关闭数据库连接失败: {str(e)}")
@@ -0,0 +1,166 @@
+"""
+导出药物和需要购买药物清单
+
+数据直接从数据库游标逐批读取（fetchmany）并逐行写入文件，不在内存中拼出整个结果，
+导出10万行时内存占用也保持不变。支持CSV、JSON Lines和HTML三种格式，按文件扩展名选择。
+先写入同目录下的临时文件，完成后再替换目标文件，中途出错不会留下不完整的文件。
+导出的CSV表头与表格列标题一致，可以直接用 importer.py 重新导入。
+
+命令行用法: python3 -m family_medicine.exporter 输出.csv [--search 关键字 | --due [--days N]] [--db 数据库路径]
+"""
+
+import argparse
+import csv
+import html
+import json
+import os
+import sys
+
+from .days import today_day
+from .repository import BUCKET_NAMES, MedicineRepository
+
+# 每写多少行报告一次进度
+PROGRESS_EVERY = 1000
+
+FORMATS = {
+    '.csv': 'csv',
+    '.jsonl': 'jsonl',
+    '.json': 'jsonl',
+    '.html': 'html',
+    '.htm': 'html',
+}
+
+# (字段名, 列标题)
+MEDICINE_FIELDS = (
+    ('name_spec', '品名及规格'),
+    ('user_name', '使用人'),
+    ('daily_pills', '每日服用片数'),
+    ('pills_per_box', '每盒片数'),
+    ('boxes_purchased', '购买盒数'),
+    ('purchase_date', '购药日期'),
+    ('next_purchase_date', '下次需买药时间'),
+    ('notes', '备注'),
+)
+DUE_FIELDS = (
+    ('status', '状态'),
+    ('name_spec', '品名及规格'),
+    ('user_name', '使用人'),
+    ('next_purchase_date', '下次需买药时间'),
+    ('days_left', '剩余天数'),
+    ('notes', '备注'),
+)
+
+
+def format_for(path):
+    """按扩展名确定导出格式，不支持时抛出ValueError"""
+    extension = os.path.splitext(path)[1].lower()
+    try:
+        return FORMATS[extension]
+    except KeyError:
+        raise ValueError(f"不支持的导出格式: {extension or path}，请使用 .csv、.jsonl 或 .html")
+
+
+def _write_csv(f, fields, rows):
+    writer = csv.writer(f)
+    writer.writerow([title for _, title in fields])
+    for row in rows:
+        writer.writerow(row)
+        yield
+
+
+def _write_jsonl(f, fields, rows):
+    names = [name for name, _ in fields]
+    for row in rows:
+        f.write(json.dumps(dict(zip(names, row)), ensure_ascii=False))
+        f.write('\n')
+        yield
+
+
+def _write_html(f, fields, rows, title):
+    f.write('<!DOCTYPE html>\n<html lang="zh-CN">\n<head>\n<meta charset="utf-8">\n')
+    f.write(f'<title>{html.escape(title)}</title>\n')
+    f.write('<style>table{border-collapse:collapse}th,td{border:1px solid #ccc;padding:4px 8px}</style>\n')
+    f.write(f'</head>\n<body>\n<h1>{html.escape(title)}</h1>\n<table>\n<tr>')
+    f.write(''.join(f'<th>{html.escape(header)}</th>' for _, header in fields))
+    f.write('</tr>\n')
+    for row in rows:
+        f.write('<tr>')
+        f.write(''.join(f'<td>{html.escape("" if value is None else str(value))}</td>' for value in row))
+        f.write('</tr>\n')
+        yield
+    f.write('</table>\n</body>\n</html>\n')
+
+
+def write_rows(path, fields, rows, title, progress=None) -> int:
+    """把行逐行写入 path，格式由扩展名决定，progress(已写行数) 定期调用，返回写入的行数"""
+    fmt = format_for(path)
+    temp_path = path + '.part'
+    count = 0
+    # CSV带BOM，Excel才能正确识别中文
+    encoding = 'utf-8-sig' if fmt == 'csv' else 'utf-8'
+    try:
+        with open(temp_path, 'w', newline='' if fmt == 'csv' else None, encoding=encoding) as f:
+            if fmt == 'csv':
+                writer = _write_csv(f, fields, rows)
+            elif fmt == 'jsonl':
+                writer = _write_jsonl(f, fields, rows)
+            else:
+                writer = _write_html(f, fields, rows, title)
+            for _ in writer:
+                count += 1
+                if progress and count % PROGRESS_EVERY == 0:
+                    progress(count)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    if progress:
+        progress(count)
+    return count
+
+
+def export_medicines(repo, path, term="", progress=None) -> int:
+    """导出全部药物，指定关键字时只导出搜索结果，返回导出的行数"""
+    rows = (record[1:] for record in repo.iter_medicines(term))
+    title = f"药物清单（搜索: {term.strip()}）" if term.strip() else "药物清单"
+    return write_rows(path, MEDICINE_FIELDS, rows, title, progress)
+
+
+def export_due(repo, path, reminder_days, today=None, progress=None) -> int:
+    """导出今天起 reminder_days 天内需要购买的药物（包括已过期的），返回导出的行数"""
+    today = today_day() if today is None else today
+    rows = ((BUCKET_NAMES[bucket], medicine.name_spec, medicine.user_name, medicine.next_purchase_date,
+             medicine.days_left, medicine.notes)
+            for bucket, medicine in repo.iter_due(today, reminder_days))
+    return write_rows(path, DUE_FIELDS, rows, "需要购买药物清单", progress)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="导出药物或需要购买药物清单（CSV、JSON Lines、HTML）")
+    parser.add_argument('path', help="输出文件，按扩展名选择格式: .csv .jsonl .html")
+    view = parser.add_mutually_exclusive_group()
+    view.add_argument('--search', default="", help="只导出搜索结果")
+    view.add_argument('--due', action='store_true', help="导出需要购买药物清单")
+    parser.add_argument('--days', type=int, help="断药提前检测天数，默认使用程序中的设置")
+    parser.add_argument('--db', help="数据库路径，默认 ~/.family-medicine-manager/medicine.db")
+    args = parser.parse_args(argv)
+
+    repo = MedicineRepository(args.db)
+    try:
+        if args.due:
+            days = args.days if args.days is not None else int(repo.get_setting('reminder_days', '2'))
+            count = export_due(repo, args.path, days)
+        else:
+            count = export_medicines(repo, args.path, args.search)
+    except (OSError, ValueError) as e:
+        print(f"导出失败: {str(e)}", file=sys.stderr)
+        return 1
+    finally:
+        repo.close()
+    print(f"已导出 {count} 行到 {args.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
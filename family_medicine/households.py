@@ -0,0 +1,156 @@
+"""
+按家庭分库
+
+管理多个家庭时，每个家庭使用一个独立的数据库文件（分库）：<根目录>/<家庭名称>.db，
+根目录默认为 ~/.family-medicine-manager/households，可以用环境变量 FAMILY_MEDICINE_HOUSEHOLDS_ROOT 指定。
+新增家庭只是新增一个小文件，不会让单个表越来越大；各家庭互不影响，可以分别备份。
+
+提醒检查时 sweep_due 用进程池并行扫描全部分库（每个进程一个分库，各自的SQLite连接和CPU），
+再把各家庭已按（分组、剩余天数）排好序的结果归并成一个列表。
+扫描只读打开分库：不升级结构、不写入默认设置，结构版本过旧或文件无法打开的分库作为错误列出。
+"""
+
+import heapq
+import os
+import sqlite3
+from typing import Dict, List, NamedTuple, Optional
+
+from .repository import DB_DIR_NAME, DUE_BUCKETS, DueMedicine, DueReport, MedicineRepository
+
+ROOT_ENV = 'FAMILY_MEDICINE_HOUSEHOLDS_ROOT'
+# 设置后图形界面和命令行默认打开该家庭的分库
+HOUSEHOLD_ENV = 'FAMILY_MEDICINE_HOUSEHOLD'
+HOUSEHOLDS_DIR_NAME = "households"
+SHARD_SUFFIX = ".db"
+
+# 分库少于此数时在当前进程中依次扫描，进程池的启动开销不划算
+MIN_PARALLEL_SHARDS = 4
+
+
+class HouseholdDue(NamedTuple):
+    """合并后的一条提醒：家庭、分组和药物"""
+    household: str
+    bucket: int
+    medicine: DueMedicine
+
+
+class SweepResult(NamedTuple):
+    """全部家庭的提醒检查结果
+
+    reminder_days 为None时各家庭使用自己设置的断药提前检测天数（见各 DueReport.reminder_days）；
+    reports 为 家庭 -> DueReport（只包含有需要购买药物的家庭），
+    errors 为 家庭 -> 错误信息（无法打开或查询的分库，不影响其他家庭）。
+    """
+    today_day: int
+    reminder_days: Optional[int]
+    households: int
+    reports: Dict[str, DueReport]
+    errors: Dict[str, str]
+
+    @property
+    def total(self):
+        return sum(report.total for report in self.reports.values())
+
+    @property
+    def counts(self):
+        """各分组的药物数量（全部家庭合计）"""
+        return tuple(sum(report.counts[bucket] for report in self.reports.values()) for bucket in DUE_BUCKETS)
+
+    def medicines(self):
+        """全部家庭的提醒按（分组、剩余天数、家庭）归并，返回 HouseholdDue 的迭代器"""
+        def tagged(household, report):
+            for bucket, medicine in report.medicines():
+                yield HouseholdDue(household, bucket, medicine)
+
+        return heapq.merge(*(tagged(household, report) for household, report in sorted(self.reports.items())),
+                           key=lambda due: (due.bucket, due.medicine.days_left))
+
+
+def households_root(root=None):
+    """分库根目录：参数、环境变量 FAMILY_MEDICINE_HOUSEHOLDS_ROOT 或默认目录"""
+    return root or os.environ.get(ROOT_ENV) or os.path.join(
+        os.path.expanduser("~"), DB_DIR_NAME, HOUSEHOLDS_DIR_NAME)
+
+
+def validate_household(name) -> str:
+    """检查家庭名称可以用作文件名，返回去掉首尾空白的名称，不合法时抛出ValueError"""
+    name = (name or "").strip()
+    if not name or name.startswith('.') or any(ch in name for ch in '/\\:*?"<>|') or len(name) > 100:
+        raise ValueError(f"家庭名称不合法: {name!r}（不能为空、不能以点开头，不能包含 / \\ : * ? \" < > |）")
+    return name
+
+
+def household_db_path(household, root=None, create=True) -> str:
+    """家庭分库的文件路径，create 为True时创建根目录"""
+    household = validate_household(household)
+    root = households_root(root)
+    if create:
+        os.makedirs(root, exist_ok=True)
+    return os.path.join(root, household + SHARD_SUFFIX)
+
+
+def list_households(root=None) -> List[str]:
+    """根目录下全部家庭名称（按名称排序）"""
+    root = households_root(root)
+    try:
+        names = os.listdir(root)
+    except FileNotFoundError:
+        return []
+    return sorted(name[:-len(SHARD_SUFFIX)] for name in names
+                  if name.endswith(SHARD_SUFFIX) and not name.startswith('.'))
+
+
+def open_household(household, root=None) -> MedicineRepository:
+    """打开（不存在时创建）家庭分库"""
+    return MedicineRepository(household_db_path(household, root))
+
+
+def _scan_shard(job):
+    """在工作进程中扫描一个分库，返回 (家庭, DueReport或None, 错误信息或None)"""
+    household, path, today_day, reminder_days = job
+    repo = None
+    try:
+        repo = MedicineRepository(path, read_only=True)
+        if reminder_days is None:
+            reminder_days = int(repo.get_setting('reminder_days', '2'))
+        report = repo.due_report(today_day, reminder_days)
+    except (sqlite3.Error, ValueError) as e:
+        return household, None, str(e)
+    finally:
+        if repo is not None:
+            repo.close()
+    return household, report, None
+
+
+def sweep_due(today_day, reminder_days, root=None, households=None, workers=None) -> SweepResult:
+    """并行检查全部（或指定的）家庭在 reminder_days 天内需要购买的药物
+
+    reminder_days 为None时各家庭使用自己的设置。
+    workers 为进程数，默认为CPU核数；为1或分库很少时在当前进程中依次扫描。
+    """
+    households = list_households(root) if households is None else list(households)
+    jobs = [(household, household_db_path(household, root, create=False), today_day, reminder_days)
+            for household in households]
+    if workers == 1 or len(jobs) < MIN_PARALLEL_SHARDS:
+        results = map(_scan_shard, jobs)
+    else:
+        # 只在并行扫描时导入，命令行 --check 单个家庭时不需要
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # 每批交给工作进程多个分库，减少进程间通信次数
+            chunksize = max(1, len(jobs) // ((workers or os.cpu_count() or 1) * 4))
+            results = list(executor.map(_scan_shard, jobs, chunksize=chunksize))
+    reports = {}
+    errors = {}
+    for household, report, error in results:
+        if error is not None:
+            errors[household] = error
+        elif report.total:
+            reports[household] = report
+    return SweepResult(today_day, reminder_days, len(jobs), reports, errors)
+
+
+def default_db_path() -> Optional[str]:
+    """设置了环境变量 FAMILY_MEDICINE_HOUSEHOLD 时为该家庭的分库路径，否则为None"""
+    household = os.environ.get(HOUSEHOLD_ENV)
+    return household_db_path(household) if household else None
@@ -0,0 +1,219 @@
+"""
+从CSV/Excel文件批量导入药物
+
+逐行读取文件（CSV使用csv模块，Excel使用openpyxl的只读模式），不把整个文件读进内存；
+每行校验后按批写入，所有批次在同一个事务中完成，中途失败时整体回滚。
+同一使用人的品名及规格已存在时更新该记录（见 MedicineRepository.import_rows），
+下次需买药时间总是按购药日期和用量重新计算，文件中的该列会被忽略。
+有问题的行跳过并记录行号和原因，不影响其他行。
+
+命令行用法: python3 -m family_medicine.importer 文件.csv [--db 数据库路径]
+"""
+
+import argparse
+import csv
+import os
+import sys
+from datetime import date, datetime
+from typing import List, NamedTuple, Tuple
+
+from .repository import MedicineRepository, calculate_next_purchase_date
+
+# 字段 -> 可接受的表头（与表格列标题一致，也接受数据库列名）
+FIELD_HEADERS = {
+    'name_spec': ('品名及规格', 'name_spec'),
+    'user_name': ('使用人', 'user_name'),
+    'daily_pills': ('每日服用片数', 'daily_pills'),
+    'pills_per_box': ('每盒片数', 'pills_per_box'),
+    'boxes_purchased': ('购买盒数', 'boxes_purchased'),
+    'purchase_date': ('购药日期', 'purchase_date'),
+    'notes': ('备注', 'notes'),
+}
+OPTIONAL_FIELDS = ('notes',)
+
+# 每批写入的行数
+BATCH_SIZE = 500
+# 每读取多少行报告一次进度
+PROGRESS_EVERY = 1000
+
+
+class ImportResult(NamedTuple):
+    """导入结果，errors 为 (行号, 原因) 列表，行号与表格软件中看到的一致（表头为第1行）"""
+    total: int
+    imported: int
+    errors: List[Tuple[int, str]]
+
+
+def _read_csv(path):
+    # utf-8-sig 兼容Excel另存的带BOM的CSV
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        yield from csv.reader(f)
+
+
+def _read_xlsx(path):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError("导入Excel文件需要安装openpyxl（python3-openpyxl），也可以先另存为CSV")
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield row
+    finally:
+        workbook.close()
+
+
+def read_rows(path):
+    """按文件扩展名逐行读取，返回行（值的序列）的迭代器，第一行为表头"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return _read_csv(path)
+    if extension in ('.xlsx', '.xlsm'):
+        return _read_xlsx(path)
+    raise ValueError(f"不支持的文件类型: {extension or path}，请使用CSV或xlsx文件")
+
+
+def _column_positions(header):
+    """表头 -> {字段: 列序号}，缺少必需的列时抛出ValueError"""
+    names = [str(value).strip() if value is not None else '' for value in header]
+    positions = {}
+    for field, aliases in FIELD_HEADERS.items():
+        for alias in aliases:
+            if alias in names:
+                positions[field] = names.index(alias)
+                break
+    missing = [FIELD_HEADERS[field][0] for field in FIELD_HEADERS
+               if field not in positions and field not in OPTIONAL_FIELDS]
+    if missing:
+        raise ValueError(f"文件缺少必需的列: {', '.join(missing)}")
+    return positions
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def _date_text(value):
+    # Excel单元格可能直接是日期对象
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d')
+    if isinstance(value, date):
+        return value.isoformat()
+    text = _text(value)
+    try:
+        # 只接受YYYY-MM-DD，fromisoformat 比 strptime 快得多
+        if len(text) != 10 or text[4] != '-' or text[7] != '-':
+            raise ValueError
+        return date.fromisoformat(text).isoformat()
+    except ValueError:
+        raise ValueError(f"购药日期格式错误: '{text}'，应为YYYY-MM-DD")
+
+
+def parse_row(values, positions):
+    """校验一行并转换成写入参数，有问题时抛出ValueError（消息即错误原因）"""
+    def get(field):
+        index = positions.get(field)
+        return values[index] if index is not None and index < len(values) else None
+
+    name_spec = _text(get('name_spec'))
+    user_name = _text(get('user_name'))
+    if not name_spec or not user_name:
+        raise ValueError("品名及规格和使用人不能为空")
+    try:
+        daily_pills = float(_text(get('daily_pills')))
+        pills_per_box = int(_text(get('pills_per_box')))
+        boxes_purchased = int(_text(get('boxes_purchased')))
+    except ValueError:
+        raise ValueError("每日服用片数、每盒片数、购买盒数必须是数字（每盒片数和购买盒数为整数）")
+    if daily_pills <= 0 or pills_per_box <= 0 or boxes_purchased <= 0:
+        raise ValueError("每日服用片数、每盒片数、购买盒数必须大于0")
+    purchase_date = _date_text(get('purchase_date'))
+    next_purchase_date = calculate_next_purchase_date(daily_pills, pills_per_box, boxes_purchased, purchase_date)
+    if not next_purchase_date:
+        raise ValueError("无法计算下次需买药时间，请检查数量和日期")
+    return (name_spec, user_name, daily_pills, pills_per_box, boxes_purchased,
+            purchase_date, next_purchase_date, _text(get('notes')))
+
+
+_RECORD_POSITIONS = {field: index for index, field in enumerate(FIELD_HEADERS)}
+
+
+def parse_record(record):
+    """校验一个以数据库列名为键的字典（如JSON请求）并转换成写入参数，有问题时抛出ValueError"""
+    return parse_row([record.get(field) for field in FIELD_HEADERS], _RECORD_POSITIONS)
+
+
+def import_file(repo, path, progress=None, batch_size=BATCH_SIZE) -> ImportResult:
+    """把文件中的药物导入 repo，progress(已读取行数, 错误行数) 定期调用
+
+    文件无法读取或缺少必需的列时抛出ValueError，数据库不做任何修改。
+    """
+    rows = read_rows(path)
+    header = next(rows, None)
+    if header is None:
+        raise ValueError("文件是空的")
+    positions = _column_positions(header)
+
+    errors = []
+    counts = {'total': 0}
+
+    def batches():
+        batch = []
+        for line_number, values in enumerate(rows, start=2):
+            if not any(_text(value) for value in values):
+                continue  # 跳过空行
+            counts['total'] += 1
+            try:
+                batch.append(parse_row(values, positions))
+            except ValueError as e:
+                errors.append((line_number, str(e)))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+            if progress and counts['total'] % PROGRESS_EVERY == 0:
+                progress(counts['total'], len(errors))
+        if batch:
+            yield batch
+
+    imported = repo.import_rows(batches())
+    if progress:
+        progress(counts['total'], len(errors))
+    return ImportResult(counts['total'], imported, errors)
+
+
+def format_result(result: ImportResult) -> str:
+    """导入结果的文字报告"""
+    text = f"共读取 {result.total} 行，成功导入 {result.imported} 行，失败 {len(result.errors)} 行\n"
+    if result.errors:
+        text += "\n失败的行:\n"
+        for line_number, message in result.errors:
+            text += f"  第{line_number}行: {message}\n"
+    return text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="从CSV/Excel文件批量导入药物（同一使用人的品名及规格已存在时更新）")
+    parser.add_argument('path', help="CSV或xlsx文件，第一行为表头")
+    parser.add_argument('--db', help="数据库路径，默认 ~/.family-medicine-manager/medicine.db")
+    args = parser.parse_args(argv)
+
+    repo = MedicineRepository(args.db)
+    try:
+        result = import_file(repo, args.path,
+                             progress=lambda total, failed: print(f"已读取 {total} 行，失败 {failed} 行",
+                                                                  file=sys.stderr))
+    except (OSError, ValueError) as e:
+        print(f"导入失败: {str(e)}", file=sys.stderr)
+        return 1
+    finally:
+        repo.close()
+    print(format_result(result), end='')
+    return 0 if not result.errors else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""
+操作耗时统计
+
+每次数据库操作、表格刷新、搜索、提醒检查等的耗时记录到内存中的直方图，
+可以在图形界面的"诊断信息"窗口中查看，或者导出成JSON，不需要连接性能分析工具就能看到慢在哪里。
+
+直方图按对数分桶（每翻一倍分 BUCKETS_PER_DOUBLING 个桶，相对误差约9%），
+内存占用固定，与记录次数无关；百分位数取所在桶的上界。
+记录一次耗时只需要两次计时和一次加锁，可以一直开启。
+
+设置环境变量 FAMILY_MEDICINE_METRICS=文件路径 时，图形界面退出前自动导出（见 dump_if_requested）。
+
+用法:
+    with metrics.timer('table.refresh'):
+        ...
+    @metrics.timed('search')
+    def search(...): ...
+    metrics.instrument_methods(MedicineRepository, 'db')   # 数据层的每个公开方法
+"""
+
+import functools
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict
+
+BUCKETS_PER_DOUBLING = 8
+# 小于此值（毫秒）的耗时都计入第一个桶
+MIN_MS = 0.001
+PERCENTILES = (0.5, 0.95, 0.99)
+# 导出文件格式版本
+FORMAT_VERSION = 1
+# 设置此环境变量（文件路径）时图形界面退出前把统计导出到该文件
+DUMP_ENV = 'FAMILY_MEDICINE_METRICS'
+
+
+class Histogram:
+    """一个操作的耗时分布（毫秒）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.errors = 0
+        self._buckets = {}  # 桶序号 -> 次数
+
+    @staticmethod
+    def _bucket(ms):
+        if ms <= MIN_MS:
+            return 0
+        return math.ceil(math.log2(ms / MIN_MS) * BUCKETS_PER_DOUBLING)
+
+    @staticmethod
+    def _upper_bound(bucket):
+        return MIN_MS * 2 ** (bucket / BUCKETS_PER_DOUBLING)
+
+    def observe(self, ms, error=False):
+        bucket = self._bucket(ms)
+        with self._lock:
+            self.count += 1
+            self.total_ms += ms
+            if ms > self.max_ms:
+                self.max_ms = ms
+            if error:
+                self.errors += 1
+            self._buckets[bucket] = self._buckets.get(bucket, 0) + 1
+
+    def percentile(self, fraction) -> float:
+        with self._lock:
+            return self._percentile(fraction)
+
+    def _percentile(self, fraction):
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * fraction))
+        seen = 0
+        for bucket in sorted(self._buckets):
+            seen += self._buckets[bucket]
+            if seen >= rank:
+                # 桶上界可能超过实际最大值
+                return min(self._upper_bound(bucket), self.max_ms)
+        return self.max_ms
+
+    def summary(self) -> dict:
+        with self._lock:
+            summary = {
+                'count': self.count,
+                'errors': self.errors,
+                'total_ms': round(self.total_ms, 3),
+                'mean_ms': round(self.total_ms / self.count, 4) if self.count else 0.0,
+                'max_ms': round(self.max_ms, 4),
+            }
+            for fraction in PERCENTILES:
+                summary[f'p{round(fraction * 100)}_ms'] = round(self._percentile(fraction), 4)
+        return summary
+
+
+class Metrics:
+    """按名称保存的直方图"""
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.started = datetime.now()
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Histogram] = {}
+
+    def histogram(self, name) -> Histogram:
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, Histogram())
+        return histogram
+
+    def observe(self, name, ms, error=False):
+        self.histogram(name).observe(ms, error)
+
+    @contextmanager
+    def timer(self, name):
+        """记录 with 块的耗时，块中抛出异常时同时记为一次错误"""
+        started = self.clock()
+        error = True
+        try:
+            yield
+            error = False
+        finally:
+            self.observe(name, (self.clock() - started) * 1000, error)
+
+    def timed(self, name):
+        """装饰器：记录函数每次调用的耗时"""
+        def decorate(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.timer(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def snapshot(self) -> Dict[str, dict]:
+        """全部操作的统计（按名称排序）"""
+        with self._lock:
+            items = sorted(self._histograms.items())
+        return {name: histogram.summary() for name, histogram in items}
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+            self.started = datetime.now()
+
+    def to_json(self, **extra) -> str:
+        report = {
+            'format': FORMAT_VERSION,
+            'since': self.started.isoformat(timespec='seconds'),
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            **extra,
+            'metrics': self.snapshot(),
+        }
+        return json.dumps(report, ensure_ascii=False, indent=2)
+
+    def dump(self, path, **extra):
+        """导出为JSON文件，extra 为附加的字段（例如启动耗时）"""
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.to_json(**extra) + '\n')
+
+
+# 进程内共用的统计，数据层、界面和后台线程都记录到这里
+registry = Metrics()
+timer = registry.timer
+timed = registry.timed
+
+
+def dump_if_requested(**extra):
+    """设置了环境变量 FAMILY_MEDICINE_METRICS 时把统计导出到该文件"""
+    path = os.environ.get(DUMP_ENV)
+    if not path:
+        return
+    try:
+        registry.dump(path, **extra)
+    except OSError as e:
+        print(f"导出耗时统计失败: {str(e)}")
+
+
+def instrument_methods(cls, prefix, metrics=registry):
+    """给类的每个公开方法加上耗时记录，名称为 前缀.方法名"""
+    for name, value in list(vars(cls).items()):
+        if name.startswith('_') or not callable(value) or isinstance(value, (staticmethod, classmethod, type)):
+            continue
+        setattr(cls, name, metrics.timed(f'{prefix}.{name}')(value))
+    return cls
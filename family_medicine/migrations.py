@@ -0,0 +1,275 @@
+"""
+数据库结构版本升级
+
+数据库版本记录在 PRAGMA user_version 中。打开数据库时按顺序执行尚未应用的升级步骤，
+每个步骤在独立事务中完成，失败时整体回滚，已有的 ~/.family-medicine-manager/medicine.db 会被原地升级。
+新增结构变化时在 MIGRATIONS 末尾追加步骤，不要修改已发布的步骤。
+升级提示输出到标准错误，不影响命令行模式（--check、--list-due、导入导出）的标准输出。
+"""
+
+import sqlite3
+import sys
+
+from .days import sql_day
+
+
+def _create_base_tables(conn):
+    """创建药物信息表和设置表（1.0版本的原始结构）"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS medicines (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name_spec TEXT NOT NULL,
+            user_name TEXT NOT NULL,
+            daily_pills REAL NOT NULL,
+            pills_per_box INTEGER NOT NULL,
+            boxes_purchased INTEGER NOT NULL,
+            purchase_date TEXT NOT NULL,
+            next_purchase_date TEXT NOT NULL,
+            notes TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS settings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            setting_name TEXT UNIQUE NOT NULL,
+            setting_value TEXT NOT NULL
+        )
+    ''')
+
+
+def _add_medicine_indexes(conn):
+    """为提醒扫描、排序和重复检测添加索引，同一使用人的品名及规格唯一"""
+    # 旧版本只在界面上做重复检测，先把已有的重复记录改名（追加ID），保证唯一索引可以建立且不丢数据
+    conn.execute('''
+        UPDATE medicines SET name_spec = name_spec || ' #' || id
+        WHERE id NOT IN (SELECT MIN(id) FROM medicines GROUP BY user_name, name_spec)
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_medicines_next_purchase_date ON medicines (next_purchase_date)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_medicines_purchase_date ON medicines (purchase_date)')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_medicines_user_name_spec ON medicines (user_name, name_spec)')
+
+
+def _create_search_index(conn):
+    """建立品名、使用人、备注的FTS5全文索引，由触发器与药物表保持同步
+
+    使用trigram分词，中文药名不需要分词也能按任意子串匹配。
+    SQLite未编译FTS5（或版本低于3.34不支持trigram）时跳过，搜索继续使用LIKE；
+    版本号照常记录，之后每次打开数据库由 ensure_search_index 重试，升级SQLite后自动建立索引。
+    """
+    try:
+        _build_search_index(conn)
+    except sqlite3.OperationalError as e:
+        print(f"当前SQLite不支持FTS5 trigram全文索引，搜索将使用LIKE: {str(e)}", file=sys.stderr)
+
+
+def _build_search_index(conn):
+    """创建全文索引表和同步触发器并索引已有数据，不支持FTS5 trigram时抛出 sqlite3.OperationalError"""
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS medicines_fts USING fts5(
+            name_spec, user_name, notes,
+            content='medicines', content_rowid='id', tokenize='trigram'
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS medicines_fts_insert AFTER INSERT ON medicines BEGIN
+            INSERT INTO medicines_fts (rowid, name_spec, user_name, notes)
+            VALUES (new.id, new.name_spec, new.user_name, new.notes);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS medicines_fts_delete AFTER DELETE ON medicines BEGIN
+            INSERT INTO medicines_fts (medicines_fts, rowid, name_spec, user_name, notes)
+            VALUES ('delete', old.id, old.name_spec, old.user_name, old.notes);
+        END
+    ''')
+    # 只有参与搜索的列变化时才更新索引，修改日期、数量不会触发
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS medicines_fts_update AFTER UPDATE OF name_spec, user_name, notes ON medicines BEGIN
+            INSERT INTO medicines_fts (medicines_fts, rowid, name_spec, user_name, notes)
+            VALUES ('delete', old.id, old.name_spec, old.user_name, old.notes);
+            INSERT INTO medicines_fts (rowid, name_spec, user_name, notes)
+            VALUES (new.id, new.name_spec, new.user_name, new.notes);
+        END
+    ''')
+    # 为已有数据建立索引
+    conn.execute("INSERT INTO medicines_fts (medicines_fts) VALUES ('rebuild')")
+
+
+def _add_day_columns(conn):
+    """添加购药日期、下次需买药日期的整数天数序号列，由触发器与文本日期列保持同步"""
+    conn.execute('ALTER TABLE medicines ADD COLUMN purchase_day INTEGER')
+    conn.execute('ALTER TABLE medicines ADD COLUMN next_purchase_day INTEGER')
+    conn.execute(f'''
+        UPDATE medicines
+        SET purchase_day = {sql_day('purchase_date')}, next_purchase_day = {sql_day('next_purchase_date')}
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS medicines_days_insert AFTER INSERT ON medicines BEGIN
+            UPDATE medicines
+            SET purchase_day = {sql_day('new.purchase_date')}, next_purchase_day = {sql_day('new.next_purchase_date')}
+            WHERE id = new.id;
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS medicines_days_update AFTER UPDATE OF purchase_date, next_purchase_date ON medicines BEGIN
+            UPDATE medicines
+            SET purchase_day = {sql_day('new.purchase_date')}, next_purchase_day = {sql_day('new.next_purchase_date')}
+            WHERE id = new.id;
+        END
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_medicines_next_purchase_day ON medicines (next_purchase_day)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_medicines_purchase_day ON medicines (purchase_day)')
+
+
+def _create_purchase_ledger(conn):
+    """添加购药记录表（只追加）和当前药量快照表
+
+    purchases 保存每一次购药；medicine_stock 保存每种药物截至最近一次购药时的药量（含上次结转的剩余），
+    计算剩余药量和断药日期时只读快照，不需要重放购药记录。medicines 表仍是当前状态，界面直接读取。
+    新增药物时由触发器记录第一次购药；修改购药日期、盒数或每盒片数视为更正，快照按新值重置。
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS purchases (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            medicine_id INTEGER NOT NULL,
+            purchase_date TEXT NOT NULL,
+            purchase_day INTEGER,
+            boxes INTEGER NOT NULL,
+            pills_per_box INTEGER NOT NULL,
+            leftover_pills REAL NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_purchases_medicine ON purchases (medicine_id, purchase_day)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS medicine_stock (
+            medicine_id INTEGER PRIMARY KEY,
+            as_of_day INTEGER,
+            pills_on_hand REAL NOT NULL
+        )
+    ''')
+    # 已有药物：当前的购药信息作为第一条购药记录
+    conn.execute(f'''
+        INSERT INTO purchases (medicine_id, purchase_date, purchase_day, boxes, pills_per_box)
+        SELECT id, purchase_date, {sql_day('purchase_date')}, boxes_purchased, pills_per_box FROM medicines
+    ''')
+    conn.execute(f'''
+        INSERT OR REPLACE INTO medicine_stock (medicine_id, as_of_day, pills_on_hand)
+        SELECT id, {sql_day('purchase_date')}, boxes_purchased * pills_per_box FROM medicines
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS medicines_ledger_insert AFTER INSERT ON medicines BEGIN
+            INSERT INTO purchases (medicine_id, purchase_date, purchase_day, boxes, pills_per_box)
+            VALUES (new.id, new.purchase_date, {sql_day('new.purchase_date')}, new.boxes_purchased, new.pills_per_box);
+            INSERT OR REPLACE INTO medicine_stock (medicine_id, as_of_day, pills_on_hand)
+            VALUES (new.id, {sql_day('new.purchase_date')}, new.boxes_purchased * new.pills_per_box);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS medicines_ledger_delete AFTER DELETE ON medicines BEGIN
+            DELETE FROM purchases WHERE medicine_id = old.id;
+            DELETE FROM medicine_stock WHERE medicine_id = old.id;
+        END
+    ''')
+    # 只在值确实变化时重置（保存修改会SET所有列，备注、用量变化不影响药量）
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS medicines_stock_reset
+        AFTER UPDATE OF purchase_date, boxes_purchased, pills_per_box ON medicines
+        WHEN new.purchase_date IS NOT old.purchase_date
+          OR new.boxes_purchased IS NOT old.boxes_purchased
+          OR new.pills_per_box IS NOT old.pills_per_box
+        BEGIN
+            INSERT OR REPLACE INTO medicine_stock (medicine_id, as_of_day, pills_on_hand)
+            VALUES (new.id, {sql_day('new.purchase_date')}, new.boxes_purchased * new.pills_per_box);
+        END
+    ''')
+
+
+def _create_reminder_state(conn):
+    """添加提醒状态表：每种药物最近一次提醒的断药日期、分组，以及是否已确认、推迟到什么时候
+
+    断药日期变化（购药、修改）后原来的状态自动失效，提醒检查只发出新出现或分组升级（例如从“明天”变成“今天”）的提醒，
+    已确认的提醒不再重复弹出。时间保存为 YYYY-MM-DD HH:MM:SS 文本，可以直接按字符串比较。
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS reminder_state (
+            medicine_id INTEGER PRIMARY KEY,
+            due_day INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            reminded_at TEXT NOT NULL,
+            acknowledged_at TEXT,
+            snoozed_until TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS medicines_reminder_state_delete AFTER DELETE ON medicines BEGIN
+            DELETE FROM reminder_state WHERE medicine_id = old.id;
+        END
+    ''')
+
+
+# (版本号, 说明, 升级函数)，版本号必须连续递增
+MIGRATIONS = [
+    (1, "创建药物信息表和设置表", _create_base_tables),
+    (2, "添加药物表索引和唯一约束", _add_medicine_indexes),
+    (3, "建立FTS5全文搜索索引", _create_search_index),
+    (4, "添加整数天数序号列", _add_day_columns),
+    (5, "添加购药记录表和药量快照表", _create_purchase_ledger),
+    (6, "添加提醒状态表", _create_reminder_state),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    """读取数据库当前结构版本"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn):
+    """把数据库升级到最新版本，返回执行的步骤数"""
+    current = get_schema_version(conn)
+    applied = 0
+    for version, description, step in MIGRATIONS:
+        if version <= current:
+            continue
+        # sqlite3模块不会为DDL自动开启事务，这里显式开启，保证每个步骤原子执行
+        conn.execute('BEGIN')
+        try:
+            step(conn)
+            conn.execute(f'PRAGMA user_version = {version}')
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+        print(f"数据库已升级到版本 {version}: {description}", file=sys.stderr)
+        applied += 1
+    return applied
+
+
+def has_search_index(conn):
+    """全文索引表是否存在"""
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'medicines_fts'").fetchone() is not None
+
+
+def ensure_search_index(conn):
+    """版本3建立全文索引时被跳过（当时的SQLite不支持FTS5 trigram）的数据库，重新尝试建立，返回索引是否可用
+
+    仍不支持时静默返回 False（跳过时已经提示过），搜索继续使用LIKE。
+    """
+    if has_search_index(conn):
+        return True
+    if get_schema_version(conn) < 3:
+        return False
+    conn.execute('BEGIN')
+    try:
+        _build_search_index(conn)
+    except sqlite3.OperationalError:
+        conn.rollback()
+        return False
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
+    print("已建立FTS5全文搜索索引", file=sys.stderr)
+    return True
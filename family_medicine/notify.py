@@ -0,0 +1,441 @@
+"""
+提醒通知
+
+提醒内容交给 NotificationQueue 后立即返回，由后台线程投递到各个通知渠道（sink）：
+桌面通知（notify-send）、本机SMTP邮件、通知文件目录（spool）和界面中的非模态提醒窗口。
+每个渠道有自己的线程和待发队列，发送慢或失败的渠道（例如邮件服务器没有响应）不影响其他渠道，
+也不会卡住界面和提醒调度线程。
+
+- 批量：渠道线程每次取出队列中积压的全部通知（最多 batch_size 条）一起发送，例如一封邮件
+- 合并：key 相同的通知还没发出时只保留最新的一条（每个提醒间隔的提醒内容都会替换上一次的）
+- 重试：发送失败时按指数退避重试，超过次数后丢弃并输出错误
+- 限流：每个渠道两次发送之间至少间隔 min_interval 秒，期间到达的通知合并到下一批
+- 结果：submit 时传入 on_done，全部渠道都有结果后在渠道线程中调用 on_done(是否全部发送成功)，
+  被合并替换或丢弃的通知算作没有发送成功
+
+启用的渠道保存在设置表中（见 build_sinks），例如 notify_sinks = "dialog,desktop,spool"。
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from .metrics import timer
+from .repository import DB_DIR_NAME
+
+# 桌面通知正文的最大长度，超出部分截断
+NOTIFY_MAX_LENGTH = 1000
+APP_NAME = 'family-medicine-manager'
+SPOOL_DIR_NAME = "notifications"
+# 默认重试次数和首次重试等待时间（秒），之后每次加倍
+MAX_ATTEMPTS = 4
+RETRY_DELAY_SECONDS = 5
+# 每个渠道最多积压的通知数，超出时丢弃最旧的
+MAX_PENDING = 100
+# 收到第一条通知后等待同一批通知到齐的时间（秒）
+BATCH_WINDOW_SECONDS = 0.2
+# 设置表中启用渠道的名称，逗号分隔
+SINKS_SETTING = 'notify_sinks'
+
+
+class Notification(NamedTuple):
+    """一条通知；key 相同且尚未发出的通知只保留最新的一条"""
+    title: str
+    message: str
+    key: Optional[str] = None
+    created: Optional[datetime] = None
+
+
+def notification(title, message, key=None) -> Notification:
+    """创建通知，记录创建时间"""
+    return Notification(title, message, key, datetime.now())
+
+
+class DeliveryError(Exception):
+    """发送失败；retry 为False时（例如没有安装 notify-send）不再重试"""
+
+    def __init__(self, message, retry=True):
+        super().__init__(message)
+        self.retry = retry
+
+
+class Sink:
+    """通知渠道：deliver(batch) 发送一批通知，失败时抛出异常
+
+    min_interval 为两次发送之间的最短间隔（秒），batch_size 为一次发送的最多条数。
+    """
+    name = 'sink'
+    min_interval = 0.0
+    batch_size = 20
+
+    def deliver(self, batch: List[Notification]):
+        raise NotImplementedError
+
+
+def batch_text(batch: List[Notification]) -> str:
+    """一批通知合并成一段文字"""
+    if len(batch) == 1:
+        return batch[0].message
+    return "\n\n".join(f"【{item.title}】\n{item.message}" for item in batch)
+
+
+def batch_title(batch: List[Notification]) -> str:
+    if len(batch) == 1:
+        return batch[0].title
+    return f"{batch[-1].title}（共 {len(batch)} 条）"
+
+
+class DesktopSink(Sink):
+    """notify-send 桌面通知，一批合并成一条"""
+    name = 'desktop'
+    min_interval = 30.0
+
+    def deliver(self, batch):
+        # 只在发送时导入，不拖慢 --check 的启动
+        import shutil
+        import subprocess
+        notify_send = shutil.which('notify-send')
+        if notify_send is None:
+            raise DeliveryError("没有找到 notify-send", retry=False)
+        message = batch_text(batch)
+        if len(message) > NOTIFY_MAX_LENGTH:
+            message = message[:NOTIFY_MAX_LENGTH] + "…"
+        try:
+            subprocess.run([notify_send, f'--app-name={APP_NAME}', batch_title(batch), message],
+                           check=True, timeout=10)
+        except (OSError, subprocess.SubprocessError) as e:
+            raise DeliveryError(f"notify-send 失败: {str(e)}")
+
+
+class SpoolSink(Sink):
+    """每批通知写成通知目录中的一个JSON文件，供其他程序读取后删除
+
+    先写临时文件再改名，读取方不会读到写了一半的文件。
+    """
+    name = 'spool'
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.path.join(os.path.expanduser("~"), DB_DIR_NAME, SPOOL_DIR_NAME)
+        self._sequence = 0
+
+    def deliver(self, batch):
+        os.makedirs(self.directory, exist_ok=True)
+        self._sequence += 1
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        name = f"{stamp}-{os.getpid()}-{self._sequence}.json"
+        path = os.path.join(self.directory, name)
+        temp_path = os.path.join(self.directory, '.' + name + '.part')
+        records = [{
+            'title': item.title,
+            'message': item.message,
+            'key': item.key,
+            'created': item.created.isoformat(timespec='seconds') if item.created else None,
+        } for item in batch]
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'notifications': records}, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+        os.replace(temp_path, path)
+
+
+class SmtpSink(Sink):
+    """通过SMTP服务器（默认本机 localhost:25）发送邮件，一批合并成一封"""
+    name = 'smtp'
+    # 默认每小时最多一封，两封之间的提醒合并到下一封
+    min_interval = 3600.0
+
+    def __init__(self, recipients, sender=None, host='localhost', port=25, timeout=30,
+                 min_interval=None):
+        if not recipients:
+            raise ValueError("邮件通知需要设置收件人（notify_smtp_to）")
+        self.recipients = list(recipients)
+        self.sender = sender or f"{APP_NAME}@localhost"
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        if min_interval is not None:
+            self.min_interval = min_interval
+
+    def deliver(self, batch):
+        import smtplib
+        from email.message import EmailMessage
+
+        message = EmailMessage()
+        message['Subject'] = batch_title(batch)
+        message['From'] = self.sender
+        message['To'] = ", ".join(self.recipients)
+        message.set_content(batch_text(batch))
+        try:
+            with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+                smtp.send_message(message)
+        except smtplib.SMTPRecipientsRefused as e:
+            raise DeliveryError(f"收件人被拒绝: {e.recipients}", retry=False)
+        except (OSError, smtplib.SMTPException) as e:
+            raise DeliveryError(f"发送邮件失败: {str(e)}")
+
+
+class DialogSink(Sink):
+    """界面中的提醒窗口：show(title, message) 由 post 转到界面线程执行，只显示一批中每个 key 的最新一条"""
+    name = 'dialog'
+
+    def __init__(self, post: Callable[[Callable[[], None]], None], show: Callable[[str, str], None]):
+        self.post = post
+        self.show = show
+
+    def deliver(self, batch):
+        latest = OrderedDict()
+        for item in batch:
+            latest[item.key if item.key is not None else id(item)] = item
+        for item in latest.values():
+            self.post(lambda item=item: self.show(item.title, item.message))
+
+
+def build_sinks(get_setting, default='desktop', dialog: Optional[DialogSink] = None) -> List[Sink]:
+    """按设置创建启用的渠道
+
+    设置项: notify_sinks（dialog、desktop、spool、smtp，逗号分隔，没有设置时为 default）、
+    notify_spool_dir、notify_smtp_host、notify_smtp_port、notify_smtp_from、notify_smtp_to（逗号分隔）、
+    notify_smtp_interval（两封邮件的最短间隔，分钟）。
+    没有提供 dialog（命令行）时忽略 dialog；设置有误时抛出ValueError。
+    """
+    names = [name.strip() for name in (get_setting(SINKS_SETTING) or default).split(',') if name.strip()]
+    sinks = []
+    for name in names:
+        if name == 'dialog':
+            if dialog is not None:
+                sinks.append(dialog)
+        elif name == 'desktop':
+            sinks.append(DesktopSink())
+        elif name == 'spool':
+            sinks.append(SpoolSink(get_setting('notify_spool_dir') or None))
+        elif name == 'smtp':
+            recipients = [to.strip() for to in (get_setting('notify_smtp_to') or '').split(',') if to.strip()]
+            interval = get_setting('notify_smtp_interval')
+            try:
+                sinks.append(SmtpSink(recipients, sender=get_setting('notify_smtp_from') or None,
+                                      host=get_setting('notify_smtp_host') or 'localhost',
+                                      port=int(get_setting('notify_smtp_port') or 25),
+                                      min_interval=float(interval) * 60 if interval else None))
+            except ValueError as e:
+                raise ValueError(f"邮件通知设置有误: {str(e)}")
+        else:
+            raise ValueError(f"未知的通知方式: {name}（可选 dialog、desktop、spool、smtp）")
+    return sinks
+
+
+class _Delivery:
+    """一条通知在各渠道的发送结果，全部渠道都有结果后调用 on_done(是否全部发送成功)"""
+
+    def __init__(self, remaining, on_done):
+        self._lock = threading.Lock()
+        self._remaining = remaining
+        self._delivered = True
+        self.on_done = on_done
+
+    def finish(self, delivered):
+        with self._lock:
+            self._remaining -= 1
+            self._delivered = self._delivered and delivered
+            if self._remaining:
+                return
+        try:
+            self.on_done(self._delivered)
+        except Exception as e:
+            print(f"通知发送结果处理出错: {str(e)}", file=sys.stderr)
+
+
+class SinkStats:
+    """一个渠道的发送统计"""
+
+    def __init__(self):
+        self.delivered = 0
+        self.failed = 0
+        self.dropped = 0
+        self.last_error = None
+
+
+class _SinkWorker:
+    """一个渠道的待发队列和发送线程"""
+
+    def __init__(self, sink, max_attempts, retry_delay, batch_window, clock):
+        self.sink = sink
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.batch_window = batch_window
+        self.clock = clock
+        self.stats = SinkStats()
+        self._cond = threading.Condition()
+        self._pending = OrderedDict()   # key -> (Notification, _Delivery或None)，按到达顺序
+        self._sequence = 0
+        self._next_allowed = 0.0        # 限流：下一次允许发送的时间
+        self._busy = False
+        self._closing = False
+        self._thread = threading.Thread(target=self._run, name=f"notify-{sink.name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, item, delivery=None):
+        dropped = []
+        with self._cond:
+            if self._closing:
+                dropped.append(delivery)
+            else:
+                if item.key is None:
+                    self._sequence += 1
+                    key = ('', self._sequence)
+                else:
+                    key = item.key
+                    # 同一 key 的新通知替换旧的，并排到队尾
+                    replaced = self._pending.pop(key, None)
+                    if replaced is not None:
+                        dropped.append(replaced[1])
+                self._pending[key] = (item, delivery)
+                while len(self._pending) > MAX_PENDING:
+                    dropped.append(self._pending.popitem(last=False)[1][1])
+                    self.stats.dropped += 1
+                self._cond.notify()
+        _finish(dropped, False)
+
+    def close(self):
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+
+    def join(self, timeout):
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def idle(self):
+        with self._cond:
+            return not self._pending and not self._busy
+
+    def _take_batch(self):
+        """等待可以发送的一批通知，关闭且队列为空时返回None"""
+        with self._cond:
+            while True:
+                if not self._pending:
+                    if self._closing:
+                        return None
+                    self._cond.wait()
+                    continue
+                now = self.clock()
+                if not self._closing:
+                    # 等待限流间隔结束；期间到达的通知合并进这一批
+                    wait = self._next_allowed - now
+                    if wait > 0:
+                        self._cond.wait(wait)
+                        continue
+                batch = []
+                while self._pending and len(batch) < self.sink.batch_size:
+                    batch.append(self._pending.popitem(last=False)[1])
+                self._busy = True
+                return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                # 第一条通知到达后稍等片刻，同一时刻的多条通知一起发送
+                if not self._pending and not self._closing:
+                    self._cond.wait()
+                    if self._pending and not self._closing:
+                        self._cond.wait(self.batch_window)
+            batch = self._take_batch()
+            if batch is None:
+                return
+            delivered = False
+            try:
+                delivered = self._deliver([item for item, _ in batch])
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._next_allowed = self.clock() + self.sink.min_interval
+                _finish([delivery for _, delivery in batch], delivered)
+
+    def _deliver(self, batch):
+        delay = self.retry_delay
+        attempts = 1 if self._closing else self.max_attempts
+        for attempt in range(1, attempts + 1):
+            try:
+                with timer(f'notify.{self.sink.name}'):
+                    self.sink.deliver(batch)
+            except Exception as e:
+                self.stats.last_error = str(e)
+                retry = getattr(e, 'retry', True)
+                if not retry or attempt == attempts:
+                    self.stats.failed += len(batch)
+                    print(f"发送通知失败（{self.sink.name}）: {str(e)}", file=sys.stderr)
+                    return False
+                with self._cond:
+                    # 关闭时不再等待重试
+                    if self._cond.wait_for(lambda: self._closing, delay):
+                        attempts = attempt + 1
+                delay *= 2
+            else:
+                self.stats.delivered += len(batch)
+                return True
+        return False
+
+
+def _finish(deliveries, delivered):
+    for delivery in deliveries:
+        if delivery is not None:
+            delivery.finish(delivered)
+
+
+class NotificationQueue:
+    """通知队列：submit 立即返回，各渠道在自己的后台线程中批量发送"""
+
+    def __init__(self, sinks: List[Sink], max_attempts=MAX_ATTEMPTS, retry_delay=RETRY_DELAY_SECONDS,
+                 batch_window=BATCH_WINDOW_SECONDS, clock=time.monotonic):
+        self._workers = [_SinkWorker(sink, max_attempts, retry_delay, batch_window, clock) for sink in sinks]
+
+    @property
+    def sinks(self) -> List[Sink]:
+        return [worker.sink for worker in self._workers]
+
+    def submit(self, item: Notification, on_done: Optional[Callable[[bool], None]] = None):
+        """把通知放入每个渠道的待发队列
+
+        on_done(是否全部发送成功) 在全部渠道都有结果后调用（在渠道线程中，没有渠道时立即调用）。
+        """
+        if on_done is not None and not self._workers:
+            on_done(True)
+            return
+        delivery = _Delivery(len(self._workers), on_done) if on_done is not None else None
+        for worker in self._workers:
+            worker.submit(item, delivery)
+
+    def flush(self, timeout=None) -> bool:
+        """等待全部待发通知发送完（不关闭队列），超时返回False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not all(worker.idle() for worker in self._workers):
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self, timeout=None) -> bool:
+        """不再接收通知，立即发送剩余的通知（忽略限流，不再重试）后停止线程；超时返回False"""
+        for worker in self._workers:
+            worker.close()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        finished = True
+        for worker in self._workers:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            finished = worker.join(remaining) and finished
+        return finished
+
+    def stats(self) -> Dict[str, SinkStats]:
+        return {worker.sink.name: worker.stats for worker in self._workers}
+
+
+def send_now(sinks: List[Sink], item: Notification, timeout=60) -> bool:
+    """立即发送一条通知并等待完成（命令行使用），全部渠道都发送成功时返回True"""
+    queue = NotificationQueue(sinks, max_attempts=2, retry_delay=1, batch_window=0)
+    queue.submit(item)
+    finished = queue.flush(timeout)
+    queue.close(0)
+    return finished and not any(stats.failed for stats in queue.stats().values())
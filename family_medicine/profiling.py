@@ -0,0 +1,189 @@
+"""
+界面操作性能分析（--profile）
+
+用户反馈"数据多了以后变慢"时，可以请用户用 --profile 启动程序照常操作，再把生成的目录发给开发者。
+开启后每个界面操作（添加、保存修改、搜索、购买清单、加载表格）和每次提醒检查都在 cProfile 下运行，
+并用 tracemalloc 比较操作前后的内存分配。结果写在 ~/.family-medicine-manager/profiles/<启动时间>/：
+
+    <操作>.prof    同一操作所有调用合并后的 cProfile 数据（python3 -m pstats 打开）
+    summary.txt    每个操作的次数、耗时、内存峰值，累计耗时最多的函数和新分配内存最多的代码行（前 TOP_N 项）
+    metrics.json   退出时的操作耗时统计（见 metrics.py，包括后台线程中的搜索和数据库操作）
+
+每个操作结束后立即更新该操作的文件和 summary.txt，程序异常退出时也不会丢失。
+cProfile 只记录调用线程，后台搜索线程中的查询耗时见 metrics.json；
+操作中弹出的对话框等待用户点击的时间也计入该操作（显示为 messagebox 等函数的耗时）。
+同时只分析一个操作：操作中调用的其他被分析的操作（例如添加后刷新表格）计入外层操作。
+性能分析和内存跟踪会让程序明显变慢，只在需要时开启。
+"""
+
+import cProfile
+import functools
+import io
+import os
+import platform
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+from . import metrics
+from .repository import DB_DIR_NAME
+
+PROFILES_DIR_NAME = 'profiles'
+SUMMARY_FILE = 'summary.txt'
+METRICS_FILE = 'metrics.json'
+# summary.txt 中每个操作列出的函数和代码行数
+TOP_N = 25
+# tracemalloc 为每次分配保存的调用层数（按代码行统计只需要1层）
+TRACEMALLOC_FRAMES = 1
+
+# 图形界面中分析的方法（check_reminders 为每次提醒检查，on_search_result 为显示搜索结果）
+UI_ACTIONS = ('add_medicine', 'save_edit', 'on_search', 'on_search_result',
+              'show_purchase_list', 'load_data', 'check_reminders')
+
+# 不计入内存统计的分配（性能分析自身和导入模块）
+_MEMORY_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, cProfile.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+def default_profile_dir(now=None):
+    """本次启动的输出目录：~/.family-medicine-manager/profiles/<启动时间>"""
+    now = now or datetime.now()
+    return os.path.join(os.path.expanduser("~"), DB_DIR_NAME, PROFILES_DIR_NAME, now.strftime('%Y%m%d-%H%M%S'))
+
+
+class _ActionStats:
+    """一个操作所有调用的合计"""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.peak_bytes = 0           # 单次调用中已分配内存的最大增长
+        self.allocated = Counter()    # 代码行 -> 调用结束时仍占用的新分配字节数（合计）
+        self.stats = None             # 合并后的 pstats.Stats
+
+
+class ActionProfiler:
+    """在 cProfile 和 tracemalloc 下运行各操作，按操作名称汇总写入 directory"""
+
+    def __init__(self, directory=None, top=TOP_N, frames=TRACEMALLOC_FRAMES):
+        self.directory = directory or default_profile_dir()
+        os.makedirs(self.directory, exist_ok=True)
+        self.top = top
+        self.started = datetime.now()
+        self._lock = threading.Lock()
+        self._actions = {}
+        self._closed = False
+        # 已经在跟踪内存（例如 PYTHONTRACEMALLOC）时沿用，关闭时也不停止
+        self._owns_tracemalloc = not tracemalloc.is_tracing()
+        if self._owns_tracemalloc:
+            tracemalloc.start(frames)
+
+    def instrument(self, cls, names=UI_ACTIONS):
+        """把类的这些方法替换为分析后的版本
+
+        按钮命令在创建界面时绑定，所以要在创建实例之前调用。
+        """
+        for name in names:
+            setattr(cls, name, self.wrap(name, getattr(cls, name)))
+        return cls
+
+    def wrap(self, name, function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            return self.run(name, function, *args, **kwargs)
+        return wrapper
+
+    def run(self, name, function, *args, **kwargs):
+        """在性能分析下调用 function；正在分析其他操作或已关闭时直接调用"""
+        if self._closed or not self._lock.acquire(blocking=False):
+            return function(*args, **kwargs)
+        try:
+            before = self._snapshot()
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+            profile = cProfile.Profile()
+            started = time.perf_counter()
+            error = True
+            try:
+                result = profile.runcall(function, *args, **kwargs)
+                error = False
+                return result
+            finally:
+                elapsed = (time.perf_counter() - started) * 1000
+                _, peak = tracemalloc.get_traced_memory()
+                differences = self._snapshot().compare_to(before, 'lineno')
+                self._record(name, profile, elapsed, peak - base, differences, error)
+        finally:
+            self._lock.release()
+
+    def close(self):
+        """写入操作耗时统计，停止内存跟踪"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            try:
+                metrics.registry.dump(os.path.join(self.directory, METRICS_FILE))
+            except OSError as e:
+                print(f"保存性能分析结果失败: {str(e)}")
+            if self._owns_tracemalloc:
+                tracemalloc.stop()
+        print(f"性能分析结果已保存到: {self.directory}")
+
+    @staticmethod
+    def _snapshot():
+        return tracemalloc.take_snapshot().filter_traces(_MEMORY_FILTERS)
+
+    def _record(self, name, profile, elapsed, peak, differences, error):
+        action = self._actions.get(name)
+        if action is None:
+            action = self._actions[name] = _ActionStats()
+        action.count += 1
+        action.errors += error
+        action.total_ms += elapsed
+        action.max_ms = max(action.max_ms, elapsed)
+        action.peak_bytes = max(action.peak_bytes, peak)
+        for difference in differences:
+            if difference.size_diff > 0:
+                action.allocated[str(difference.traceback)] += difference.size_diff
+        if action.stats is None:
+            action.stats = pstats.Stats(profile)
+        else:
+            action.stats.add(profile)
+        try:
+            action.stats.dump_stats(os.path.join(self.directory, f'{name}.prof'))
+            with open(os.path.join(self.directory, SUMMARY_FILE), 'w', encoding='utf-8') as f:
+                f.write(self.summary())
+        except OSError as e:
+            print(f"保存性能分析结果失败: {str(e)}")
+
+    def summary(self) -> str:
+        """全部操作的汇总：先列出各操作的耗时，再逐个列出耗时最多的函数和分配内存最多的代码行"""
+        out = io.StringIO()
+        out.write(f"性能分析  开始于 {self.started:%Y-%m-%d %H:%M:%S}  更新于 {datetime.now():%Y-%m-%d %H:%M:%S}\n")
+        out.write(f"Python {platform.python_version()}  {platform.platform()}  {sys.executable}\n\n")
+        actions = sorted(self._actions.items(), key=lambda item: -item[1].total_ms)
+        out.write(f"{'操作':<20}{'次数':>8}{'错误':>6}{'合计(ms)':>12}{'平均(ms)':>12}{'最大(ms)':>12}{'内存峰值(KB)':>14}\n")
+        for name, action in actions:
+            out.write(f"{name:<20}{action.count:>8}{action.errors:>6}{action.total_ms:>12.1f}"
+                      f"{action.total_ms / action.count:>12.1f}{action.max_ms:>12.1f}{action.peak_bytes / 1024:>14.1f}\n")
+        for name, action in actions:
+            out.write(f"\n==== {name} ====\n")
+            action.stats.stream = out
+            action.stats.sort_stats('cumulative').print_stats(self.top)
+            out.write("新分配内存最多的代码行（操作结束时仍占用）:\n")
+            for line, size in action.allocated.most_common(self.top):
+                out.write(f"  {size / 1024:>10.1f} KB  {line}\n")
+        return out.getvalue()
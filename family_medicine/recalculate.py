@@ -0,0 +1,69 @@
+"""
+批量重新计算下次需买药时间
+
+计算公式或取整规则变化后，用 recalculate_all 一次性重算全部药物：
+用量和药量快照（最近一次购药时的片数和日期序号，见 repository.MedicineStock）读成NumPy数组，
+一次向量化运算得到全部断药日期序号，
+只把有变化的行用 executemany 在一个事务中写回（文本日期在SQL中由序号生成）。
+没有安装NumPy时使用逐行计算的纯Python实现，结果相同。
+
+结果与 repository.supply_days 一致：
+快照日期 + timedelta(days=片数/每日片数)，timedelta按微秒四舍五入（银行家舍入）后取整天。
+"""
+
+from itertools import chain
+from typing import NamedTuple
+
+from .repository import MICROSECONDS_PER_DAY, supply_days
+
+
+class RecalculateResult(NamedTuple):
+    """total 为参与计算的药物数，changed 为下次需买药时间有变化（已写回）的药物数"""
+    total: int
+    changed: int
+
+
+def _changed_days_numpy(np, rows):
+    """向量化计算，返回有变化的 (新序号, ID) 列表"""
+    # 所有列都是数值，展平后直接填入数组，比 np.array(rows) 逐个解析元组快得多
+    data = np.fromiter(chain.from_iterable(rows), dtype=np.float64, count=len(rows) * 5).reshape(-1, 5)
+    ids, daily_pills, pills, start_day, next_day = data.T
+    valid = daily_pills > 0
+    supply = pills[valid] / daily_pills[valid]
+    new_day = start_day[valid] + np.rint(supply * MICROSECONDS_PER_DAY) // MICROSECONDS_PER_DAY
+    changed = new_day != next_day[valid]
+    return list(zip(new_day[changed].astype(np.int64).tolist(),
+                    ids[valid][changed].astype(np.int64).tolist()))
+
+
+def _changed_days_python(rows):
+    """逐行计算（没有NumPy时使用），返回有变化的 (新序号, ID) 列表"""
+    changed = []
+    for medicine_id, daily_pills, pills, start_day, next_day in rows:
+        if not daily_pills or daily_pills <= 0:
+            continue
+        new_day = start_day + supply_days(pills, daily_pills)
+        if new_day != next_day:
+            changed.append((new_day, medicine_id))
+    return changed
+
+
+def changed_next_purchase_days(rows, use_numpy=True):
+    """由 MedicineRepository.dosage_rows() 的结果计算有变化的 (新序号, ID) 列表"""
+    if use_numpy:
+        try:
+            import numpy as np
+        except ImportError:
+            np = None
+        if np is not None and rows:
+            return _changed_days_numpy(np, rows)
+    return _changed_days_python(rows)
+
+
+def recalculate_all(repo, use_numpy=True) -> RecalculateResult:
+    """按当前公式重新计算全部药物的下次需买药时间并写回数据库"""
+    rows = repo.dosage_rows()
+    changed = changed_next_purchase_days(rows, use_numpy)
+    if changed:
+        repo.set_next_purchase_days(changed)
+    return RecalculateResult(len(rows), len(changed))
@@ -0,0 +1,131 @@
+"""
+需要购买药物报告
+
+购买清单和提醒弹窗的内容都由 DueReport（见 repository.py，分组和数量已由SQL算好）按模板生成：
+每个分组对应一个分组标题模板和一个药物模板，生成器逐段产出文字，最后用 ''.join 拼接，
+耗时与药物数量成线性关系，不会因为反复 += 拼接长字符串而变慢。
+同一份数据可以渲染成纯文本（显示、复制到剪贴板）或HTML（保存为网页）。
+"""
+
+import html
+from datetime import datetime
+from typing import Callable, Dict, NamedTuple, Tuple
+
+from .repository import BUCKET_EXPIRED, BUCKET_SOON, BUCKET_TODAY, BUCKET_TOMORROW, DUE_BUCKETS
+
+
+class ReportTemplate(NamedTuple):
+    """报告模板
+
+    header 可用参数: checked_at, reminder_days, total；
+    sections 为 分组 -> (分组标题模板, 药物模板)，分组标题可用参数 count，
+    药物模板和 notes 可用参数: name, user, date, days, overdue（已过期天数）, notes；
+    notes 为空时不显示备注。escape 用于转义药物字段（HTML模板使用html.escape）。
+    """
+    header: str
+    sections: Dict[int, Tuple[str, str]]
+    notes: str = ''
+    item_end: str = ''
+    section_end: str = ''
+    footer: str = ''
+    escape: Callable[[str], str] = str
+
+
+_TEXT_ITEM = "   • {name} (使用人: {user})\n     断药时间: {date}"
+
+PURCHASE_LIST_TEXT = ReportTemplate(
+    header=("=== 需要购买药物清单 ===\n\n"
+            "检查时间: {checked_at}\n"
+            "断药提前检测天数: {reminder_days}天\n"
+            "需要购买的药物数量: {total}\n\n"),
+    sections={
+        BUCKET_EXPIRED: ("🚨 已过期的药物:\n", _TEXT_ITEM + " (已过期{overdue}天)\n"),
+        BUCKET_TODAY: ("⚠️ 今天需要购买的药物:\n", _TEXT_ITEM + "\n"),
+        BUCKET_TOMORROW: ("📅 明天需要购买的药物:\n", _TEXT_ITEM + "\n"),
+        BUCKET_SOON: ("📋 即将用完的药物:\n", _TEXT_ITEM + " (还有{days}天)\n"),
+    },
+    notes="     备注: {notes}\n",
+    item_end="\n",
+)
+
+_HTML_ITEM = "<li><b>{name}</b>（使用人: {user}）断药时间: {date}"
+
+PURCHASE_LIST_HTML = ReportTemplate(
+    header=('<!DOCTYPE html>\n<html lang="zh-CN">\n<head>\n<meta charset="utf-8">\n'
+            '<title>需要购买药物清单</title>\n</head>\n<body>\n'
+            '<h1>需要购买药物清单</h1>\n'
+            '<p>检查时间: {checked_at}<br>断药提前检测天数: {reminder_days}天<br>'
+            '需要购买的药物数量: {total}</p>\n'),
+    sections={
+        BUCKET_EXPIRED: ("<h2>🚨 已过期的药物（{count}）</h2>\n<ul>\n", _HTML_ITEM + "（已过期{overdue}天）"),
+        BUCKET_TODAY: ("<h2>⚠️ 今天需要购买的药物（{count}）</h2>\n<ul>\n", _HTML_ITEM),
+        BUCKET_TOMORROW: ("<h2>📅 明天需要购买的药物（{count}）</h2>\n<ul>\n", _HTML_ITEM),
+        BUCKET_SOON: ("<h2>📋 即将用完的药物（{count}）</h2>\n<ul>\n", _HTML_ITEM + "（还有{days}天）"),
+    },
+    notes="<br>备注: {notes}",
+    item_end="</li>\n",
+    section_end="</ul>\n",
+    footer="</body>\n</html>\n",
+    escape=html.escape,
+)
+
+_REMINDER_ITEM = "• {name} (使用人: {user})\n  断药时间: {date} "
+
+REMINDER_TEXT = ReportTemplate(
+    header="以下药物需要购买：\n\n",
+    sections={
+        BUCKET_EXPIRED: ("", _REMINDER_ITEM + "(已过期{overdue}天)\n\n"),
+        BUCKET_TODAY: ("", _REMINDER_ITEM + "(今天需要购买)\n\n"),
+        BUCKET_TOMORROW: ("", _REMINDER_ITEM + "(明天需要购买)\n\n"),
+        BUCKET_SOON: ("", _REMINDER_ITEM + "(还有{days}天)\n\n"),
+    },
+)
+
+
+def iter_report(report, template, checked_at=None):
+    """按模板逐段生成报告内容"""
+    checked_at = checked_at or datetime.now()
+    yield template.header.format(checked_at=checked_at.strftime('%Y-%m-%d %H:%M:%S'),
+                                 reminder_days=report.reminder_days, total=report.total)
+    escape = template.escape
+    for bucket in DUE_BUCKETS:
+        medicines = report.groups[bucket]
+        if not medicines:
+            continue
+        heading, item = template.sections[bucket]
+        yield heading.format(count=report.counts[bucket])
+        for medicine in medicines:
+            fields = {
+                'name': escape(medicine.name_spec),
+                'user': escape(medicine.user_name),
+                'date': escape(medicine.next_purchase_date),
+                'days': medicine.days_left,
+                'overdue': -medicine.days_left,
+                'notes': escape(medicine.notes or ''),
+            }
+            yield item.format_map(fields)
+            if template.notes and medicine.notes:
+                yield template.notes.format_map(fields)
+            yield template.item_end
+        yield template.section_end
+    yield template.footer
+
+
+def render(report, template, checked_at=None) -> str:
+    """按模板生成完整报告"""
+    return ''.join(iter_report(report, template, checked_at))
+
+
+def purchase_list_text(report, checked_at=None) -> str:
+    """需要购买药物清单（纯文本，用于显示和复制）"""
+    return render(report, PURCHASE_LIST_TEXT, checked_at)
+
+
+def purchase_list_html(report, checked_at=None) -> str:
+    """需要购买药物清单（HTML网页）"""
+    return render(report, PURCHASE_LIST_HTML, checked_at)
+
+
+def reminder_text(report) -> str:
+    """提醒弹窗内容"""
+    return render(report, REMINDER_TEXT)
@@ -0,0 +1,642 @@
+"""
+药物数据访问层
+
+所有SQL语句集中在这里，图形界面、提醒线程等只通过 MedicineRepository 访问数据库。
+连接由 ConnectionPool 按线程分配（见 db.py），同一个仓库对象可以在多个线程中使用，
+每个线程长期复用自己的连接；SQL文本固定为模块常量，这样sqlite3的语句缓存可以直接复用已编译的预处理语句。
+搜索优先使用FTS5全文索引（见 migrations.py），不可用时退回LIKE。
+"""
+
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from .days import from_day, sql_date, to_day
+from .db import ConnectionPool
+from .metrics import instrument_methods
+from .migrations import LATEST_VERSION, ensure_search_index, get_schema_version, has_search_index, migrate
+
+DB_DIR_NAME = ".family-medicine-manager"
+DB_FILE_NAME = "medicine.db"
+
+# 与表格显示顺序一致的列，避免依赖 SELECT * 的物理列顺序
+MEDICINE_COLUMNS = ('id', 'name_spec', 'user_name', 'daily_pills', 'pills_per_box', 'boxes_purchased',
+                    'purchase_date', 'next_purchase_date', 'notes')
+_SELECT_MEDICINES = 'SELECT ' + ', '.join(MEDICINE_COLUMNS) + ' FROM medicines'
+_PURCHASE_DATE_INDEX = MEDICINE_COLUMNS.index('purchase_date')
+
+_INSERT_MEDICINE = '''
+    INSERT INTO medicines (name_spec, user_name, daily_pills, pills_per_box, boxes_purchased,
+                           purchase_date, next_purchase_date, notes)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+_UPDATE_MEDICINE = '''
+    UPDATE medicines
+    SET name_spec=?, user_name=?, daily_pills=?, pills_per_box=?, boxes_purchased=?,
+        purchase_date=?, next_purchase_date=?, notes=?
+    WHERE id=?
+'''
+# 批量导入：同一使用人的品名及规格已存在时更新（依赖唯一索引 idx_medicines_user_name_spec）
+_UPSERT_MEDICINE = _INSERT_MEDICINE.rstrip() + '''
+    ON CONFLICT (user_name, name_spec) DO UPDATE
+    SET daily_pills=excluded.daily_pills, pills_per_box=excluded.pills_per_box,
+        boxes_purchased=excluded.boxes_purchased, purchase_date=excluded.purchase_date,
+        next_purchase_date=excluded.next_purchase_date, notes=excluded.notes
+'''
+_DELETE_MEDICINE = 'DELETE FROM medicines WHERE id = ?'
+_GET_MEDICINE = _SELECT_MEDICINES + ' WHERE id = ?'
+_LIST_MEDICINES = _SELECT_MEDICINES + ' ORDER BY purchase_date'
+_SEARCH_MEDICINES = _SELECT_MEDICINES + '''
+    WHERE name_spec LIKE ? OR user_name LIKE ? OR notes LIKE ?
+    ORDER BY purchase_date
+'''
+# 分页查询：按购药时间排序，相同日期按ID排序保证翻页稳定（可以直接走 purchase_date 索引）
+_COUNT_MEDICINES = 'SELECT COUNT(*) FROM medicines'
+_PAGE_MEDICINES = _SELECT_MEDICINES + ' ORDER BY purchase_date, id LIMIT ? OFFSET ?'
+_COUNT_SEARCH = 'SELECT COUNT(*) FROM medicines WHERE name_spec LIKE ? OR user_name LIKE ? OR notes LIKE ?'
+_PAGE_SEARCH = _SELECT_MEDICINES + '''
+    WHERE name_spec LIKE ? OR user_name LIKE ? OR notes LIKE ?
+    ORDER BY purchase_date, id LIMIT ? OFFSET ?
+'''
+# FTS5全文搜索，按相关度排序
+_FTS_MIN_LENGTH = 3  # trigram分词至少需要3个字符，更短的关键字使用LIKE
+_COUNT_FTS = 'SELECT COUNT(*) FROM medicines_fts WHERE medicines_fts MATCH ?'
+_PAGE_FTS = 'SELECT ' + ', '.join('m.' + column for column in MEDICINE_COLUMNS) + '''
+    FROM medicines_fts JOIN medicines m ON m.id = medicines_fts.rowid
+    WHERE medicines_fts MATCH ?
+    ORDER BY medicines_fts.rank, m.id LIMIT ? OFFSET ?
+'''
+_NEXT_PURCHASE_DAYS = 'SELECT id, next_purchase_day FROM medicines WHERE next_purchase_day IS NOT NULL'
+# 重新计算下次需买药时间：读取用量和药量快照，按序号写回（文本日期在SQL中生成，触发器同步序号列）
+_DOSAGE_ROWS = '''
+    SELECT m.id, m.daily_pills, s.pills_on_hand, s.as_of_day, IFNULL(m.next_purchase_day, -1)
+    FROM medicines m JOIN medicine_stock s ON s.medicine_id = m.id
+    WHERE s.as_of_day IS NOT NULL
+'''
+_SET_NEXT_PURCHASE_DAY = 'UPDATE medicines SET next_purchase_date = ' + sql_date('?') + ' WHERE id = ?'
+# 批量写回时临时使用的页缓存（KB），大量随机更新索引时可以明显减少磁盘读写
+_BULK_CACHE_KB = 131072
+# 购药记录和药量快照（见 migrations._create_purchase_ledger）
+_GET_STOCK = '''
+    SELECT m.daily_pills, m.pills_per_box, s.as_of_day, s.pills_on_hand
+    FROM medicines m LEFT JOIN medicine_stock s ON s.medicine_id = m.id
+    WHERE m.id = ?
+'''
+_INSERT_PURCHASE = '''
+    INSERT INTO purchases (medicine_id, purchase_date, purchase_day, boxes, pills_per_box, leftover_pills)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+_RECORD_PURCHASE = 'UPDATE medicines SET purchase_date=?, boxes_purchased=?, next_purchase_date=? WHERE id=?'
+_SET_STOCK = 'UPDATE medicine_stock SET as_of_day=?, pills_on_hand=? WHERE medicine_id=?'
+_SET_NEXT_PURCHASE_DATE = 'UPDATE medicines SET next_purchase_date=? WHERE id=? AND next_purchase_date IS NOT ?'
+_PURCHASE_HISTORY = '''
+    SELECT purchase_date, boxes, pills_per_box, leftover_pills FROM purchases
+    WHERE medicine_id = ? ORDER BY purchase_day DESC, id DESC
+'''
+_NAME_EXISTS = 'SELECT id FROM medicines WHERE user_name = ? AND name_spec = ? AND id != ?'
+# 提醒分组：已过期、今天、明天、即将用完
+BUCKET_EXPIRED, BUCKET_TODAY, BUCKET_TOMORROW, BUCKET_SOON = range(4)
+DUE_BUCKETS = (BUCKET_EXPIRED, BUCKET_TODAY, BUCKET_TOMORROW, BUCKET_SOON)
+BUCKET_NAMES = {
+    BUCKET_EXPIRED: '已过期',
+    BUCKET_TODAY: '今天需要购买',
+    BUCKET_TOMORROW: '明天需要购买',
+    BUCKET_SOON: '即将用完',
+}
+
+# 提醒查询：范围比较走 next_purchase_day 索引，剩余天数、分组和每组数量都在SQL中算好，
+# 结果已按分组、剩余天数排序，提醒弹窗和购买清单共用
+_DUE_REPORT = f'''
+    SELECT bucket, COUNT(*) OVER (PARTITION BY bucket) AS bucket_count,
+           name_spec, user_name, next_purchase_date, notes, days_left
+    FROM (
+        SELECT id, name_spec, user_name, next_purchase_date, notes,
+               next_purchase_day - :today AS days_left,
+               CASE
+                   WHEN next_purchase_day < :today THEN {BUCKET_EXPIRED}
+                   WHEN next_purchase_day = :today THEN {BUCKET_TODAY}
+                   WHEN next_purchase_day = :today + 1 THEN {BUCKET_TOMORROW}
+                   ELSE {BUCKET_SOON}
+               END AS bucket
+        FROM medicines
+        WHERE next_purchase_day <= :today + :days
+    )
+    ORDER BY bucket, days_left, id
+'''
+
+# 提醒状态（见 migrations._create_reminder_state）：与提醒查询相同的分组，再按状态表过滤。
+# 待发出：没有状态、断药日期已变化、分组升级或推迟时间已到；未确认：本次断药日期已提醒、尚未确认且不在推迟中
+_REMINDER_QUERY = f'''
+    SELECT bucket, COUNT(*) OVER (PARTITION BY bucket) AS bucket_count,
+           name_spec, user_name, next_purchase_date, notes, days_left, id, next_purchase_day
+    FROM (
+        SELECT m.id, m.name_spec, m.user_name, m.next_purchase_date, m.notes, m.next_purchase_day,
+               m.next_purchase_day - :today AS days_left,
+               CASE
+                   WHEN m.next_purchase_day < :today THEN {BUCKET_EXPIRED}
+                   WHEN m.next_purchase_day = :today THEN {BUCKET_TODAY}
+                   WHEN m.next_purchase_day = :today + 1 THEN {BUCKET_TOMORROW}
+                   ELSE {BUCKET_SOON}
+               END AS bucket,
+               r.due_day, r.bucket AS reminded_bucket, r.acknowledged_at, r.snoozed_until
+        FROM medicines m LEFT JOIN reminder_state r ON r.medicine_id = m.id
+        WHERE m.next_purchase_day <= :today + :days
+    )
+    WHERE {{where}}
+    ORDER BY bucket, days_left, id
+'''
+_PENDING_WHERE = 'due_day IS NOT next_purchase_day OR bucket < reminded_bucket OR snoozed_until <= :now'
+_UNACKNOWLEDGED_WHERE = 'due_day = next_purchase_day AND acknowledged_at IS NULL AND IFNULL(snoozed_until <= :now, 1)'
+_PENDING_REMINDERS = _REMINDER_QUERY.format(where=_PENDING_WHERE)
+_UNACKNOWLEDGED_REMINDERS = _REMINDER_QUERY.format(where=_UNACKNOWLEDGED_WHERE)
+# 提醒窗口显示的药物：未确认的，以及待发出的（通知还在发送中或发送失败，尚未记录为已提醒）
+_OPEN_REMINDERS = _REMINDER_QUERY.format(where=f'({_PENDING_WHERE}) OR ({_UNACKNOWLEDGED_WHERE})')
+# 记录已提醒：清除之前的确认和推迟，但保留检查之后（通知发送期间）用户在提醒窗口中做的确认和推迟
+_MARK_REMINDED = '''
+    INSERT INTO reminder_state (medicine_id, due_day, bucket, reminded_at, acknowledged_at, snoozed_until)
+    VALUES (?, ?, ?, ?, NULL, NULL)
+    ON CONFLICT (medicine_id) DO UPDATE SET
+        due_day = excluded.due_day, bucket = excluded.bucket, reminded_at = excluded.reminded_at,
+        acknowledged_at = CASE WHEN acknowledged_at >= excluded.reminded_at THEN acknowledged_at END,
+        snoozed_until = CASE WHEN snoozed_until > excluded.reminded_at THEN snoozed_until END
+'''
+# 确认和推迟也适用于还没有记录为已提醒的药物；断药日期已经变化的提醒不再处理
+_ACKNOWLEDGE_REMINDER = '''
+    INSERT INTO reminder_state (medicine_id, due_day, bucket, reminded_at, acknowledged_at, snoozed_until)
+    SELECT id, :due_day, :bucket, :now, :now, NULL FROM medicines WHERE id = :id AND next_purchase_day = :due_day
+    ON CONFLICT (medicine_id) DO UPDATE SET
+        due_day = excluded.due_day, bucket = excluded.bucket, acknowledged_at = excluded.acknowledged_at,
+        snoozed_until = NULL
+'''
+_SNOOZE_REMINDER = '''
+    INSERT INTO reminder_state (medicine_id, due_day, bucket, reminded_at, acknowledged_at, snoozed_until)
+    SELECT id, :due_day, :bucket, :now, NULL, :until FROM medicines WHERE id = :id AND next_purchase_day = :due_day
+    ON CONFLICT (medicine_id) DO UPDATE SET
+        due_day = excluded.due_day, bucket = excluded.bucket, snoozed_until = excluded.snoozed_until,
+        acknowledged_at = NULL
+'''
+
+_GET_SETTING = 'SELECT setting_value FROM settings WHERE setting_name = ?'
+_ALL_SETTINGS = 'SELECT setting_name, setting_value FROM settings'
+_SET_SETTING = 'INSERT OR REPLACE INTO settings (setting_name, setting_value) VALUES (?, ?)'
+_DEFAULT_SETTING = 'INSERT OR IGNORE INTO settings (setting_name, setting_value) VALUES (?, ?)'
+
+MICROSECONDS_PER_DAY = 86_400_000_000
+
+DEFAULT_SETTINGS = {
+    'reminder_days': '2',
+    'reminder_interval': '5',
+}
+
+
+class MedicineRecord(NamedTuple):
+    """药物信息（字段顺序与表格列一致）"""
+    id: int
+    name_spec: str
+    user_name: str
+    daily_pills: float
+    pills_per_box: int
+    boxes_purchased: int
+    purchase_date: str
+    next_purchase_date: str
+    notes: Optional[str]
+
+
+class MedicineStock(NamedTuple):
+    """药量快照：截至 as_of_day（最近一次购药）有 pills_on_hand 片，
+    remaining_pills 为到指定日期剩余的片数，run_out_day 为断药日期序号"""
+    as_of_day: int
+    pills_on_hand: float
+    remaining_pills: float
+    run_out_day: int
+
+
+class PurchaseRecord(NamedTuple):
+    """一次购药，leftover_pills 为购药时上一次剩余（结转）的片数"""
+    purchase_date: str
+    boxes: int
+    pills_per_box: int
+    leftover_pills: float
+
+
+class DueMedicine(NamedTuple):
+    """需要购买的药物，days_left 为距下次需买药时间的天数（负数表示已过期）"""
+    name_spec: str
+    user_name: str
+    next_purchase_date: str
+    notes: Optional[str]
+    days_left: int
+
+
+class DueReport(NamedTuple):
+    """按状态分好组的需要购买药物，groups/counts 按 DUE_BUCKETS 的顺序排列"""
+    today_day: int
+    reminder_days: int
+    total: int
+    counts: Tuple[int, ...]
+    groups: Tuple[List[DueMedicine], ...]
+
+    def medicines(self):
+        """按分组顺序（已过期、今天、明天、即将用完）遍历全部药物及其分组"""
+        for bucket in DUE_BUCKETS:
+            for medicine in self.groups[bucket]:
+                yield bucket, medicine
+
+
+class ReminderKey(NamedTuple):
+    """提醒状态的键：药物、断药日期序号，以及提醒时所在的分组"""
+    medicine_id: int
+    due_day: int
+    bucket: int
+
+
+class ReminderBatch(NamedTuple):
+    """一组提醒：report 用于生成提醒内容，keys 用于记录提醒、确认或推迟"""
+    report: DueReport
+    keys: List[ReminderKey]
+
+
+def reminder_time(value: datetime) -> str:
+    """提醒状态表中的时间格式（可以按字符串比较）"""
+    return value.isoformat(sep=' ', timespec='seconds')
+
+
+def page_sort_key(row):
+    """不搜索时 page() 的排序依据（购药时间、ID），row 为按 MEDICINE_COLUMNS 顺序的元组
+
+    搜索结果按相关度排序，没有对应的排序依据，修改记录后要重新读取。
+    """
+    return row[_PURCHASE_DATE_INDEX], row[0]
+
+
+def fts_phrase(term):
+    """把用户输入转成FTS5短语查询，避免引号、星号等被当作查询语法"""
+    return '"' + term.replace('"', '""') + '"'
+
+
+def get_db_path():
+    """获取数据库文件路径（~/.family-medicine-manager/medicine.db），必要时创建配置目录
+
+    设置了环境变量 FAMILY_MEDICINE_HOUSEHOLD 时为该家庭的分库（见 households.py）。
+    """
+    if os.environ.get('FAMILY_MEDICINE_HOUSEHOLD'):
+        from .households import default_db_path
+        return default_db_path()
+    db_dir = os.path.join(os.path.expanduser("~"), DB_DIR_NAME)
+    if not os.path.exists(db_dir):
+        os.makedirs(db_dir)
+    return os.path.join(db_dir, DB_FILE_NAME)
+
+
+def calculate_next_purchase_date(daily_pills, pills_per_box, boxes_purchased, purchase_date):
+    """计算下次需买药时间，日期无效时返回None"""
+    try:
+        total_pills = boxes_purchased * pills_per_box
+        days_supply = total_pills / daily_pills
+        purchase_dt = datetime.strptime(purchase_date, '%Y-%m-%d')
+        next_date = purchase_dt + timedelta(days=days_supply)
+        return next_date.strftime('%Y-%m-%d')
+    except (TypeError, ValueError, ZeroDivisionError, OverflowError):
+        return None
+
+
+def supply_days(pills, daily_pills):
+    """pills 片药可以服用的整天数，取整方式与 calculate_next_purchase_date 一致（timedelta按微秒舍入）"""
+    return round(pills / daily_pills * MICROSECONDS_PER_DAY) // MICROSECONDS_PER_DAY
+
+
+def remaining_pills(pills_on_hand, daily_pills, elapsed_days):
+    """经过 elapsed_days 天后剩余的片数（不小于0）"""
+    return max(0.0, pills_on_hand - daily_pills * max(0, elapsed_days))
+
+
+def _iter_cursor(cursor, batch_size, make):
+    """用 fetchmany 逐批取出游标中的行"""
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            for row in rows:
+                yield make(row)
+    finally:
+        cursor.close()
+
+
+class MedicineRepository:
+    """药物数据仓库，封装 medicines 和 settings 表的全部读写
+
+    传入 pool 时与其他仓库对象共用连接池，否则按 db_path 创建自己的连接池。
+    read_only 为True时只读打开，不升级数据库结构也不写入默认设置，结构版本过旧时抛出 sqlite3.DatabaseError。
+    """
+
+    def __init__(self, db_path=None, pool=None, read_only=False):
+        self.pool = pool or ConnectionPool(db_path or get_db_path(), read_only=read_only)
+        self.db_path = self.pool.db_path
+        if read_only:
+            try:
+                self.check_schema()
+            except sqlite3.Error:
+                self.pool.close_all()
+                raise
+        else:
+            self.init_schema()
+
+    @property
+    def conn(self):
+        """当前线程的数据库连接"""
+        return self.pool.connection()
+
+    def init_schema(self):
+        """升级数据库结构并写入默认设置，全文索引缺失时重新尝试建立"""
+        migrate(self.conn)
+        with self.conn:
+            self.conn.executemany(_DEFAULT_SETTING, DEFAULT_SETTINGS.items())
+        self.has_fts = ensure_search_index(self.conn)
+
+    def check_schema(self):
+        """只读打开时检查数据库结构是最新版本（不升级）"""
+        version = get_schema_version(self.conn)
+        if version < LATEST_VERSION:
+            raise sqlite3.DatabaseError(
+                f"数据库结构版本为 {version}，需要 {LATEST_VERSION}，请先单独打开一次该数据库完成升级")
+        self.has_fts = has_search_index(self.conn)
+
+    def _use_fts(self, term):
+        return self.has_fts and len(term) >= _FTS_MIN_LENGTH
+
+    def release(self):
+        """关闭当前线程的连接，后台任务线程结束前调用"""
+        self.pool.release()
+
+    def close(self):
+        """关闭连接池中的全部连接"""
+        self.pool.close_all()
+
+    # ---- 药物 ----
+
+    def add(self, name_spec, user_name, daily_pills, pills_per_box, boxes_purchased,
+            purchase_date, next_purchase_date, notes="") -> int:
+        """添加药物，返回新记录ID"""
+        with self.conn:
+            cursor = self.conn.execute(_INSERT_MEDICINE, (
+                name_spec, user_name, daily_pills, pills_per_box, boxes_purchased,
+                purchase_date, next_purchase_date, notes))
+        return cursor.lastrowid
+
+    def update(self, medicine_id, name_spec, user_name, daily_pills, pills_per_box, boxes_purchased,
+               purchase_date, next_purchase_date, notes="") -> str:
+        """修改（更正）药物信息，返回实际保存的下次需买药时间
+
+        购药日期、盒数或每盒片数变化时药量快照按新值重置（由触发器完成），此时结果与 next_purchase_date 相同；
+        只修改用量等其他信息时保留之前结转的剩余药量，下次需买药时间按快照重新计算。
+        """
+        with self.conn:
+            self.conn.execute(_UPDATE_MEDICINE, (
+                name_spec, user_name, daily_pills, pills_per_box, boxes_purchased,
+                purchase_date, next_purchase_date, notes, medicine_id))
+            stock = self.stock(medicine_id)
+            if stock is None:
+                return next_purchase_date
+            next_purchase_date = from_day(stock.run_out_day).isoformat()
+            self.conn.execute(_SET_NEXT_PURCHASE_DATE, (next_purchase_date, medicine_id, next_purchase_date))
+        return next_purchase_date
+
+    def record_purchase(self, medicine_id, purchase_date, boxes_purchased) -> Tuple[float, MedicineStock]:
+        """登记一次购药：追加购药记录，上次剩余的药量结转到本次，更新药量快照和药物的当前状态
+
+        购药日期（YYYY-MM-DD）不能早于最近一次购药。返回 (结转的剩余片数, 新的药量快照)，
+        新的下次需买药时间为 from_day(快照.run_out_day)。
+        """
+        try:
+            purchase_day = to_day(purchase_date)
+        except ValueError:
+            raise ValueError(f"日期格式错误: {purchase_date}，应为YYYY-MM-DD")
+        with self.conn:
+            row = self.conn.execute(_GET_STOCK, (medicine_id,)).fetchone()
+            if row is None:
+                raise ValueError("药物不存在")
+            daily_pills, pills_per_box, as_of_day, pills_on_hand = row
+            if as_of_day is not None and purchase_day < as_of_day:
+                raise ValueError(f"购药日期不能早于最近一次购药日期 {from_day(as_of_day).isoformat()}")
+            leftover = 0.0
+            if as_of_day is not None:
+                leftover = remaining_pills(pills_on_hand, daily_pills, purchase_day - as_of_day)
+            pills_on_hand = leftover + boxes_purchased * pills_per_box
+            run_out_day = purchase_day + supply_days(pills_on_hand, daily_pills)
+
+            self.conn.execute(_INSERT_PURCHASE, (medicine_id, purchase_date, purchase_day,
+                                                 boxes_purchased, pills_per_box, leftover))
+            # 更新当前状态（触发器会按本次盒数重置快照），再写入含结转的快照
+            self.conn.execute(_RECORD_PURCHASE, (purchase_date, boxes_purchased,
+                                                 from_day(run_out_day).isoformat(), medicine_id))
+            self.conn.execute(_SET_STOCK, (purchase_day, pills_on_hand, medicine_id))
+        return leftover, MedicineStock(purchase_day, pills_on_hand, pills_on_hand, run_out_day)
+
+    def stock(self, medicine_id, today_day=None) -> Optional[MedicineStock]:
+        """读取药量快照，计算到 today_day（默认为快照日期）剩余的片数和断药日期，不重放购药记录"""
+        row = self.conn.execute(_GET_STOCK, (medicine_id,)).fetchone()
+        if row is None or row[2] is None:
+            return None
+        daily_pills, _, as_of_day, pills_on_hand = row
+        today_day = as_of_day if today_day is None else today_day
+        return MedicineStock(as_of_day, pills_on_hand,
+                             remaining_pills(pills_on_hand, daily_pills, today_day - as_of_day),
+                             as_of_day + supply_days(pills_on_hand, daily_pills))
+
+    def purchase_history(self, medicine_id) -> List[PurchaseRecord]:
+        """购药记录，最近的在前"""
+        return [PurchaseRecord._make(row) for row in self.conn.execute(_PURCHASE_HISTORY, (medicine_id,))]
+
+    def delete(self, medicine_ids: Iterable[int]) -> int:
+        """删除一个或多个药物，返回实际删除的数量"""
+        with self.conn:
+            cursor = self.conn.executemany(_DELETE_MEDICINE, ((medicine_id,) for medicine_id in medicine_ids))
+        return cursor.rowcount
+
+    def import_rows(self, batches) -> int:
+        """批量写入药物，同一使用人的品名及规格已存在时更新，返回写入的行数
+
+        batches 是写入参数列表（顺序同 add）的迭代器，可以边读边写；
+        全部批次在同一个事务中完成，迭代或写入出错时整体回滚。
+        """
+        count = 0
+        with self.conn:
+            for batch in batches:
+                self.conn.executemany(_UPSERT_MEDICINE, batch)
+                count += len(batch)
+        return count
+
+    def get(self, medicine_id) -> Optional[MedicineRecord]:
+        """按ID获取药物，不存在时返回None"""
+        row = self.conn.execute(_GET_MEDICINE, (medicine_id,)).fetchone()
+        return MedicineRecord._make(row) if row else None
+
+    def list_all(self) -> List[MedicineRecord]:
+        """全部药物，按购药时间升序"""
+        return [MedicineRecord._make(row) for row in self.conn.execute(_LIST_MEDICINES)]
+
+    def search(self, term) -> List[MedicineRecord]:
+        """按品名、使用人或备注搜索，关键字为空时返回全部"""
+        term = term.strip()
+        if not term:
+            return self.list_all()
+        if self._use_fts(term):
+            return self.page(0, -1, term)
+        pattern = f'%{term}%'
+        return [MedicineRecord._make(row)
+                for row in self.conn.execute(_SEARCH_MEDICINES, (pattern, pattern, pattern))]
+
+    def count(self, term="") -> int:
+        """药物数量，指定关键字时为搜索结果数量"""
+        term = term.strip()
+        if not term:
+            return self.conn.execute(_COUNT_MEDICINES).fetchone()[0]
+        if self._use_fts(term):
+            return self.conn.execute(_COUNT_FTS, (fts_phrase(term),)).fetchone()[0]
+        pattern = f'%{term}%'
+        return self.conn.execute(_COUNT_SEARCH, (pattern, pattern, pattern)).fetchone()[0]
+
+    def _execute_page(self, offset, limit, term):
+        term = term.strip()
+        if not term:
+            return self.conn.execute(_PAGE_MEDICINES, (limit, offset))
+        if self._use_fts(term):
+            return self.conn.execute(_PAGE_FTS, (fts_phrase(term), limit, offset))
+        pattern = f'%{term}%'
+        return self.conn.execute(_PAGE_SEARCH, (pattern, pattern, pattern, limit, offset))
+
+    def page(self, offset, limit, term="") -> List[MedicineRecord]:
+        """一页数据，供表格按需读取可见行
+
+        不搜索时按购药时间排序；使用全文索引搜索时按相关度排序。limit为-1表示不限。
+        """
+        return [MedicineRecord._make(row) for row in self._execute_page(offset, limit, term)]
+
+    def iter_medicines(self, term="", batch_size=500):
+        """逐批读取全部药物（或搜索结果），顺序与表格一致，内存占用与总行数无关"""
+        cursor = self._execute_page(0, -1, term)
+        return _iter_cursor(cursor, batch_size, MedicineRecord._make)
+
+    def name_exists(self, user_name, name_spec, exclude_id=None) -> bool:
+        """同一使用人的品名及规格是否已被其他记录使用（走唯一索引）"""
+        exclude_id = -1 if exclude_id is None else exclude_id
+        return self.conn.execute(_NAME_EXISTS, (user_name, name_spec, exclude_id)).fetchone() is not None
+
+    def due_report(self, today_day, reminder_days) -> DueReport:
+        """今天起 reminder_days 天内需要购买的药物（包括已过期的），today_day 为天数序号（见 days.py）
+
+        一次查询得到分组和每组数量，Python端只按分组收集结果，不做日期计算。
+        """
+        groups = tuple([] for _ in DUE_BUCKETS)
+        counts = [0] * len(DUE_BUCKETS)
+        for bucket, bucket_count, *medicine in self.conn.execute(
+                _DUE_REPORT, {'today': today_day, 'days': reminder_days}):
+            counts[bucket] = bucket_count
+            groups[bucket].append(DueMedicine._make(medicine))
+        return DueReport(today_day, reminder_days, sum(counts), tuple(counts), groups)
+
+    def iter_due(self, today_day, reminder_days, batch_size=500):
+        """逐批读取需要购买的药物，返回 (分组, DueMedicine) 的迭代器，顺序与 due_report 一致"""
+        cursor = self.conn.execute(_DUE_REPORT, {'today': today_day, 'days': reminder_days})
+        return _iter_cursor(cursor, batch_size, lambda row: (row[0], DueMedicine._make(row[2:])))
+
+    def dosage_rows(self):
+        """全部药物的 (ID, 每日服用片数, 快照药量, 快照日期序号, 下次需买药日期序号)，
+
+        全部为数值（下次需买药日期无效时为-1），可以直接转换成NumPy数组。
+        """
+        return self.conn.execute(_DOSAGE_ROWS).fetchall()
+
+    def set_next_purchase_days(self, days_and_ids) -> int:
+        """在一个事务中批量修改下次需买药时间，参数为 (天数序号, ID) 的迭代器，返回修改的行数"""
+        conn = self.conn
+        cache_size = conn.execute('PRAGMA cache_size').fetchone()[0]
+        conn.execute(f'PRAGMA cache_size = -{_BULK_CACHE_KB}')
+        try:
+            with conn:
+                cursor = conn.executemany(_SET_NEXT_PURCHASE_DAY, days_and_ids)
+        finally:
+            conn.execute(f'PRAGMA cache_size = {cache_size}')
+        return cursor.rowcount
+
+    def next_purchase_days(self):
+        """全部药物的 (ID, 下次需买药天数序号)，供提醒调度启动时读取"""
+        return self.conn.execute(_NEXT_PURCHASE_DAYS).fetchall()
+
+    # ---- 提醒状态 ----
+
+    def _reminder_batch(self, sql, today_day, reminder_days, now) -> ReminderBatch:
+        groups = tuple([] for _ in DUE_BUCKETS)
+        counts = [0] * len(DUE_BUCKETS)
+        keys = []
+        for bucket, bucket_count, *medicine, medicine_id, due_day in self.conn.execute(
+                sql, {'today': today_day, 'days': reminder_days, 'now': reminder_time(now)}):
+            counts[bucket] = bucket_count
+            groups[bucket].append(DueMedicine._make(medicine))
+            keys.append(ReminderKey(medicine_id, due_day, bucket))
+        return ReminderBatch(DueReport(today_day, reminder_days, sum(counts), tuple(counts), groups), keys)
+
+    def pending_reminders(self, today_day, reminder_days, now: datetime) -> ReminderBatch:
+        """需要发出的提醒：新进入提醒范围、断药日期变化、分组升级或推迟时间已到的药物
+
+        已提醒且没有变化的药物不在其中，没有变化时结果为空，调用方不需要重新生成和显示提醒内容。
+        """
+        return self._reminder_batch(_PENDING_REMINDERS, today_day, reminder_days, now)
+
+    def unacknowledged_reminders(self, today_day, reminder_days, now: datetime) -> ReminderBatch:
+        """已经提醒过、还没有确认的药物（推迟中的除外），提醒窗口显示这些药物"""
+        return self._reminder_batch(_UNACKNOWLEDGED_REMINDERS, today_day, reminder_days, now)
+
+    def open_reminders(self, today_day, reminder_days, now: datetime) -> ReminderBatch:
+        """提醒窗口显示的药物：未确认的，以及待发出、通知还没有发送成功的"""
+        return self._reminder_batch(_OPEN_REMINDERS, today_day, reminder_days, now)
+
+    def mark_reminded(self, keys: Iterable[ReminderKey], now: datetime):
+        """记录已发出提醒，now 为检查提醒的时间
+
+        清除之前的确认和推迟；now 之后（通知发送期间）在提醒窗口中做的确认和推迟保留。
+        """
+        reminded_at = reminder_time(now)
+        with self.conn:
+            self.conn.executemany(_MARK_REMINDED, ((key.medicine_id, key.due_day, key.bucket, reminded_at)
+                                                   for key in keys))
+
+    def acknowledge_reminders(self, keys: Iterable[ReminderKey], now: datetime):
+        """确认提醒：同一断药日期、同一分组不再提醒（还没有记录为已提醒的也不再发送）"""
+        acknowledged_at = reminder_time(now)
+        with self.conn:
+            self.conn.executemany(_ACKNOWLEDGE_REMINDER, (
+                {'id': key.medicine_id, 'due_day': key.due_day, 'bucket': key.bucket, 'now': acknowledged_at}
+                for key in keys))
+
+    def snooze_reminders(self, keys: Iterable[ReminderKey], until: datetime):
+        """推迟提醒到 until，到时作为待发出的提醒重新提醒"""
+        snoozed_until = reminder_time(until)
+        now = reminder_time(datetime.now())
+        with self.conn:
+            self.conn.executemany(_SNOOZE_REMINDER, (
+                {'id': key.medicine_id, 'due_day': key.due_day, 'bucket': key.bucket, 'now': now,
+                 'until': snoozed_until}
+                for key in keys))
+
+    # ---- 设置 ----
+
+    def get_setting(self, name, default=None):
+        """读取单个设置值"""
+        row = self.conn.execute(_GET_SETTING, (name,)).fetchone()
+        return row[0] if row else default
+
+    def all_settings(self) -> dict:
+        """全部设置（名称 -> 值），供设置服务启动时一次读取（见 settings.py）"""
+        return dict(self.conn.execute(_ALL_SETTINGS).fetchall())
+
+    def set_settings(self, values):
+        """在一个事务中保存多个设置"""
+        with self.conn:
+            self.conn.executemany(_SET_SETTING, values.items())
+
+
+# 每个公开方法的耗时记录为 db.方法名（见 metrics.py）；iter_* 返回迭代器，只计入执行查询的时间
+instrument_methods(MedicineRepository, 'db')
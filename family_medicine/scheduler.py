@@ -0,0 +1,253 @@
+"""
+事件驱动的提醒调度
+
+原来的提醒线程每10秒查询一次设置，每个间隔都重新扫描全部药物。
+ReminderScheduler 启动时读取一次各药物的下次需买药日期（整数天数序号），之后只靠内存中的最小堆工作：
+堆里是每种药物“进入提醒范围”的时间（下次需买药日期 - 断药提前检测天数，当天零点），
+线程一直睡到最近的一个时间点，或者被设置变化、药物增删改等事件唤醒，空闲时不访问数据库。
+存在需要提醒的药物时，按自动提醒间隔时间重复提醒。
+"""
+
+import heapq
+import threading
+from datetime import datetime, time as dt_time, timedelta
+
+from .days import from_day, to_day
+
+# 最长睡眠时间：防止系统休眠或调整时钟后错过时间点（只做内存计算，不访问数据库）
+MAX_SLEEP_SECONDS = 3600
+
+
+class ReminderScheduler:
+    """提醒调度线程
+
+    on_due() 在调度线程中调用，表示现在应该检查并显示提醒（由调用方转到界面线程）。
+    药物数据变化后调用 medicine_changed / medicine_removed，设置变化后调用
+    set_reminder_days / set_interval（或把 settings_changed 订阅到设置服务），调度器据此调整下一次唤醒时间。
+    """
+
+    def __init__(self, repo, on_due, reminder_days=2, interval_minutes=5, clock=datetime.now):
+        self.repo = repo
+        self.on_due = on_due
+        self.reminder_days = reminder_days
+        self.interval = timedelta(minutes=interval_minutes)
+        self.clock = clock
+
+        self._cond = threading.Condition()
+        self._next_days = {}      # 药物ID -> 下次需买药日期的天数序号
+        self._thresholds = {}     # 尚未进入提醒范围的药物ID -> 进入时间
+        self._heap = []           # (进入时间, 药物ID)，过期条目在弹出时丢弃
+        self._due_ids = set()     # 已进入提醒范围的药物
+        self._next_nag = None     # 下一次重复提醒的时间
+        self._fire_requested = False
+        self._changed = False
+        self._reload_requested = False
+        self._stopped = False
+        self._loaded = False
+        self._early_events = []   # 启动读取完成前收到的药物变化，读取后重放
+        self._thread = threading.Thread(target=self._run, name="reminder-scheduler", daemon=True)
+
+    # ---- 生命周期 ----
+
+    def start(self):
+        """读取药物日期并启动调度线程，启动后立即检查一次"""
+        self._fire_requested = True
+        self._thread.start()
+
+    def stop(self):
+        """停止调度线程"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join(timeout=2)
+
+    # ---- 事件 ----
+
+    def check_now(self):
+        """立即检查一次提醒"""
+        with self._cond:
+            self._fire_requested = True
+            self._wake()
+
+    def medicine_changed(self, medicine_id, next_purchase_date):
+        """新增或修改了药物（next_purchase_date 为 YYYY-MM-DD）"""
+        with self._cond:
+            if not self._loaded:
+                self._early_events.append(lambda: self.medicine_changed(medicine_id, next_purchase_date))
+                return
+            self._next_days[medicine_id] = to_day(next_purchase_date)
+            self._schedule(medicine_id, self.clock())
+            self._wake()
+
+    def medicine_removed(self, medicine_ids):
+        """删除了药物"""
+        medicine_ids = list(medicine_ids)
+        with self._cond:
+            if not self._loaded:
+                self._early_events.append(lambda: self.medicine_removed(medicine_ids))
+                return
+            for medicine_id in medicine_ids:
+                self._next_days.pop(medicine_id, None)
+                self._thresholds.pop(medicine_id, None)
+                self._due_ids.discard(medicine_id)
+            self._wake()
+
+    def reload(self):
+        """药物数据整体变化（例如批量导入）后重新读取全部日期，在调度线程中执行"""
+        with self._cond:
+            self._reload_requested = True
+            self._wake()
+
+    def set_reminder_days(self, reminder_days):
+        """断药提前检测天数变化：用内存中的日期重新计算全部时间点"""
+        with self._cond:
+            if reminder_days == self.reminder_days:
+                return
+            self.reminder_days = reminder_days
+            self._rebuild(self.clock())
+            self._wake()
+
+    def set_interval(self, interval_minutes):
+        """自动提醒间隔时间变化"""
+        with self._cond:
+            interval = timedelta(minutes=interval_minutes)
+            if interval == self.interval:
+                return
+            self.interval = interval
+            if self._next_nag is not None:
+                self._next_nag = self.clock() + interval
+            self._wake()
+
+    def settings_changed(self, changes):
+        """设置服务的订阅回调（见 settings.py）：断药提前检测天数或自动提醒间隔时间变化时调整"""
+        try:
+            if 'reminder_days' in changes:
+                self.set_reminder_days(int(changes['reminder_days']))
+            if 'reminder_interval' in changes:
+                self.set_interval(int(changes['reminder_interval']))
+        except ValueError as e:
+            print(f"提醒设置无效: {str(e)}")
+
+    # ---- 内部实现（调用时持有锁） ----
+
+    def _wake(self):
+        self._changed = True
+        self._cond.notify()
+
+    def _threshold(self, medicine_id):
+        return datetime.combine(from_day(self._next_days[medicine_id] - self.reminder_days), dt_time.min)
+
+    def _schedule(self, medicine_id, now):
+        """根据日期把药物放入提醒集合或堆中"""
+        threshold = self._threshold(medicine_id)
+        if threshold <= now:
+            self._thresholds.pop(medicine_id, None)
+            self._due_ids.add(medicine_id)
+            if self._next_nag is None:
+                # 修改数据不立即弹窗，与原来一样在下一个间隔提醒
+                self._next_nag = now + self.interval
+        else:
+            self._due_ids.discard(medicine_id)
+            self._thresholds[medicine_id] = threshold
+            heapq.heappush(self._heap, (threshold, medicine_id))
+
+    def _rebuild(self, now):
+        self._thresholds.clear()
+        self._due_ids.clear()
+        self._heap = []
+        for medicine_id in self._next_days:
+            threshold = self._threshold(medicine_id)
+            if threshold <= now:
+                self._due_ids.add(medicine_id)
+            else:
+                self._thresholds[medicine_id] = threshold
+                self._heap.append((threshold, medicine_id))
+        heapq.heapify(self._heap)
+        if not self._due_ids:
+            self._next_nag = None
+        elif self._next_nag is None:
+            self._next_nag = now + self.interval
+
+    def _pop_crossed(self, now):
+        """把已到时间的药物移入提醒集合，返回是否有新进入的"""
+        crossed = False
+        while self._heap and self._heap[0][0] <= now:
+            threshold, medicine_id = heapq.heappop(self._heap)
+            if self._thresholds.get(medicine_id) != threshold:
+                continue  # 已修改或删除的旧条目
+            del self._thresholds[medicine_id]
+            self._due_ids.add(medicine_id)
+            crossed = True
+        return crossed
+
+    def _next_wakeup(self):
+        while self._heap and self._thresholds.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        candidates = [t for t in (self._heap[0][0] if self._heap else None, self._next_nag) if t is not None]
+        return min(candidates) if candidates else None
+
+    def _load(self):
+        # 调度线程通过连接池使用自己的连接，线程结束时归还
+        next_days = dict(self.repo.next_purchase_days())
+        with self._cond:
+            self._next_days = next_days
+            self._rebuild(self.clock())
+
+    def _finish_loading(self):
+        with self._cond:
+            self._loaded = True
+            early_events, self._early_events = self._early_events, []
+        for event in early_events:
+            event()
+
+    def _run(self):
+        try:
+            self._loop()
+        finally:
+            self.repo.release()
+
+    def _loop(self):
+        try:
+            self._load()
+        except Exception as e:
+            print(f"提醒线程读取药物数据失败: {str(e)}")
+        self._finish_loading()
+
+        while True:
+            with self._cond:
+                reload, self._reload_requested = self._reload_requested, False
+            if reload:
+                try:
+                    self._load()
+                except Exception as e:
+                    print(f"提醒线程读取药物数据失败: {str(e)}")
+
+            with self._cond:
+                if self._stopped:
+                    return
+                now = self.clock()
+                crossed = self._pop_crossed(now)
+                nag = self._next_nag is not None and now >= self._next_nag
+                fire = crossed or nag or self._fire_requested
+                self._fire_requested = False
+                if fire:
+                    self._next_nag = now + self.interval if self._due_ids else None
+                elif not self._due_ids:
+                    self._next_nag = None
+
+            if fire:
+                try:
+                    self.on_due()
+                except Exception as e:
+                    print(f"提醒检查出错: {str(e)}")
+
+            with self._cond:
+                if self._stopped:
+                    return
+                if not self._changed:
+                    wakeup = self._next_wakeup()
+                    timeout = MAX_SLEEP_SECONDS
+                    if wakeup is not None:
+                        timeout = min(timeout, max(0.0, (wakeup - self.clock()).total_seconds()))
+                    self._cond.wait(timeout)
+                self._changed = False
@@ -0,0 +1,101 @@
+"""
+后台搜索线程
+
+界面每次输入都提交一次查询，但只有最新的一次会被执行和返回：
+排队中的旧查询直接被新查询替换，正在执行的旧查询通过 sqlite3 的 interrupt() 中止，
+结果交回界面线程前再检查一次是否已经过期。
+"""
+
+import sqlite3
+import threading
+
+from .metrics import timer
+
+
+class SearchWorker:
+    """在独立线程上执行搜索（通过连接池使用该线程自己的连接）
+
+    post(fn) 负责把 fn 转到界面线程执行，例如 lambda fn: root.after(0, fn)。
+    每次搜索返回结果数量和第一页数据，表格之后按需读取其他行。
+    """
+
+    def __init__(self, repo, post, page_size=50):
+        self.repo = repo
+        self.post = post
+        self.page_size = page_size
+        self._cond = threading.Condition()
+        self._pending = None          # 等待执行的查询 (序号, 关键字, 回调)
+        self._generation = 0          # 最新一次提交的序号
+        self._running_generation = None
+        self._stopped = False
+        self._conn = None             # 搜索线程的连接，用于 interrupt()
+        self._thread = threading.Thread(target=self._run, name="search-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, term, callback):
+        """提交搜索，callback(term, total, rows) 在界面线程中调用；之前未完成的搜索作废"""
+        with self._cond:
+            self._generation += 1
+            self._pending = (self._generation, term, callback)
+            if self._running_generation is not None and self._conn is not None:
+                # 中止正在执行的过期查询
+                self._conn.interrupt()
+            self._cond.notify()
+
+    def stop(self):
+        """停止后台线程"""
+        with self._cond:
+            self._stopped = True
+            self._pending = None
+            if self._conn is not None:
+                self._conn.interrupt()
+            self._cond.notify()
+        self._thread.join(timeout=2)
+
+    def _run(self):
+        conn = self.repo.conn
+        with self._cond:
+            self._conn = conn
+        try:
+            while True:
+                with self._cond:
+                    while self._pending is None and not self._stopped:
+                        self._cond.wait()
+                    if self._stopped:
+                        break
+                    job = self._pending
+                    self._pending = None
+                    self._running_generation = job[0]
+                try:
+                    self._execute(job)
+                finally:
+                    with self._cond:
+                        self._running_generation = None
+        finally:
+            with self._cond:
+                self._conn = None
+            self.repo.release()
+
+    def _execute(self, job):
+        generation, term, callback = job
+        try:
+            with timer('search'):
+                total = self.repo.count(term)
+                rows = self.repo.page(0, self.page_size, term)
+        except sqlite3.OperationalError as e:
+            if 'interrupted' not in str(e):
+                print(f"搜索失败: {str(e)}")
+                return
+            with self._cond:
+                if generation == self._generation and self._pending is None and not self._stopped:
+                    # interrupt() 落在了最新的查询上，重新执行
+                    self._pending = job
+            return
+        if generation != self._generation:
+            return  # 执行期间已有新的输入
+        self.post(lambda: self._deliver(generation, term, total, rows, callback))
+
+    def _deliver(self, generation, term, total, rows, callback):
+        # 在界面线程中再检查一次，排队期间可能又有新的输入
+        if generation == self._generation:
+            callback(term, total, rows)
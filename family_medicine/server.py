@@ -0,0 +1,375 @@
+"""
+本地JSON接口服务
+
+用标准库 asyncio 实现的小型HTTP服务，局域网内的平板或脚本可以直接读写同一个数据库，
+不需要在同一个文件上打开多个图形界面。事件循环只负责收发请求，数据库操作交给线程池执行，
+每个线程通过连接池使用自己的连接（WAL模式，读取互不阻塞，写入按 busy_timeout 排队）。
+
+接口（请求和响应都是JSON，出错时返回 {"error": 原因}）:
+    GET    /health                     服务状态
+    GET    /medicines?q=&offset=&limit= 药物列表（按购药时间排序，分页），指定 q 时为搜索结果
+                                       （3个字及以上且支持全文索引时按相关度排序，否则按购药时间排序）
+    GET    /medicines/<id>             单个药物
+    POST   /medicines                  添加药物，下次需买药时间自动计算
+    PUT    /medicines/<id>             修改药物
+    DELETE /medicines/<id>             删除药物
+    POST   /medicines/batch            批量添加（同一使用人的品名及规格已存在时更新），{"items": [...]}，一个事务
+    POST   /medicines/delete           批量删除，{"ids": [...]}，一个事务
+    GET    /due?days=N                 需要购买的药物（包括已过期的），默认使用程序中的设置
+    GET    /metrics                    各接口和数据库操作的耗时统计（次数、p50/p95/p99，见 metrics.py）
+
+药物字段与数据库列名一致: name_spec, user_name, daily_pills, pills_per_box, boxes_purchased, purchase_date, notes。
+默认只监听本机（127.0.0.1）；监听局域网地址时建议用 --token 要求请求带 Authorization: Bearer <token>。
+
+命令行用法: python3 -m family_medicine.server [--host 127.0.0.1] [--port 8765] [--token 口令]
+                                           [--db 数据库路径 | --household 家庭名称]
+"""
+
+import argparse
+import asyncio
+import hmac
+import json
+import re
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from .days import today_day
+from .importer import parse_record
+from .metrics import registry, timer
+from .repository import BUCKET_NAMES, DUE_BUCKETS, MedicineRepository
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# 执行数据库操作的线程数（每个线程一个连接）
+DEFAULT_WORKERS = 4
+# 请求体最大字节数（批量接口也受此限制）
+MAX_BODY_BYTES = 8 * 1024 * 1024
+MAX_HEADERS = 100
+# 保持连接的空闲超时时间（秒）
+KEEP_ALIVE_SECONDS = 30
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# SQLite 整数的最大值，更大的编号不可能存在（传给 sqlite3 会 OverflowError）
+MAX_ID = 2 ** 63 - 1
+
+
+class ApiError(Exception):
+    """返回给客户端的错误，status 为HTTP状态码"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _medicine_json(record):
+    return record._asdict()
+
+
+def _query_int(query, name, default, minimum=0, maximum=None):
+    values = query.get(name)
+    if not values:
+        return default
+    try:
+        value = int(values[-1])
+    except ValueError:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"参数 {name} 必须是整数")
+    if value < minimum or (maximum is not None and value > maximum):
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"参数 {name} 超出范围")
+    return value
+
+
+def _path_id(text):
+    """路径中的药物编号，超出SQLite整数范围的编号不存在"""
+    medicine_id = int(text)
+    if medicine_id > MAX_ID:
+        raise ApiError(HTTPStatus.NOT_FOUND, "药物不存在")
+    return medicine_id
+
+
+def _json_object(body, key=None):
+    """请求体必须是JSON对象；指定 key 时返回该键对应的列表"""
+    if not isinstance(body, dict):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "请求体必须是JSON对象")
+    if key is None:
+        return body
+    items = body.get(key)
+    if not isinstance(items, list):
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"请求体中缺少列表 {key}")
+    return items
+
+
+class MedicineApi:
+    """接口处理函数（在线程池中执行，只访问数据层）"""
+
+    def __init__(self, repo):
+        self.repo = repo
+        self.routes = [
+            ('GET', re.compile(r'/health'), self.health),
+            ('GET', re.compile(r'/medicines'), self.list_medicines),
+            ('POST', re.compile(r'/medicines'), self.add_medicine),
+            ('POST', re.compile(r'/medicines/batch'), self.add_batch),
+            ('POST', re.compile(r'/medicines/delete'), self.delete_batch),
+            ('GET', re.compile(r'/medicines/(\d+)'), self.get_medicine),
+            ('PUT', re.compile(r'/medicines/(\d+)'), self.update_medicine),
+            ('DELETE', re.compile(r'/medicines/(\d+)'), self.delete_medicine),
+            ('GET', re.compile(r'/due'), self.due),
+            ('GET', re.compile(r'/metrics'), self.metrics),
+        ]
+
+    def route(self, method, path):
+        """返回 (处理函数, 路径参数)，路径存在但方法不支持时抛出405"""
+        allowed = False
+        for route_method, pattern, handler in self.routes:
+            match = pattern.fullmatch(path)
+            if match:
+                if route_method == method:
+                    return handler, match.groups()
+                allowed = True
+        if allowed:
+            raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED, "不支持的请求方法")
+        raise ApiError(HTTPStatus.NOT_FOUND, "接口不存在")
+
+    def _get_or_404(self, medicine_id):
+        record = self.repo.get(medicine_id)
+        if record is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, "药物不存在")
+        return record
+
+    def health(self, query, body):
+        return HTTPStatus.OK, {'status': 'ok', 'medicines': self.repo.count()}
+
+    def list_medicines(self, query, body):
+        term = (query.get('q') or [''])[-1].strip()
+        offset = _query_int(query, 'offset', 0, maximum=MAX_ID)
+        limit = _query_int(query, 'limit', DEFAULT_PAGE_SIZE, minimum=1, maximum=MAX_PAGE_SIZE)
+        return HTTPStatus.OK, {
+            'total': self.repo.count(term),
+            'offset': offset,
+            'items': [_medicine_json(record) for record in self.repo.page(offset, limit, term)],
+        }
+
+    def get_medicine(self, query, body, medicine_id):
+        return HTTPStatus.OK, _medicine_json(self._get_or_404(_path_id(medicine_id)))
+
+    def add_medicine(self, query, body):
+        medicine_id = self.repo.add(*parse_record(_json_object(body)))
+        return HTTPStatus.CREATED, _medicine_json(self.repo.get(medicine_id))
+
+    def update_medicine(self, query, body, medicine_id):
+        medicine_id = _path_id(medicine_id)
+        params = parse_record(_json_object(body))
+        self._get_or_404(medicine_id)
+        self.repo.update(medicine_id, *params)
+        return HTTPStatus.OK, _medicine_json(self.repo.get(medicine_id))
+
+    def delete_medicine(self, query, body, medicine_id):
+        if not self.repo.delete([_path_id(medicine_id)]):
+            raise ApiError(HTTPStatus.NOT_FOUND, "药物不存在")
+        return HTTPStatus.OK, {'deleted': 1}
+
+    def add_batch(self, query, body):
+        """先校验全部条目，有错误时一条也不写入，返回每条错误的序号和原因"""
+        rows = []
+        errors = []
+        for index, item in enumerate(_json_object(body, 'items')):
+            try:
+                rows.append(parse_record(_json_object(item)))
+            except (ValueError, ApiError) as e:
+                errors.append({'index': index, 'error': str(e)})
+        if errors:
+            return HTTPStatus.BAD_REQUEST, {'error': "部分条目有误，未写入任何数据", 'errors': errors}
+        return HTTPStatus.OK, {'imported': self.repo.import_rows([rows])}
+
+    def delete_batch(self, query, body):
+        ids = _json_object(body, 'ids')
+        if not all(isinstance(medicine_id, int) and not isinstance(medicine_id, bool)
+                   and -MAX_ID <= medicine_id <= MAX_ID for medicine_id in ids):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "ids 必须是整数列表（每个编号不超过SQLite整数范围）")
+        return HTTPStatus.OK, {'deleted': self.repo.delete(ids)}
+
+    def due(self, query, body):
+        days = _query_int(query, 'days', None, maximum=3650)
+        if days is None:
+            days = int(self.repo.get_setting('reminder_days', '2'))
+        report = self.repo.due_report(today_day(), days)
+        return HTTPStatus.OK, {
+            'reminder_days': days,
+            'total': report.total,
+            'counts': {BUCKET_NAMES[bucket]: report.counts[bucket] for bucket in DUE_BUCKETS},
+            'items': [{'status': BUCKET_NAMES[bucket], **medicine._asdict()}
+                      for bucket, medicine in report.medicines()],
+        }
+
+    def metrics(self, query, body):
+        return HTTPStatus.OK, {'since': registry.started.isoformat(timespec='seconds'),
+                               'metrics': registry.snapshot()}
+
+    def handle(self, method, target, body):
+        """执行一个请求，返回 (状态码, JSON对象)"""
+        url = urlsplit(target)
+        handler, args = self.route(method, url.path.rstrip('/') or '/')
+        try:
+            with timer(f'api.{handler.__name__}'):
+                return handler(parse_qs(url.query), body, *args)
+        except ValueError as e:
+            raise ApiError(HTTPStatus.BAD_REQUEST, str(e))
+        except sqlite3.IntegrityError:
+            raise ApiError(HTTPStatus.CONFLICT, "该使用人的品名及规格已存在")
+
+
+class ApiServer:
+    """asyncio HTTP/1.1 服务：解析请求、鉴权，把处理函数交给线程池执行"""
+
+    def __init__(self, repo, token=None, workers=DEFAULT_WORKERS):
+        self.repo = repo
+        self.api = MedicineApi(repo)
+        self.token = token
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='api-db')
+        self.server = None
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.server = await asyncio.start_server(self.handle_connection, host, port)
+        return self.server
+
+    def close(self):
+        """停止接受连接，等待数据库线程结束后关闭全部连接"""
+        if self.server is not None:
+            self.server.close()
+        self.executor.shutdown(wait=True)
+        self.repo.close()
+
+    def _authorized(self, headers):
+        if not self.token:
+            return True
+        expected = f"Bearer {self.token}"
+        return hmac.compare_digest(headers.get('authorization', '').encode(), expected.encode())
+
+    async def _read_request(self, reader):
+        """读取一个请求，连接关闭时返回None"""
+        request_line = await asyncio.wait_for(reader.readline(), KEEP_ALIVE_SECONDS)
+        if not request_line:
+            return None
+        try:
+            method, target, version = request_line.decode('latin-1').split()
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "请求行格式错误")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            if len(headers) >= MAX_HEADERS:
+                raise ApiError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "请求头过多")
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Content-Length 格式错误")
+        if length < 0:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Content-Length 格式错误")
+        if length > MAX_BODY_BYTES:
+            raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "请求体过大")
+        body = None
+        if length:
+            try:
+                body = json.loads(await reader.readexactly(length))
+            except (UnicodeDecodeError, json.JSONDecodeError):
+                raise ApiError(HTTPStatus.BAD_REQUEST, "请求体不是有效的JSON")
+        keep_alive = headers.get('connection', '').lower() != 'close' if version == 'HTTP/1.1' \
+            else headers.get('connection', '').lower() == 'keep-alive'
+        return method.upper(), target, headers, body, keep_alive
+
+    async def _respond(self, writer, status, payload, keep_alive):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        status = HTTPStatus(status)
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + data)
+        await writer.drain()
+
+    async def handle_connection(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except ApiError as e:
+                    await self._respond(writer, e.status, {'error': str(e)}, False)
+                    break
+                if request is None:
+                    break
+                method, target, headers, body, keep_alive = request
+                if not self._authorized(headers):
+                    status, payload = HTTPStatus.UNAUTHORIZED, {'error': "缺少或错误的访问口令"}
+                else:
+                    try:
+                        status, payload = await loop.run_in_executor(
+                            self.executor, self.api.handle, method, target, body)
+                    except ApiError as e:
+                        status, payload = e.status, {'error': str(e)}
+                    except sqlite3.Error as e:
+                        status, payload = HTTPStatus.SERVICE_UNAVAILABLE, {'error': f"数据库错误: {str(e)}"}
+                    except Exception as e:
+                        # 未预料的错误也要返回响应，之后关闭连接
+                        print(f"处理请求 {method} {target} 出错: {e!r}", file=sys.stderr)
+                        status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': "服务内部错误"}
+                        keep_alive = False
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            print(f"处理连接出错: {e!r}", file=sys.stderr)
+            try:
+                await self._respond(writer, HTTPStatus.INTERNAL_SERVER_ERROR, {'error': "服务内部错误"}, False)
+            except Exception:
+                pass
+        finally:
+            writer.close()
+
+
+async def serve(repo, host=DEFAULT_HOST, port=DEFAULT_PORT, token=None, workers=DEFAULT_WORKERS):
+    """启动服务并一直运行，直到被取消"""
+    api_server = ApiServer(repo, token, workers)
+    server = await api_server.start(host, port)
+    addresses = ', '.join(f"{sock.getsockname()[0]}:{sock.getsockname()[1]}" for sock in server.sockets)
+    print(f"接口服务已启动: http://{addresses}/", file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        api_server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地JSON接口服务（局域网内的设备或脚本可以读写同一个药物数据库）")
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f"监听地址，默认 {DEFAULT_HOST}（只允许本机访问）")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"端口，默认 {DEFAULT_PORT}")
+    parser.add_argument('--token', help="访问口令，设置后请求必须带 Authorization: Bearer <口令>")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="执行数据库操作的线程数")
+    database = parser.add_mutually_exclusive_group()
+    database.add_argument('--db', help="数据库路径，默认 ~/.family-medicine-manager/medicine.db")
+    database.add_argument('--household', help="使用指定家庭的分库（见 households.py）")
+    args = parser.parse_args(argv)
+
+    db_path = args.db
+    if args.household:
+        from .households import household_db_path
+        db_path = household_db_path(args.household)
+    repo = MedicineRepository(db_path)
+    try:
+        asyncio.run(serve(repo, args.host, args.port, args.token, args.workers))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
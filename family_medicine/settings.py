@@ -0,0 +1,141 @@
+"""
+设置服务
+
+SettingsStore 在打开时一次读取全部设置，之后的读取只查内存中的字典，不访问数据库。
+修改设置时先更新内存并立即通知订阅者（例如提醒调度线程），写入数据库由后台线程防抖合并：
+最后一次修改后 delay 秒内没有新的修改时，把期间所有变化的设置在一个事务中写入。
+值没有变化的修改直接忽略，同一次操作触发多个事件（例如下拉框的 trace 和 <<ComboboxSelected>>）也只处理一次。
+"""
+
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+# 最后一次修改后等待多久写入数据库（秒）
+WRITE_DELAY_SECONDS = 0.5
+
+
+class SettingsStore:
+    """内存中的设置，合并写入数据库，变化时通知订阅者
+
+    值统一保存为字符串（与设置表一致）。订阅者 callback(changes) 在修改设置的线程中同步调用，
+    changes 为 名称 -> 新值，只包含订阅的名称中实际变化的设置。
+    """
+
+    def __init__(self, repo, delay=WRITE_DELAY_SECONDS):
+        self.repo = repo
+        self.delay = delay
+        self._values = repo.all_settings()
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()   # 保证多次写入按修改的先后提交
+        self._dirty = {}                      # 尚未写入数据库的设置
+        self._last_change = 0.0
+        self._subscribers = []
+        self._closed = False
+        self._thread = None
+
+    # ---- 读取 ----
+
+    def get(self, name, default=None) -> Optional[str]:
+        return self._values.get(name, default)
+
+    def get_int(self, name, default: int) -> int:
+        """读取整数设置，没有设置或不是整数时返回 default"""
+        try:
+            return int(self._values.get(name, default))
+        except (TypeError, ValueError):
+            return default
+
+    # ---- 修改 ----
+
+    def set(self, name, value) -> Dict[str, str]:
+        return self.update({name: value})
+
+    def update(self, values) -> Dict[str, str]:
+        """修改多个设置，返回实际变化的设置（没有变化时为空，不写入也不通知）"""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("设置服务已关闭")
+            changes = {name: str(value) for name, value in values.items() if self._values.get(name) != str(value)}
+            if not changes:
+                return changes
+            self._values.update(changes)
+            self._dirty.update(changes)
+            self._last_change = time.monotonic()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="settings-writer", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+            subscribers = list(self._subscribers)
+        for names, callback in subscribers:
+            relevant = changes if names is None else {name: changes[name] for name in changes if name in names}
+            if relevant:
+                try:
+                    callback(relevant)
+                except Exception as e:
+                    print(f"设置变化通知出错: {str(e)}")
+        return changes
+
+    def subscribe(self, callback: Callable[[Dict[str, str]], None],
+                  names: Optional[Iterable[str]] = None) -> Callable[[], None]:
+        """订阅设置变化（names 为None时订阅全部设置），返回取消订阅的函数"""
+        entry = (frozenset(names) if names is not None else None, callback)
+        with self._cond:
+            self._subscribers.append(entry)
+
+        def unsubscribe():
+            with self._cond:
+                if entry in self._subscribers:
+                    self._subscribers.remove(entry)
+        return unsubscribe
+
+    # ---- 写入 ----
+
+    def flush(self):
+        """立即在当前线程中写入尚未保存的设置"""
+        self._write_pending()
+
+    def close(self, timeout=2):
+        """写入尚未保存的设置并停止后台线程"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _write_pending(self):
+        with self._write_lock:
+            with self._cond:
+                pending, self._dirty = self._dirty, {}
+            if not pending:
+                return
+            try:
+                self.repo.set_settings(pending)
+            except sqlite3.Error as e:
+                print(f"保存设置失败: {str(e)}")
+                with self._cond:
+                    # 放回待写入的设置（期间的新修改优先），过 delay 秒后重试
+                    self._dirty = {**pending, **self._dirty}
+                    self._last_change = time.monotonic()
+
+    def _run(self):
+        # 写入线程通过连接池使用自己的连接，线程结束时归还
+        try:
+            while True:
+                with self._cond:
+                    while not self._dirty and not self._closed:
+                        self._cond.wait()
+                    if not self._closed:
+                        # 防抖：最后一次修改后 delay 秒内没有新的修改才写入
+                        wait = self._last_change + self.delay - time.monotonic()
+                        if wait > 0:
+                            self._cond.wait(wait)
+                            continue
+                    closed = self._closed
+                self._write_pending()
+                if closed:
+                    return
+        finally:
+            self.repo.release()
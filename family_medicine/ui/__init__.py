@@ -0,0 +1,3 @@
+"""
+图形界面组件（依赖tkinter，仅供 medicine_manager.py 使用）
+"""
@@ -0,0 +1,107 @@
+"""
+诊断信息窗口
+
+用表格显示 metrics.registry 中各操作的次数和耗时分布（p50/p95/p99、最大值、合计），
+按合计耗时从高到低排列，窗口打开期间定时刷新；也显示启动各阶段耗时，可以导出成JSON发给开发者。
+"""
+
+import tkinter as tk
+from tkinter import filedialog, messagebox, ttk
+
+from .. import metrics
+
+# 自动刷新间隔（毫秒）
+REFRESH_MS = 2000
+
+# (统计字段, 列标题, 列宽)
+COLUMNS = (
+    ('count', "次数", 70),
+    ('errors', "错误", 50),
+    ('p50_ms', "p50 (ms)", 80),
+    ('p95_ms', "p95 (ms)", 80),
+    ('p99_ms', "p99 (ms)", 80),
+    ('max_ms', "最大 (ms)", 80),
+    ('total_ms', "合计 (ms)", 90),
+)
+
+
+class DiagnosticsWindow(tk.Toplevel):
+    """各操作耗时统计窗口（非模态）"""
+
+    def __init__(self, master, trace=None, registry=None):
+        super().__init__(master)
+        self.trace = trace
+        self.registry = registry or metrics.registry
+        self.title("诊断信息")
+        self.geometry("760x440")
+        self.transient(master)
+        self._after_id = None
+
+        frame = ttk.Frame(self, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        self.info_var = tk.StringVar()
+        ttk.Label(frame, textvariable=self.info_var, justify=tk.LEFT).pack(anchor=tk.W, pady=(0, 8))
+
+        table_frame = ttk.Frame(frame)
+        table_frame.pack(fill=tk.BOTH, expand=True)
+        self.tree = ttk.Treeview(table_frame, columns=[field for field, _, _ in COLUMNS], height=14)
+        self.tree.heading('#0', text="操作")
+        self.tree.column('#0', width=200)
+        for field, heading, width in COLUMNS:
+            self.tree.heading(field, text=heading)
+            self.tree.column(field, width=width, anchor=tk.E)
+        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        buttons = ttk.Frame(frame)
+        buttons.pack(fill=tk.X, pady=(10, 0))
+        ttk.Button(buttons, text="关闭", command=self.close).pack(side=tk.RIGHT, padx=(5, 0))
+        ttk.Button(buttons, text="导出JSON...", command=self.export).pack(side=tk.RIGHT, padx=(5, 0))
+        ttk.Button(buttons, text="清零", command=self.reset).pack(side=tk.RIGHT, padx=(5, 0))
+        ttk.Button(buttons, text="刷新", command=self.refresh).pack(side=tk.RIGHT, padx=(5, 0))
+
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        self.bind('<Escape>', lambda e: self.close())
+        self.refresh()
+
+    def startup_marks(self):
+        return {stage: round(elapsed, 1) for stage, elapsed in self.trace.marks} if self.trace else {}
+
+    def refresh(self):
+        """重新读取统计，按合计耗时排序显示"""
+        if self._after_id is not None:
+            self.after_cancel(self._after_id)
+        snapshot = self.registry.snapshot()
+        info = f"统计开始于 {self.registry.started:%Y-%m-%d %H:%M:%S}，共 {len(snapshot)} 种操作"
+        if self.trace:
+            info += "\n" + self.trace.summary()
+        self.info_var.set(info)
+        self.tree.delete(*self.tree.get_children())
+        for name, summary in sorted(snapshot.items(), key=lambda item: -item[1]['total_ms']):
+            self.tree.insert('', 'end', text=name, values=[summary[field] for field, _, _ in COLUMNS])
+        self._after_id = self.after(REFRESH_MS, self.refresh)
+
+    def reset(self):
+        self.registry.reset()
+        self.refresh()
+
+    def export(self):
+        path = filedialog.asksaveasfilename(parent=self, title="导出诊断信息", defaultextension=".json",
+                                            filetypes=[("JSON文件", "*.json")])
+        if not path:
+            return
+        try:
+            self.registry.dump(path, startup_ms=self.startup_marks())
+        except OSError as e:
+            messagebox.showerror("错误", f"导出失败: {str(e)}", parent=self)
+            return
+        messagebox.showinfo("提示", f"已导出到:\n{path}", parent=self)
+
+    def close(self):
+        if self._after_id is not None:
+            self.after_cancel(self._after_id)
+            self._after_id = None
+        self.destroy()
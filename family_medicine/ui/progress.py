@@ -0,0 +1,81 @@
+"""
+后台任务和进度窗口
+
+导入、导出等耗时操作在后台线程执行，界面线程只显示一个不阻塞主窗口的进度窗口，
+进度文字和最终结果都通过 after() 交回界面线程。
+关闭主窗口前用 running_tasks() 检查是否还有任务在使用数据库，等它们结束后再关闭连接。
+"""
+
+import threading
+import tkinter as tk
+from tkinter import ttk
+
+# 正在运行的后台任务线程
+_tasks = set()
+_tasks_lock = threading.Lock()
+
+
+def running_tasks() -> int:
+    """仍在运行的后台任务数"""
+    with _tasks_lock:
+        return len(_tasks)
+
+
+class ProgressWindow(tk.Toplevel):
+    """显示一行进度文字和滚动进度条的小窗口"""
+
+    def __init__(self, master, title, text=""):
+        super().__init__(master)
+        self.title(title)
+        self.resizable(False, False)
+        self.transient(master)
+        # 任务结束时由调用方关闭
+        self.protocol("WM_DELETE_WINDOW", lambda: None)
+
+        frame = ttk.Frame(self, padding="15")
+        frame.pack(fill=tk.BOTH, expand=True)
+        self.text_var = tk.StringVar(value=text)
+        ttk.Label(frame, textvariable=self.text_var, width=40).pack(anchor=tk.W, pady=(0, 10))
+        self.bar = ttk.Progressbar(frame, mode='indeterminate', length=300)
+        self.bar.pack(fill=tk.X)
+        self.bar.start(15)
+
+    def set_text(self, text):
+        self.text_var.set(text)
+
+    def close(self):
+        self.bar.stop()
+        self.destroy()
+
+
+def run_task(root, title, work, on_done, text="正在处理..."):
+    """在后台线程执行 work(progress)，显示进度窗口
+
+    work 中调用 progress(文字) 更新进度（可以在后台线程中调用）；
+    完成后在界面线程关闭进度窗口并调用 on_done(结果, 异常)，成功时异常为None。
+    """
+    window = ProgressWindow(root, title, text)
+
+    def progress(message):
+        root.after(0, lambda: window.winfo_exists() and window.set_text(message))
+
+    def finish(result, error):
+        window.close()
+        on_done(result, error)
+
+    def target():
+        try:
+            result = work(progress)
+        except Exception as e:
+            root.after(0, lambda: finish(None, e))
+        else:
+            root.after(0, lambda: finish(result, None))
+        finally:
+            with _tasks_lock:
+                _tasks.discard(thread)
+
+    thread = threading.Thread(target=target, name=f"task-{title}", daemon=True)
+    with _tasks_lock:
+        _tasks.add(thread)
+    thread.start()
+    return window
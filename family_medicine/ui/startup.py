@@ -0,0 +1,52 @@
+"""
+启动计时和延迟加载
+
+主窗口先显示出来，再加载数据、创建日期选择器、启动提醒线程，
+StartupTrace 记录各阶段距脚本开始执行的时间（首次显示窗口、数据加载完成等），
+设置环境变量 FAMILY_MEDICINE_TRACE_STARTUP=1 时在数据加载完成后输出到标准错误。
+lazy_values 让下拉框在第一次展开时才生成选项列表，不占用启动时间。
+"""
+
+import os
+import sys
+import time
+
+# 设置此环境变量（非空）时输出启动计时
+TRACE_ENV = 'FAMILY_MEDICINE_TRACE_STARTUP'
+
+
+class StartupTrace:
+    """启动各阶段的耗时（毫秒），started 为计时起点（time.perf_counter() 的值）"""
+
+    def __init__(self, started=None, clock=time.perf_counter):
+        self.clock = clock
+        self.started = clock() if started is None else started
+        self.marks = []  # (阶段, 毫秒)
+
+    def mark(self, stage) -> float:
+        """记录到达某个阶段的时间，返回距起点的毫秒数"""
+        elapsed = (self.clock() - self.started) * 1000
+        self.marks.append((stage, elapsed))
+        return elapsed
+
+    def elapsed(self, stage):
+        """某个阶段的耗时（毫秒），没有记录时为None"""
+        for name, elapsed in self.marks:
+            if name == stage:
+                return elapsed
+        return None
+
+    def summary(self) -> str:
+        return "启动耗时: " + "，".join(f"{stage} {elapsed:.0f} ms" for stage, elapsed in self.marks)
+
+    def report(self, out=None):
+        """设置了环境变量 FAMILY_MEDICINE_TRACE_STARTUP 时输出各阶段耗时"""
+        if os.environ.get(TRACE_ENV):
+            print(self.summary(), file=out or sys.stderr)
+
+
+def lazy_values(combobox, make_values):
+    """下拉框第一次展开时才调用 make_values() 生成选项（当前显示的值不受影响）"""
+    def fill():
+        combobox.configure(values=make_values(), postcommand='')
+    combobox.configure(postcommand=fill)
@@ -0,0 +1,279 @@
+"""
+虚拟滚动表格
+
+ttk.Treeview 每插入一行都会创建一个Tk条目，数据量大时启动和每次刷新都很慢，内存也随行数增长。
+VirtualTable 只保留一屏数量的条目（固定的“槽位”），滚动时从数据层按需读取可见窗口，
+并在前后多读 overscan 行作为缓存，所以内存和重绘开销只与窗口高度有关，与总行数无关。
+增删改某一行时通过 insert_row/update_row/remove_rows 只更新受影响的条目，滚动位置和选择保持不变。
+"""
+
+import tkinter as tk
+from tkinter import ttk
+
+from ..metrics import timer
+
+
+class VirtualTable(ttk.Frame):
+    """只渲染可见行的表格
+
+    数据通过 fetch_count() 和 fetch_page(offset, limit) 按需读取，
+    每条记录是一个元组，key_index 指定其中作为记录ID的列，
+    sort_key(row) 返回排序依据，用于判断修改后的行是否需要移动位置。
+    sort_key 为None的数据源（例如搜索结果）新增、修改的行是否属于结果无法判断，insert_row/update_row 总是重新统计行数。
+    """
+
+    def __init__(self, master, columns, fetch_count, fetch_page, height=15, overscan=10, key_index=0,
+                 sort_key=None, **kwargs):
+        super().__init__(master, **kwargs)
+        self.fetch_count = fetch_count
+        self.fetch_page = fetch_page
+        self.overscan = overscan
+        self.key_index = key_index
+        self.sort_key = sort_key
+        self.visible_rows = height
+        self.total = 0
+        self.offset = 0
+
+        self._cache_offset = 0
+        self._cache = []        # 已读取的记录：可见窗口 + 前后overscan
+        self._slots = []        # 当前显示的条目，第i个槽位显示第 offset+i 行
+        self._slot_keys = {}    # 条目 -> 记录ID
+        self._items = {}        # 可见的记录ID -> 槽位序号
+        self._selected = set()  # 选中的记录ID，滚出可见区域后仍然保留
+
+        self.tree = ttk.Treeview(self, columns=columns, show='headings', height=height)
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.tree.bind('<Configure>', self._on_configure)
+        self.tree.bind('<<TreeviewSelect>>', self._on_select)
+        self.tree.bind('<ButtonPress-1>', self._on_click)
+        self.tree.bind('<MouseWheel>', self._on_mousewheel)
+        self.tree.bind('<Button-4>', lambda e: self.scroll(-3))
+        self.tree.bind('<Button-5>', lambda e: self.scroll(3))
+        self.tree.bind('<Up>', lambda e: self._on_arrow(-1))
+        self.tree.bind('<Down>', lambda e: self._on_arrow(1))
+        self.tree.bind('<Prior>', lambda e: self._scroll_and_break(-self.visible_rows))
+        self.tree.bind('<Next>', lambda e: self._scroll_and_break(self.visible_rows))
+        self.tree.bind('<Home>', lambda e: self._scroll_and_break(-self.total))
+        self.tree.bind('<End>', lambda e: self._scroll_and_break(self.total))
+
+    # ---- 数据源 ----
+
+    def set_source(self, fetch_count, fetch_page, total=None, first_rows=None, sort_key=None):
+        """切换数据源（例如搜索条件变化），回到第一行并清除选择
+
+        已在后台线程查好行数和第一页数据时通过 total/first_rows 传入，界面线程不再查询。
+        sort_key 为新数据源的排序依据；只有不筛选记录的数据源才能传入，否则修改的行可能已不在结果中。
+        """
+        self.fetch_count = fetch_count
+        self.fetch_page = fetch_page
+        self.sort_key = sort_key
+        self.offset = 0
+        self._selected.clear()
+        if total is None:
+            self.refresh()
+            return
+        self.total = total
+        self._cache = list(first_rows or ())
+        self._cache_offset = 0
+        self._render()
+
+    def refresh(self):
+        """重新统计行数并读取当前窗口，保持滚动位置和选择"""
+        self.total = self.fetch_count()
+        self._cache = []
+        self.offset = self._clamp(self.offset)
+        self._render()
+
+    # ---- 单行更新 ----
+
+    def insert_row(self, row):
+        """新增一条记录后调用：按 sort_key 判断新行的位置，只有落在已读取的范围内时才重读当前窗口
+
+        新行在缓存之前时缓存整体后移一行，在缓存之后时缓存不变，都不需要查询。
+        数据源没有 sort_key 时（筛选过的结果），新行不一定属于结果，重新统计行数并读取当前窗口。
+        """
+        if self.sort_key is None:
+            self.refresh()
+            return
+        self.total += 1
+        if self._cache:
+            key = self.sort_key(row)
+            if key < self.sort_key(self._cache[0]):
+                self._cache_offset += 1
+            elif not key > self.sort_key(self._cache[-1]):
+                self._cache = []
+        self._render()
+
+    def update_row(self, row):
+        """修改一条记录后调用：可见且排序位置不变时原地更新该条目
+
+        数据源没有 sort_key 时（筛选过的结果），修改后的行可能不再属于结果，重新统计行数并读取当前窗口。
+        """
+        if self.sort_key is None:
+            self.refresh()
+            return
+        key = row[self.key_index]
+        index = self._items.get(key)
+        if index is not None:
+            cache_index = self.offset - self._cache_offset + index
+            if self.sort_key(self._cache[cache_index]) == self.sort_key(row):
+                self._cache[cache_index] = tuple(row)
+                self.tree.item(self._slots[index], values=self._format(row))
+                return
+        # 位置可能变化（移入或移出可见区域），重读当前窗口
+        self._reload_window()
+
+    def remove_rows(self, keys):
+        """删除记录后调用：从选择中移除并重读当前窗口"""
+        keys = set(keys)
+        self._selected -= keys
+        self.total = max(0, self.total - len(keys))
+        self.offset = self._clamp(self.offset)
+        self._reload_window()
+
+    # ---- 选择 ----
+
+    def selected_ids(self):
+        """选中记录的ID列表"""
+        return list(self._selected)
+
+    def clear_selection(self):
+        """清除选择"""
+        self._selected.clear()
+        self.tree.selection_set(())
+
+    # ---- 滚动 ----
+
+    def scroll(self, rows):
+        """向下（正数）或向上（负数）滚动若干行"""
+        self.scroll_to(self.offset + rows)
+
+    def scroll_to(self, offset):
+        """滚动到指定行"""
+        offset = self._clamp(offset)
+        if offset != self.offset:
+            self.offset = offset
+            self._render()
+
+    def _clamp(self, offset):
+        return max(0, min(int(offset), self.total - self.visible_rows))
+
+    def _scroll_and_break(self, rows):
+        self.scroll(rows)
+        return 'break'
+
+    def _on_scrollbar(self, action, *args):
+        if action == 'moveto':
+            self.scroll_to(float(args[0]) * self.total)
+        elif action == 'scroll':
+            amount = int(args[0])
+            self.scroll(amount * self.visible_rows if args[1] == 'pages' else amount)
+
+    def _on_mousewheel(self, event):
+        # Windows每格为120，macOS为较小的值
+        if abs(event.delta) >= 120:
+            steps = -event.delta // 120
+        else:
+            steps = -1 if event.delta > 0 else 1
+        self.scroll(steps * 3)
+        return 'break'
+
+    def _on_arrow(self, step):
+        """方向键移动到可见区域边缘时滚动一行"""
+        focus = self.tree.focus()
+        if focus not in self._slots:
+            return None
+        index = self._slots.index(focus) + step
+        if 0 <= index < len(self._slots):
+            return None  # 可见区域内，交给Treeview默认处理
+        old_offset = self.offset
+        self.scroll(step)
+        if self.offset != old_offset:
+            edge = self._slots[0] if step < 0 else self._slots[-1]
+            self._selected = {self._slot_keys[edge]}
+            self.tree.selection_set((edge,))
+            self.tree.focus(edge)
+        return 'break'
+
+    def _on_configure(self, event):
+        """窗口大小变化时重新计算可见行数"""
+        if not self._slots:
+            return
+        bbox = self.tree.bbox(self._slots[0])
+        if not bbox:
+            return
+        _, heading_height, _, row_height = bbox
+        rows = max(1, (event.height - heading_height) // row_height)
+        if rows != self.visible_rows:
+            self.visible_rows = rows
+            self.offset = self._clamp(self.offset)
+            self._render()
+
+    def _on_click(self, event):
+        # 不按Ctrl/Shift单击时是重新选择，丢弃滚出可见区域的旧选择
+        if not event.state & 0x0005:
+            self._selected.clear()
+
+    def _on_select(self, event):
+        selection = set(self.tree.selection())
+        for slot in self._slots:
+            key = self._slot_keys[slot]
+            if slot in selection:
+                self._selected.add(key)
+            else:
+                self._selected.discard(key)
+
+    # ---- 渲染 ----
+
+    def _window(self):
+        """返回当前可见窗口的记录，必要时从数据层读取（含overscan）"""
+        end = min(self.total, self.offset + self.visible_rows)
+        cache_end = self._cache_offset + len(self._cache)
+        if self.offset < self._cache_offset or end > cache_end:
+            start = max(0, self.offset - self.overscan)
+            self._cache = list(self.fetch_page(start, end + self.overscan - start))
+            self._cache_offset = start
+        return self._cache[self.offset - self._cache_offset:end - self._cache_offset]
+
+    def _reload_window(self):
+        self._cache = []
+        self._render()
+
+    @staticmethod
+    def _format(row):
+        return tuple('' if value is None else value for value in row)
+
+    def _render(self):
+        # 包括按需读取数据和更新条目
+        with timer('table.render'):
+            self._render_window()
+
+    def _render_window(self):
+        rows = self._window()
+
+        # 只增减尾部的槽位，已有条目原地更新内容
+        while len(self._slots) > len(rows):
+            slot = self._slots.pop()
+            self._slot_keys.pop(slot, None)
+            self.tree.delete(slot)
+        while len(self._slots) < len(rows):
+            self._slots.append(self.tree.insert('', 'end'))
+
+        selected_slots = []
+        self._items = {}
+        for index, (slot, row) in enumerate(zip(self._slots, rows)):
+            key = row[self.key_index]
+            self._slot_keys[slot] = key
+            self._items[key] = index
+            self.tree.item(slot, values=self._format(row))
+            if key in self._selected:
+                selected_slots.append(slot)
+        self.tree.selection_set(selected_slots)
+
+        if self.total:
+            self.scrollbar.set(self.offset / self.total, (self.offset + len(rows)) / self.total)
+        else:
+            self.scrollbar.set(0, 1)
@@ -8,94 +8,113 @@ Family Chronic Disease Patient Medication Management System
 许可证: GPL-3+
 """
 
+import sys
+import time
+
+# 启动计时起点（见 family_medicine/ui/startup.py）
+STARTED = time.perf_counter()
+
+# --profile: 分析各界面操作的性能（见 family_medicine/profiling.py），其余参数仍按命令行模式处理
+PROFILE = __name__ == "__main__" and "--profile" in sys.argv[1:]
+if PROFILE:
+    sys.argv.remove("--profile")
+
+if __name__ == "__main__" and len(sys.argv) > 1:
+    # 命令行模式（--check、--list-due）只需要数据层，在导入tkinter之前处理，没有桌面时也能运行
+    from family_medicine.cli import main as cli_main
+    sys.exit(cli_main())
+
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog, scrolledtext
-import sqlite3
+from tkinter import ttk, messagebox, simpledialog, scrolledtext, filedialog
 from datetime import datetime, timedelta
-import threading
-import time
-from tkcalendar import DateEntry
+from family_medicine.days import to_day
+from family_medicine.metrics import dump_if_requested, timed
+from family_medicine.repository import MedicineRepository, calculate_next_purchase_date, page_sort_key
+from family_medicine.settings import SettingsStore
+from family_medicine.ui.startup import StartupTrace, lazy_values
+from family_medicine.ui.virtual_table import VirtualTable
+
+# 搜索输入防抖时间（毫秒）
+SEARCH_DEBOUNCE_MS = 250
+# 提醒窗口"稍后提醒"的推迟时间（分钟）
+REMINDER_SNOOZE_MINUTES = 60
+# 关闭窗口时等待后台任务结束的检查间隔（毫秒）
+CLOSE_POLL_MS = 200
 
 class MedicineManager:
-    def __init__(self, root):
+    def __init__(self, root, trace=None, profiler=None):
         self.root = root
+        self.trace = trace or StartupTrace()
+        self.profiler = profiler
         self.root.title("家庭慢性病患者药物管理系统")
         self.root.geometry("1200x700")
         
         # 初始化数据库
         self.init_database()
         
+        # 后台搜索线程在第一次搜索时才创建，结果通过 after 交回主线程
+        self.search_worker = None
+        
         # 创建界面
         self.create_widgets()
         
-        # 提醒窗口状态标志
-        self.reminder_window_open = False
+        # 当前打开的提醒窗口（非模态，同时只有一个）
+        self.reminder_window = None
+        # 启动后第一次检查提醒时重新显示上次还没有确认的提醒
+        self.reminders_restored = False
+        # 诊断信息窗口（同时只有一个）
+        self.diagnostics_window = None
+        # 已确认退出，正在等待后台任务结束
+        self.close_pending = False
         
         # 加载保存的设置（在所有界面组件创建完成后）
         self.load_settings()
         
-        # 启动提醒线程
-        self.start_reminder_thread()
+        # 提醒线程和表格数据在窗口显示之后再启动、加载（见 start）
         
-        # 加载数据
+        # 关闭窗口时停止后台线程并关闭数据库连接
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+    
+    def start(self):
+        """先显示窗口，再创建日期选择器、启动提醒线程、加载数据：窗口出现的时间与数据量无关"""
+        self.root.update()
+        self.trace.mark("首次显示窗口")
+        self.create_date_picker()
+        self.start_reminder_thread()
         self.load_data()
+        self.root.update_idletasks()
+        self.trace.mark("数据加载完成")
+        self.trace.report()
     
     def init_database(self):
-        """初始化数据库"""
-        import os
-        # 获取用户主目录
-        home_dir = os.path.expanduser("~")
-        db_dir = os.path.join(home_dir, ".family-medicine-manager")
-        
-        # 创建配置目录
-        if not os.path.exists(db_dir):
-            os.makedirs(db_dir)
-        
-        # 数据库文件路径
-        db_path = os.path.join(db_dir, "medicine.db")
-        self.conn = sqlite3.connect(db_path)
-        self.cursor = self.conn.cursor()
-        
-        # 创建药物信息表
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS medicines (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name_spec TEXT NOT NULL,
-                user_name TEXT NOT NULL,
-                daily_pills REAL NOT NULL,
-                pills_per_box INTEGER NOT NULL,
-                boxes_purchased INTEGER NOT NULL,
-                purchase_date TEXT NOT NULL,
-                next_purchase_date TEXT NOT NULL,
-                notes TEXT
-            )
-        ''')
-        
-        # 创建设置表
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS settings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                setting_name TEXT UNIQUE NOT NULL,
-                setting_value TEXT NOT NULL
-            )
-        ''')
-        
-        # 初始化默认设置
-        self.cursor.execute('''
-            INSERT OR IGNORE INTO settings (setting_name, setting_value) 
-            VALUES ('reminder_days', '2')
-        ''')
-        
-        self.cursor.execute('''
-            INSERT OR IGNORE INTO settings (setting_name, setting_value) 
-            VALUES ('reminder_interval', '5')
-        ''')
-        
-        self.conn.commit()
-        print("数据库初始化完成，默认设置已创建")
+        """初始化数据库（~/.family-medicine-manager/medicine.db）"""
+        # 各线程通过连接池使用自己的连接（WAL模式，读写互不阻塞）
+        self.repo = MedicineRepository()
+        # 设置一次读入内存，之后读取设置不访问数据库（见 family_medicine/settings.py）
+        self.settings = SettingsStore(self.repo)
+    
+    def create_menu(self):
+        """创建菜单栏"""
+        self.menubar = tk.Menu(self.root)
+        self.file_menu = tk.Menu(self.menubar, tearoff=0)
+        self.file_menu.add_command(label="导入...", command=self.import_medicines)
+        self.file_menu.add_separator()
+        self.file_menu.add_command(label="导出全部药物...", command=lambda: self.export_data('all'))
+        self.file_menu.add_command(label="导出搜索结果...", command=lambda: self.export_data('search'))
+        self.file_menu.add_command(label="导出需要购买药物清单...", command=lambda: self.export_data('due'))
+        self.menubar.add_cascade(label="文件", menu=self.file_menu)
+        self.tools_menu = tk.Menu(self.menubar, tearoff=0)
+        self.tools_menu.add_command(label="重新计算所有下次需买药时间", command=self.recalculate_all)
+        self.tools_menu.add_separator()
+        self.tools_menu.add_command(label="诊断信息...", command=self.show_diagnostics)
+        self.menubar.add_cascade(label="工具", menu=self.tools_menu)
+        self.root.config(menu=self.menubar)
     
     def create_widgets(self):
         """创建界面组件"""
+        # 菜单栏
+        self.create_menu()
+        
         # 创建主框架
         main_frame = ttk.Frame(self.root, padding="10")
         main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
@@ -128,31 +147,30 @@ class MedicineManager:
         
         ttk.Label(input_frame, text="每日服用片数:").grid(row=0, column=4, sticky=tk.W, padx=(0, 5))
         self.daily_pills_var = tk.StringVar(value="1")
-        # 添加0.25, 0.5和1-100的数值
-        daily_pills_values = ["0.25", "0.5"] + [str(i) for i in range(1, 101)]
         self.daily_pills_combo = ttk.Combobox(input_frame, textvariable=self.daily_pills_var, width=8,
-                                             values=daily_pills_values, state="readonly")
+                                             state="readonly")
+        # 0.25, 0.5和1-100的数值，第一次展开时才生成
+        lazy_values(self.daily_pills_combo, lambda: ["0.25", "0.5"] + [str(i) for i in range(1, 101)])
         self.daily_pills_combo.grid(row=0, column=5, sticky=tk.W, padx=(0, 10))
         
         ttk.Label(input_frame, text="每盒片数:").grid(row=1, column=0, sticky=tk.W, padx=(0, 5))
         self.pills_per_box_var = tk.StringVar(value="1")
         self.pills_per_box_combo = ttk.Combobox(input_frame, textvariable=self.pills_per_box_var, width=8,
-                                               values=[str(i) for i in range(1, 101)], state="readonly")
+                                               state="readonly")
+        lazy_values(self.pills_per_box_combo, lambda: [str(i) for i in range(1, 101)])
         self.pills_per_box_combo.grid(row=1, column=1, sticky=tk.W, padx=(0, 10))
         
         ttk.Label(input_frame, text="购买盒数:").grid(row=1, column=2, sticky=tk.W, padx=(0, 5))
         self.boxes_var = tk.StringVar(value="1")
         self.boxes_combo = ttk.Combobox(input_frame, textvariable=self.boxes_var, width=8,
-                                       values=[str(i) for i in range(1, 101)], state="readonly")
+                                       state="readonly")
+        lazy_values(self.boxes_combo, lambda: [str(i) for i in range(1, 101)])
         self.boxes_combo.grid(row=1, column=3, sticky=tk.W, padx=(0, 10))
         
         ttk.Label(input_frame, text="购药日期:").grid(row=1, column=4, sticky=tk.W, padx=(0, 5))
         self.purchase_date_var = tk.StringVar()
-        # 创建日期选择器
-        self.date_picker = DateEntry(input_frame, width=15, background='darkblue',
-                                   foreground='white', borderwidth=2, 
-                                   date_pattern='yyyy-mm-dd',
-                                   textvariable=self.purchase_date_var)
+        # 日期选择器（tkcalendar）导入较慢，窗口显示后再创建（见 create_date_picker），先用普通输入框占位
+        self.date_picker = ttk.Entry(input_frame, width=17, textvariable=self.purchase_date_var)
         self.date_picker.grid(row=1, column=5, sticky=tk.W, padx=(0, 10))
         
         ttk.Label(input_frame, text="备注:").grid(row=2, column=0, sticky=tk.W, padx=(0, 5))
@@ -166,6 +184,7 @@ class MedicineManager:
         ttk.Button(button_frame, text="添加药物", command=self.add_medicine).pack(side=tk.LEFT, padx=(0, 5))
         ttk.Button(button_frame, text="保存修改", command=self.save_edit).pack(side=tk.LEFT, padx=(0, 5))
         ttk.Button(button_frame, text="删除药物", command=self.delete_medicine).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(button_frame, text="登记购药", command=self.record_purchase).pack(side=tk.LEFT, padx=(0, 5))
         ttk.Button(button_frame, text="清空输入", command=self.clear_inputs).pack(side=tk.LEFT, padx=(0, 5))
         ttk.Button(button_frame, text="查看需要购买药物清单", command=self.show_purchase_list).pack(side=tk.LEFT, padx=(0, 5))
         
@@ -176,6 +195,7 @@ class MedicineManager:
         # 搜索功能
         ttk.Label(search_frame, text="搜索:").pack(side=tk.LEFT)
         self.search_var = tk.StringVar()
+        self.search_after_id = None
         self.search_var.trace('w', self.on_search)
         ttk.Entry(search_frame, textvariable=self.search_var, width=30).pack(side=tk.LEFT, padx=(5, 10))
         
@@ -194,22 +214,20 @@ class MedicineManager:
         self.reminder_interval_combo.pack(side=tk.LEFT, padx=(0, 5))
         ttk.Label(search_frame, text="分钟").pack(side=tk.LEFT, padx=(0, 10))
         
-        # 绑定设置变化事件
+        # 绑定设置变化事件（选择下拉框选项时也会触发变量的 trace，不需要再绑定 <<ComboboxSelected>>）
         self.reminder_days_trace_id = self.reminder_days_var.trace('w', self.on_setting_changed)
         self.reminder_interval_trace_id = self.reminder_interval_var.trace('w', self.on_setting_changed)
         
-        # 也绑定Combobox的选择事件
-        self.reminder_days_combo.bind('<<ComboboxSelected>>', self.on_setting_changed)
-        self.reminder_interval_combo.bind('<<ComboboxSelected>>', self.on_setting_changed)
-        
         # 数据表格
         table_frame = ttk.Frame(main_frame)
         table_frame.grid(row=4, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S))
         
-        # 创建表格 - 隐藏ID列，按照数据库实际列顺序
+        # 创建表格 - 隐藏ID列，虚拟滚动只读取和渲染可见的行
         columns = ('id', 'name_spec', 'user_name', 'daily_pills', 'pills_per_box', 'boxes_purchased', 
                   'purchase_date', 'next_purchase_date', 'notes')
-        self.tree = ttk.Treeview(table_frame, columns=columns, show='headings', height=15)
+        self.table = VirtualTable(table_frame, columns, self.repo.count, self.repo.page, height=15,
+                                  sort_key=page_sort_key)  # 按购药时间、ID排序
+        self.tree = self.table.tree
         
         # 隐藏ID列
         self.tree.column('id', width=0, stretch=False)
@@ -240,19 +258,28 @@ class MedicineManager:
                 else:
                     self.tree.column(col, width=120)
         
-        # 添加滚动条
-        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
-        
-        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        # 表格自带滚动条
+        self.table.pack(fill=tk.BOTH, expand=True)
         
         # 绑定双击事件
         self.tree.bind('<Double-1>', self.on_double_click)
         
         # 设置默认日期为当前日期
-        current_date = datetime.now()
-        self.date_picker.set_date(current_date)
+        self.set_purchase_date(datetime.now())
+    
+    def create_date_picker(self):
+        """用日期选择器替换占位的输入框"""
+        from tkcalendar import DateEntry
+        placeholder = self.date_picker
+        # DateEntry 创建时会把输入框设为今天，保留占位输入框中已有的日期
+        current_date = self.purchase_date_var.get()
+        self.date_picker = DateEntry(placeholder.master, width=15, background='darkblue',
+                                   foreground='white', borderwidth=2, 
+                                   date_pattern='yyyy-mm-dd',
+                                   textvariable=self.purchase_date_var)
+        placeholder.destroy()
+        self.purchase_date_var.set(current_date)
+        self.date_picker.grid(row=1, column=5, sticky=tk.W, padx=(0, 10))
     
     def load_settings(self):
         """加载设置"""
@@ -261,48 +288,18 @@ class MedicineManager:
             self.reminder_days_var.trace_remove('write', self.reminder_days_trace_id)
             self.reminder_interval_var.trace_remove('write', self.reminder_interval_trace_id)
             
-            # 加载断药提前检测天数
-            self.cursor.execute('SELECT setting_value FROM settings WHERE setting_name = ?', ('reminder_days',))
-            result = self.cursor.fetchone()
-            if result:
-                self.reminder_days_var.set(result[0])
-                print(f"加载断药提前检测天数: {result[0]}天")
-            else:
-                self.reminder_days_var.set("2")
-                print("使用默认断药提前检测天数: 2天")
-            
-            # 加载自动提醒间隔时间
-            self.cursor.execute('SELECT setting_value FROM settings WHERE setting_name = ?', ('reminder_interval',))
-            result = self.cursor.fetchone()
-            if result:
-                self.reminder_interval_var.set(result[0])
-                print(f"加载自动提醒间隔时间: {result[0]}分钟")
-            else:
-                self.reminder_interval_var.set("5")
-                print("使用默认自动提醒间隔时间: 5分钟")
-                
-            # 确保界面显示当前值
-            days_value = self.reminder_days_var.get()
-            interval_value = self.reminder_interval_var.get()
-            print(f"设置界面显示: 断药提前检测天数={days_value}, 自动提醒间隔时间={interval_value}")
-            self.reminder_days_combo.set(days_value)
-            self.reminder_interval_combo.set(interval_value)
-            
-            # 验证界面显示
-            print(f"验证界面显示: 断药提前检测天数={self.reminder_days_combo.get()}, 自动提醒间隔时间={self.reminder_interval_combo.get()}")
+            # 加载断药提前检测天数和自动提醒间隔时间（从设置服务的内存中读取，没有保存过时使用默认值）
+            self.reminder_days_var.set(self.settings.get('reminder_days') or "2")
+            self.reminder_interval_var.set(self.settings.get('reminder_interval') or "5")
             
             # 重新启用设置变化事件
             self.reminder_days_trace_id = self.reminder_days_var.trace('w', self.on_setting_changed)
             self.reminder_interval_trace_id = self.reminder_interval_var.trace('w', self.on_setting_changed)
                 
         except Exception as e:
-            print(f"加载设置失败: {str(e)}")
+            print(f"加载设置失败，使用默认值: {str(e)}")
             self.reminder_days_var.set("2")  # 默认值
             self.reminder_interval_var.set("5")  # 默认值
-            print("设置加载失败，使用默认值")
-            # 确保界面显示默认值
-            self.reminder_days_combo.set("2")
-            self.reminder_interval_combo.set("5")
             
             # 重新启用设置变化事件
             self.reminder_days_trace_id = self.reminder_days_var.trace('w', self.on_setting_changed)
@@ -314,8 +311,6 @@ class MedicineManager:
             reminder_days = self.reminder_days_var.get()
             reminder_interval = self.reminder_interval_var.get()
             
-            print(f"正在保存设置: 断药提前检测天数={reminder_days}天, 自动提醒间隔时间={reminder_interval}分钟")
-            
             # 检查值是否为空
             if not reminder_days or reminder_days.strip() == "":
                 print("警告: 断药提前检测天数为空，使用默认值2")
@@ -325,46 +320,22 @@ class MedicineManager:
                 print("警告: 自动提醒间隔时间为空，使用默认值5")
                 reminder_interval = "5"
             
-            # 保存断药提前检测天数
-            self.cursor.execute('''
-                INSERT OR REPLACE INTO settings (setting_name, setting_value) 
-                VALUES (?, ?)
-            ''', ('reminder_days', reminder_days))
-            
-            # 保存自动提醒间隔时间
-            self.cursor.execute('''
-                INSERT OR REPLACE INTO settings (setting_name, setting_value) 
-                VALUES (?, ?)
-            ''', ('reminder_interval', reminder_interval))
-            
-            self.conn.commit()
-            print(f"设置已保存: 断药提前检测天数 = {reminder_days}天, 自动提醒间隔时间 = {reminder_interval}分钟")
-            
-            # 验证保存结果
-            self.cursor.execute('SELECT setting_value FROM settings WHERE setting_name = ?', ('reminder_interval',))
-            result = self.cursor.fetchone()
-            if result:
-                print(f"验证: 数据库中reminder_interval = {result[0]}")
-            else:
-                print("验证: 数据库中reminder_interval未找到")
+            # 只更新设置服务的内存：值没有变化时什么都不做；有变化时通知提醒调度线程，
+            # 由后台线程合并后在一个事务中写入数据库
+            self.settings.update({
+                'reminder_days': reminder_days,
+                'reminder_interval': reminder_interval,
+            })
         except Exception as e:
             print(f"保存设置失败: {str(e)}")
     
     def on_setting_changed(self, *args):
         """设置变化事件处理"""
-        print("检测到设置变化，正在保存...")
         self.save_settings()
     
     def calculate_next_purchase_date(self, daily_pills, pills_per_box, boxes_purchased, purchase_date):
         """计算下次需买药时间"""
-        try:
-            total_pills = boxes_purchased * pills_per_box
-            days_supply = total_pills / daily_pills
-            purchase_dt = datetime.strptime(purchase_date, '%Y-%m-%d')
-            next_date = purchase_dt + timedelta(days=days_supply)
-            return next_date.strftime('%Y-%m-%d')
-        except:
-            return None
+        return calculate_next_purchase_date(daily_pills, pills_per_box, boxes_purchased, purchase_date)
     
     def add_medicine(self):
         """添加药物"""
@@ -386,12 +357,9 @@ class MedicineManager:
                 messagebox.showerror("错误", "请填写完整的药物信息")
                 return
             
-            # 检查品名及规格是否已存在
-            self.cursor.execute('SELECT id FROM medicines WHERE name_spec = ?', (name,))
-            existing_medicine = self.cursor.fetchone()
-            
-            if existing_medicine:
-                messagebox.showerror("错误", f"品名及规格 '{name}' 已存在，请使用不同的名称或修改现有记录")
+            # 检查该使用人的品名及规格是否已存在
+            if self.repo.name_exists(user_name, name):
+                messagebox.showerror("错误", f"使用人 '{user_name}' 的品名及规格 '{name}' 已存在，请使用不同的名称或修改现有记录")
                 return
             
             # 计算下次需买药时间
@@ -403,18 +371,15 @@ class MedicineManager:
                 messagebox.showerror("错误", "日期格式错误")
                 return
             
-            # 插入数据库 - 按照实际数据库列顺序
-            self.cursor.execute('''
-                INSERT INTO medicines (name_spec, daily_pills, pills_per_box, boxes_purchased, 
-                                     purchase_date, next_purchase_date, notes, user_name)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (name, daily_pills, pills_per_box, boxes_purchased, 
-                  purchase_date, next_purchase_date, notes, user_name))
-            self.conn.commit()
+            # 插入数据库
+            medicine_id = self.repo.add(name, user_name, daily_pills, pills_per_box, boxes_purchased,
+                                        purchase_date, next_purchase_date, notes)
+            self.scheduler.medicine_changed(medicine_id, next_purchase_date)
             
             messagebox.showinfo("成功", "药物信息添加成功")
             self.clear_inputs()
-            self.load_data()
+            # 只插入新增的一行
+            self.table.insert_row(self.repo.get(medicine_id))
             
         except ValueError:
             messagebox.showerror("错误", "请输入有效的数字")
@@ -423,37 +388,34 @@ class MedicineManager:
     
     def edit_medicine(self):
         """修改药物信息"""
-        selected = self.tree.selection()
+        selected = self.table.selected_ids()
         if not selected:
             messagebox.showwarning("警告", "请先选择要修改的药物")
             return
         
-        item = self.tree.item(selected[0])
-        medicine_id = item['values'][0]
+        medicine_id = selected[0]
         
         # 获取当前选中的药物信息
-        self.cursor.execute('SELECT * FROM medicines WHERE id = ?', (medicine_id,))
-        medicine = self.cursor.fetchone()
+        medicine = self.repo.get(medicine_id)
         
         if not medicine:
             messagebox.showerror("错误", "药物信息不存在")
             return
         
-        # 填充输入框 - 根据实际数据库列顺序调整索引
-        # 实际数据库列顺序: id, name_spec, user_name, daily_pills, pills_per_box, boxes_purchased, purchase_date, next_purchase_date, notes
-        self.name_var.set(medicine[1])  # name_spec
-        self.user_name_var.set(medicine[2])  # user_name
-        self.daily_pills_var.set(str(medicine[3]))  # daily_pills
-        self.pills_per_box_var.set(str(medicine[4]))  # pills_per_box
-        self.boxes_var.set(str(medicine[5]))  # boxes_purchased
+        # 填充输入框
+        self.name_var.set(medicine.name_spec)
+        self.user_name_var.set(medicine.user_name)
+        self.daily_pills_var.set(str(medicine.daily_pills))
+        self.pills_per_box_var.set(str(medicine.pills_per_box))
+        self.boxes_var.set(str(medicine.boxes_purchased))
         # 设置日期选择器
         try:
-            purchase_date = datetime.strptime(medicine[6], '%Y-%m-%d')  # purchase_date
-            self.date_picker.set_date(purchase_date)
+            purchase_date = datetime.strptime(medicine.purchase_date, '%Y-%m-%d')
+            self.set_purchase_date(purchase_date)
         except:
             # 如果日期格式有问题，设置为当前日期
-            self.date_picker.set_date(datetime.now())
-        self.notes_var.set(medicine[8] or "")  # notes
+            self.set_purchase_date(datetime.now())
+        self.notes_var.set(medicine.notes or "")
         
         # 保存当前编辑的药物ID
         self.editing_id = medicine_id
@@ -482,12 +444,9 @@ class MedicineManager:
                 messagebox.showerror("错误", "请填写完整的药物信息")
                 return
             
-            # 检查品名及规格是否与其他记录重复（排除当前编辑的记录）
-            self.cursor.execute('SELECT id FROM medicines WHERE name_spec = ? AND id != ?', (name, editing_id))
-            existing_medicine = self.cursor.fetchone()
-            
-            if existing_medicine:
-                messagebox.showerror("错误", f"品名及规格 '{name}' 已存在，请使用不同的名称")
+            # 检查该使用人的品名及规格是否与其他记录重复（排除当前编辑的记录）
+            if self.repo.name_exists(user_name, name, exclude_id=editing_id):
+                messagebox.showerror("错误", f"使用人 '{user_name}' 的品名及规格 '{name}' 已存在，请使用不同的名称")
                 return
             
             # 计算下次需买药时间
@@ -499,18 +458,15 @@ class MedicineManager:
                 messagebox.showerror("错误", "日期格式错误")
                 return
             
-            # 更新数据库 - 按照实际数据库列顺序
-            self.cursor.execute('''
-                UPDATE medicines 
-                SET name_spec=?, daily_pills=?, pills_per_box=?, boxes_purchased=?, 
-                    purchase_date=?, next_purchase_date=?, notes=?, user_name=?
-                WHERE id=?
-            ''', (name, daily_pills, pills_per_box, boxes_purchased, 
-                  purchase_date, next_purchase_date, notes, user_name, editing_id))
-            self.conn.commit()
+            # 更新数据库
+            # 只修改用量时按结转后的药量重新计算，实际保存的日期以返回值为准
+            next_purchase_date = self.repo.update(editing_id, name, user_name, daily_pills, pills_per_box,
+                                                  boxes_purchased, purchase_date, next_purchase_date, notes)
+            self.scheduler.medicine_changed(editing_id, next_purchase_date)
             
             messagebox.showinfo("成功", "药物信息修改成功")
-            self.load_data()
+            # 只更新被修改的一行
+            self.table.update_row(self.repo.get(editing_id))
             self.clear_inputs()
             
         except ValueError:
@@ -523,19 +479,52 @@ class MedicineManager:
     
     def delete_medicine(self):
         """删除药物"""
-        selected = self.tree.selection()
+        selected = self.table.selected_ids()
         if not selected:
             messagebox.showwarning("警告", "请先选择要删除的药物")
             return
         
         if messagebox.askyesno("确认", "确定要删除选中的药物吗？"):
-            for item in selected:
-                medicine_id = self.tree.item(item)['values'][0]
-                self.cursor.execute('DELETE FROM medicines WHERE id = ?', (medicine_id,))
-            
-            self.conn.commit()
+            self.repo.delete(selected)
+            self.scheduler.medicine_removed(selected)
             messagebox.showinfo("成功", "药物信息删除成功")
-            self.load_data()
+            # 只移除被删除的行
+            self.table.remove_rows(selected)
+    
+    def record_purchase(self):
+        """登记一次购药：上次剩余的药量结转到本次，重新计算下次需买药时间"""
+        selected = self.table.selected_ids()
+        if len(selected) != 1:
+            messagebox.showwarning("警告", "请先选择一种药物")
+            return
+        medicine_id = selected[0]
+        medicine = self.repo.get(medicine_id)
+        boxes = simpledialog.askinteger("登记购药", f"{medicine.name_spec} (使用人: {medicine.user_name})\n本次购买盒数:",
+                                        parent=self.root, minvalue=1, initialvalue=medicine.boxes_purchased)
+        if boxes is None:
+            return
+        purchase_date = simpledialog.askstring("登记购药", "购药日期 (YYYY-MM-DD):", parent=self.root,
+                                               initialvalue=datetime.now().strftime('%Y-%m-%d'))
+        if not purchase_date:
+            return
+        
+        try:
+            leftover, stock = self.repo.record_purchase(medicine_id, purchase_date.strip(), boxes)
+        except Exception as e:
+            messagebox.showerror("错误", f"登记购药失败: {str(e)}")
+            return
+        
+        medicine = self.repo.get(medicine_id)
+        self.scheduler.medicine_changed(medicine_id, medicine.next_purchase_date)
+        self.table.update_row(medicine)
+        messagebox.showinfo("成功", f"已登记购药 {boxes} 盒\n"
+                                    f"上次剩余: {leftover:g} 片\n"
+                                    f"现有药量: {stock.pills_on_hand:g} 片\n"
+                                    f"下次需买药时间: {medicine.next_purchase_date}")
+    
+    def set_purchase_date(self, value):
+        """设置购药日期输入框"""
+        self.purchase_date_var.set(value.strftime('%Y-%m-%d'))
     
     def clear_inputs(self):
         """清空输入框"""
@@ -545,52 +534,140 @@ class MedicineManager:
         self.pills_per_box_var.set("1")
         self.boxes_var.set("1")
         # 重置日期选择器为当前日期
-        current_date = datetime.now()
-        self.date_picker.set_date(current_date)
+        self.set_purchase_date(datetime.now())
         self.notes_var.set("")
         
         # 清除编辑状态
         if hasattr(self, 'editing_id'):
             delattr(self, 'editing_id')
     
+    @timed('ui.load_data')
     def load_data(self):
-        """加载数据到表格"""
-        # 清空表格
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        """加载数据到表格（按购药时间升序，只读取可见窗口的行）"""
+        self.table.refresh()
+    
+    def on_search(self, *args):
+        """搜索功能（防抖：停止输入一小段时间后才在后台线程查询）"""
+        if self.search_after_id:
+            self.root.after_cancel(self.search_after_id)
+        self.search_after_id = self.root.after(SEARCH_DEBOUNCE_MS, self.run_search)
+    
+    def run_search(self):
+        """提交后台搜索，之前未完成的搜索作废"""
+        self.search_after_id = None
+        if self.search_worker is None:
+            from family_medicine.search_worker import SearchWorker
+            self.search_worker = SearchWorker(self.repo, lambda fn: self.root.after(0, fn))
+        self.search_worker.submit(self.search_var.get().strip(), self.on_search_result)
+    
+    @timed('ui.search_result')
+    def on_search_result(self, search_term, total, first_rows):
+        """显示最新一次搜索的结果（主线程），关键字为空时显示所有数据
+
+        搜索结果按相关度排序且修改后可能不再匹配，不传排序依据，修改记录时表格重新读取。
+        """
+        self.table.set_source(lambda: self.repo.count(search_term),
+                              lambda offset, limit: self.repo.page(offset, limit, search_term),
+                              total=total, first_rows=first_rows,
+                              sort_key=None if search_term else page_sort_key)
+    
+    def import_medicines(self):
+        """从CSV/Excel文件批量导入药物（后台线程执行，同一使用人的品名及规格已存在时更新）"""
+        path = filedialog.askopenfilename(
+            title="导入药物", filetypes=[("CSV或Excel文件", "*.csv *.xlsx"), ("所有文件", "*.*")])
+        if not path:
+            return
         
-        # 查询数据 - 按购药时间升序排序
-        self.cursor.execute('SELECT * FROM medicines ORDER BY purchase_date')
-        medicines = self.cursor.fetchall()
+        from family_medicine.importer import import_file
+        from family_medicine.ui.progress import run_task
         
-        # 插入数据
-        for medicine in medicines:
-            self.tree.insert('', 'end', values=medicine)
+        def work(progress):
+            # 后台线程通过连接池使用自己的连接，结束时归还
+            try:
+                return import_file(self.repo, path,
+                                   lambda total, failed: progress(f"已读取 {total} 行，失败 {failed} 行"))
+            finally:
+                self.repo.release()
+        
+        self.file_menu.entryconfig("导入...", state=tk.DISABLED)
+        run_task(self.root, "导入药物", work, self.on_import_done, text="正在导入...")
     
-    def on_search(self, *args):
-        """搜索功能"""
-        search_term = self.search_var.get().strip()
-        
-        # 清空表格
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        if search_term:
-            # 搜索数据
-            self.cursor.execute('''
-                SELECT * FROM medicines 
-                WHERE name_spec LIKE ? OR user_name LIKE ? OR notes LIKE ?
-                ORDER BY purchase_date
-            ''', (f'%{search_term}%', f'%{search_term}%', f'%{search_term}%'))
+    def on_import_done(self, result, error):
+        """导入完成（主线程）：刷新表格和提醒，显示导入报告"""
+        from family_medicine.importer import format_result
+        self.file_menu.entryconfig("导入...", state=tk.NORMAL)
+        if error:
+            messagebox.showerror("错误", f"导入失败: {str(error)}")
+            return
+        self.load_data()
+        self.scheduler.reload()
+        if result.errors:
+            self.show_scrolled_reminder("导入结果", format_result(result))
         else:
-            # 显示所有数据
-            self.cursor.execute('SELECT * FROM medicines ORDER BY purchase_date')
+            messagebox.showinfo("成功", format_result(result))
+    
+    def export_data(self, view):
+        """导出全部药物（all）、当前搜索结果（search）或需要购买药物清单（due），后台线程逐行写入文件"""
+        search_term = self.search_var.get().strip() if view == 'search' else ""
+        try:
+            reminder_days = int(self.reminder_days_var.get())
+        except ValueError:
+            reminder_days = 2
+        path = filedialog.asksaveasfilename(
+            title="导出", defaultextension=".csv",
+            filetypes=[("CSV文件", "*.csv"), ("JSON Lines文件", "*.jsonl"), ("HTML文件", "*.html")])
+        if not path:
+            return
+        from family_medicine.exporter import export_due, export_medicines
+        from family_medicine.ui.progress import run_task
+        
+        def work(progress):
+            # 后台线程通过连接池使用自己的连接，结束时归还
+            try:
+                report = lambda count: progress(f"已导出 {count} 行")
+                if view == 'due':
+                    return export_due(self.repo, path, reminder_days, progress=report)
+                return export_medicines(self.repo, path, search_term, progress=report)
+            finally:
+                self.repo.release()
+        
+        run_task(self.root, "导出", work, lambda count, error: self.on_export_done(path, count, error),
+                 text="正在导出...")
+    
+    def on_export_done(self, path, count, error):
+        """导出完成（主线程）"""
+        if error:
+            messagebox.showerror("错误", f"导出失败: {str(error)}")
+            return
+        messagebox.showinfo("成功", f"已导出 {count} 行到:\n{path}")
+    
+    def recalculate_all(self):
+        """按当前公式重新计算全部药物的下次需买药时间（后台线程执行）"""
+        if not messagebox.askyesno("确认", "确定要按购药日期和用量重新计算所有药物的下次需买药时间吗？"):
+            return
+        from family_medicine import recalculate
+        from family_medicine.ui.progress import run_task
         
-        medicines = self.cursor.fetchall()
+        def work(progress):
+            # 后台线程通过连接池使用自己的连接，结束时归还
+            try:
+                return recalculate.recalculate_all(self.repo)
+            finally:
+                self.repo.release()
         
-        # 插入数据
-        for medicine in medicines:
-            self.tree.insert('', 'end', values=medicine)
+        self.tools_menu.entryconfig("重新计算所有下次需买药时间", state=tk.DISABLED)
+        run_task(self.root, "重新计算", work, self.on_recalculate_done, text="正在重新计算...")
+    
+    def on_recalculate_done(self, result, error):
+        """重新计算完成（主线程）：有变化时刷新表格和提醒"""
+        self.tools_menu.entryconfig("重新计算所有下次需买药时间", state=tk.NORMAL)
+        if error:
+            messagebox.showerror("错误", f"重新计算失败: {str(error)}")
+            return
+        if result.changed:
+            self.load_data()
+            self.scheduler.reload()
+        messagebox.showinfo("成功", f"共计算 {result.total} 种药物，{result.changed} 种的下次需买药时间已更新")
     
     def on_double_click(self, event):
         """双击编辑"""
@@ -598,6 +675,7 @@ class MedicineManager:
     
     def show_purchase_list(self):
         """显示需要购买药物清单"""
+        from family_medicine.report import purchase_list_html, purchase_list_text
         today = datetime.now()
         
         # 获取用户设置的断药提前检测天数
@@ -606,97 +684,24 @@ class MedicineManager:
         except:
             reminder_days = 2  # 默认值
         
-        # 计算提醒日期（当前日期 + 提前天数）
-        reminder_date = today + timedelta(days=reminder_days)
-        
-        # 查询所有过期和即将过期的药物（包括已过期的）
-        self.cursor.execute('''
-            SELECT name_spec, user_name, next_purchase_date, notes
-            FROM medicines 
-            WHERE next_purchase_date <= ?
-            ORDER BY next_purchase_date
-        ''', (reminder_date.strftime('%Y-%m-%d'),))
-        
-        medicines = self.cursor.fetchall()
-        
-        if medicines:
-            # 创建详细清单文本
-            list_text = "=== 需要购买药物清单 ===\n\n"
-            list_text += f"检查时间: {today.strftime('%Y-%m-%d %H:%M:%S')}\n"
-            list_text += f"断药提前检测天数: {reminder_days}天\n"
-            list_text += f"需要购买的药物数量: {len(medicines)}\n\n"
-            
-            # 按状态分类
-            expired_medicines = []
-            today_medicines = []
-            tomorrow_medicines = []
-            other_medicines = []
-            
-            for medicine in medicines:
-                name = medicine[0]  # name_spec
-                user_name = medicine[1]  # user_name (在查询结果中的位置)
-                next_date = medicine[2]  # next_purchase_date
-                notes = medicine[3] or ""  # notes
-                
-                next_dt = datetime.strptime(next_date, '%Y-%m-%d')
-                days_left = (next_dt - today).days
-                
-                if days_left < 0:
-                    expired_medicines.append((name, user_name, next_date, days_left, notes))
-                elif days_left == 0:
-                    today_medicines.append((name, user_name, next_date, days_left, notes))
-                elif days_left == 1:
-                    tomorrow_medicines.append((name, user_name, next_date, days_left, notes))
-                else:
-                    other_medicines.append((name, user_name, next_date, days_left, notes))
-            
-            # 显示已过期的药物
-            if expired_medicines:
-                list_text += "🚨 已过期的药物:\n"
-                for name, user_name, next_date, days_left, notes in expired_medicines:
-                    list_text += f"   • {name} (使用人: {user_name})\n"
-                    list_text += f"     断药时间: {next_date} (已过期{abs(days_left)}天)\n"
-                    if notes:
-                        list_text += f"     备注: {notes}\n"
-                    list_text += "\n"
-            
-            # 显示今天需要购买的药物
-            if today_medicines:
-                list_text += "⚠️ 今天需要购买的药物:\n"
-                for name, user_name, next_date, days_left, notes in today_medicines:
-                    list_text += f"   • {name} (使用人: {user_name})\n"
-                    list_text += f"     断药时间: {next_date}\n"
-                    if notes:
-                        list_text += f"     备注: {notes}\n"
-                    list_text += "\n"
-            
-            # 显示明天需要购买的药物
-            if tomorrow_medicines:
-                list_text += "📅 明天需要购买的药物:\n"
-                for name, user_name, next_date, days_left, notes in tomorrow_medicines:
-                    list_text += f"   • {name} (使用人: {user_name})\n"
-                    list_text += f"     断药时间: {next_date}\n"
-                    if notes:
-                        list_text += f"     备注: {notes}\n"
-                    list_text += "\n"
-            
-            # 显示其他即将用完的药物
-            if other_medicines:
-                list_text += "📋 即将用完的药物:\n"
-                for name, user_name, next_date, days_left, notes in other_medicines:
-                    list_text += f"   • {name} (使用人: {user_name})\n"
-                    list_text += f"     断药时间: {next_date} (还有{days_left}天)\n"
-                    if notes:
-                        list_text += f"     备注: {notes}\n"
-                    list_text += "\n"
+        # 查询所有过期和即将过期的药物（包括已过期的），分组和数量由SQL一次算好
+        report = self.repo.due_report(to_day(today), reminder_days)
+        
+        if report.total:
+            # 按模板生成清单（纯文本用于显示和复制，HTML用于保存）
+            list_text = purchase_list_text(report, today)
             
             # 显示滚动提醒窗口
-            self.show_scrolled_reminder("需要购买药物清单", list_text)
+            self.show_scrolled_reminder("需要购买药物清单", list_text,
+                                        make_html=lambda: purchase_list_html(report, today))
         else:
             messagebox.showinfo("药物清单", "当前没有需要购买的药物！\n\n所有药物的购买时间都在未来。")
     
+    @timed('ui.check_reminders')
     def check_reminders(self):
         """检查提醒"""
+        from family_medicine.notify import notification
+        from family_medicine.report import reminder_text
         today = datetime.now()
         
         # 获取用户设置的断药提前检测天数
@@ -705,69 +710,52 @@ class MedicineManager:
         except:
             reminder_days = 2  # 默认值
         
-        # 计算提醒日期（当前日期 + 提前天数）
-        reminder_date = today + timedelta(days=reminder_days)
-        
-        # 查询所有过期和即将过期的药物（包括已过期的）
-        self.cursor.execute('''
-            SELECT name_spec, user_name, next_purchase_date 
-            FROM medicines 
-            WHERE next_purchase_date <= ?
-            ORDER BY next_purchase_date
-        ''', (reminder_date.strftime('%Y-%m-%d'),))
-        
-        medicines = self.cursor.fetchall()
-        
-        print(f"提醒检查: 找到 {len(medicines)} 种需要提醒的药物")
-        
-        if medicines:
-            reminder_text = "以下药物需要购买：\n\n"
-            for medicine in medicines:
-                name = medicine[0]  # name_spec
-                user_name = medicine[1]  # user_name (在查询结果中的位置)
-                next_date = medicine[2]  # next_purchase_date
-                
-                # 计算距离下次购买的天数
-                next_dt = datetime.strptime(next_date, '%Y-%m-%d')
-                days_left = (next_dt - today).days
-                
-                if days_left < 0:
-                    status = f"已过期{days_left}天"
-                elif days_left == 0:
-                    status = "今天需要购买"
-                elif days_left == 1:
-                    status = "明天需要购买"
-                else:
-                    status = f"还有{days_left}天"
-                
-                reminder_text += f"• {name} (使用人: {user_name})\n"
-                reminder_text += f"  断药时间: {next_date} ({status})\n\n"
-            
-            print("显示提醒弹窗...")
-            # 在主线程中显示滚动提醒
-            self.root.after(0, lambda: self.show_scrolled_reminder("买药提醒", reminder_text))
-    
-    def show_scrolled_reminder(self, title, content):
-        """显示带滚动条的提醒窗口"""
-        # 检查是否已有提醒窗口打开
-        if self.reminder_window_open:
-            print("提醒窗口已打开，跳过重复提醒")
+        # 只查询需要发出的提醒：新进入提醒范围、分组升级或推迟时间已到的药物（已提醒过的不再重复）
+        batch = self.repo.pending_reminders(to_day(today), reminder_days, today)
+        
+        if batch.keys:
+            # 交给通知队列，由后台线程发送到提醒窗口和设置中启用的其他通知方式；
+            # 全部发送成功后才记录为已提醒，失败时下一次提醒检查重新发送
+            def on_done(delivered, keys=batch.keys):
+                if delivered:
+                    self.root.after(0, lambda: self.repo.mark_reminded(keys, today))
+            self.notifier.submit(notification("买药提醒", reminder_text(batch.report), key='reminder'),
+                                 on_done=on_done)
+        elif not self.reminders_restored and any(sink.name == 'dialog' for sink in self.notifier.sinks):
+            # 上次退出时提醒窗口中还没有确认的提醒，只重新显示窗口，不再发送其他通知
+            self.show_reminders("买药提醒")
+        self.reminders_restored = True
+    
+    @timed('ui.show_reminders')
+    def show_reminders(self, title, message=None):
+        """在提醒窗口中显示全部还没有确认的药物，包括通知还在发送中的（由通知队列调用，message 为新提醒的内容）"""
+        from family_medicine.report import reminder_text
+        today = datetime.now()
+        try:
+            reminder_days = int(self.reminder_days_var.get())
+        except ValueError:
+            reminder_days = 2
+        batch = self.repo.open_reminders(to_day(today), reminder_days, today)
+        if batch.keys:
+            self.show_scrolled_reminder(title, reminder_text(batch.report), reminders=batch.keys)
+    
+    def show_scrolled_reminder(self, title, content, make_html=None, reminders=None):
+        """显示带滚动条的提醒窗口，传入 make_html（生成HTML的函数）时可以保存为网页
+
+        窗口是非模态的，打开期间主窗口照常使用；已有提醒窗口时更新其中的内容，不重复弹出。
+        reminders 为窗口中提醒的 ReminderKey 列表：点"确定"关闭窗口即确认这些提醒，点"稍后提醒"推迟。
+        """
+        if self.reminder_window is not None:
+            self.update_scrolled_reminder(title, content, make_html, reminders)
             return
         
-        # 设置提醒窗口状态为打开
-        self.reminder_window_open = True
-        
         # 创建新窗口
         reminder_window = tk.Toplevel(self.root)
         reminder_window.title(title)
         reminder_window.geometry("600x400")
         reminder_window.resizable(True, True)
-        
-        # 设置窗口模态
         reminder_window.transient(self.root)
-        reminder_window.grab_set()
-        
-
+        self.reminder_window = reminder_window
         
         # 创建主框架
         main_frame = ttk.Frame(reminder_window, padding="10")
@@ -782,28 +770,48 @@ class MedicineManager:
             font=("Arial", 10)
         )
         text_widget.pack(fill=tk.BOTH, expand=True, padx=(0, 0), pady=(0, 10))
-        
-        # 插入内容
-        text_widget.insert(tk.END, content)
-        text_widget.config(state=tk.DISABLED)  # 设置为只读
+        self.reminder_text_widget = text_widget
+        self.reminder_content = None
         
         # 创建按钮框架
         button_frame = ttk.Frame(main_frame)
         button_frame.pack(fill=tk.X)
         
-        # 窗口关闭回调函数
-        def on_window_close():
-            self.reminder_window_open = False
+        # 窗口关闭回调函数：确认窗口中的提醒，或推迟 REMINDER_SNOOZE_MINUTES 分钟
+        def on_window_close(snooze=False):
+            reminders, self.reminder_keys = self.reminder_keys, None
+            self.reminder_window = None
             reminder_window.destroy()
+            if reminders:
+                try:
+                    if snooze:
+                        self.repo.snooze_reminders(
+                            reminders, datetime.now() + timedelta(minutes=REMINDER_SNOOZE_MINUTES))
+                    else:
+                        self.repo.acknowledge_reminders(reminders, datetime.now())
+                except Exception as e:
+                    print(f"保存提醒状态失败: {str(e)}")
         
         # 确定按钮
         ok_button = ttk.Button(button_frame, text="确定", command=on_window_close)
         ok_button.pack(side=tk.RIGHT, padx=(5, 0))
         
-        # 复制按钮
-        copy_button = ttk.Button(button_frame, text="复制内容", 
-                                command=lambda: self.copy_to_clipboard(content))
-        copy_button.pack(side=tk.RIGHT, padx=(5, 0))
+        # 稍后提醒按钮（只在显示提醒时显示）
+        self.reminder_snooze_button = ttk.Button(button_frame, text="稍后提醒",
+                                                 command=lambda: on_window_close(snooze=True))
+        self.reminder_snooze_button.pack(side=tk.RIGHT, padx=(5, 0))
+        
+        # 复制按钮（复制窗口中当前显示的内容）
+        self.reminder_copy_button = ttk.Button(button_frame, text="复制内容", 
+                                               command=lambda: self.copy_to_clipboard(self.reminder_content))
+        self.reminder_copy_button.pack(side=tk.RIGHT, padx=(5, 0))
+        
+        # 保存为网页按钮（只在内容可以生成网页时显示）
+        self.reminder_html_button = ttk.Button(button_frame, text="保存为网页",
+                                               command=lambda: self.save_html(self.reminder_make_html()))
+        
+        self.reminder_keys = None
+        self.update_scrolled_reminder(title, content, make_html, reminders)
         
         # 设置焦点到确定按钮
         ok_button.focus_set()
@@ -814,9 +822,41 @@ class MedicineManager:
         
         # 绑定窗口关闭协议
         reminder_window.protocol("WM_DELETE_WINDOW", on_window_close)
-        
-        # 等待窗口关闭
-        reminder_window.wait_window()
+    
+    def update_scrolled_reminder(self, title, content, make_html=None, reminders=None):
+        """更新已打开的提醒窗口的标题和内容，内容有变化时把窗口提到前面"""
+        self.reminder_window.title(title)
+        self.reminder_make_html = make_html
+        self.reminder_keys = reminders
+        if make_html:
+            self.reminder_html_button.pack(side=tk.RIGHT, padx=(5, 0))
+        else:
+            self.reminder_html_button.pack_forget()
+        if reminders:
+            self.reminder_snooze_button.pack(side=tk.RIGHT, padx=(5, 0), before=self.reminder_copy_button)
+        else:
+            self.reminder_snooze_button.pack_forget()
+        if content == self.reminder_content:
+            return
+        self.reminder_content = content
+        self.reminder_text_widget.config(state=tk.NORMAL)
+        self.reminder_text_widget.delete('1.0', tk.END)
+        self.reminder_text_widget.insert(tk.END, content)
+        self.reminder_text_widget.config(state=tk.DISABLED)  # 设置为只读
+        self.reminder_window.lift()
+    
+    def save_html(self, content):
+        """把报告保存为HTML网页"""
+        path = filedialog.asksaveasfilename(title="保存为网页", defaultextension=".html",
+                                            filetypes=[("HTML文件", "*.html")])
+        if not path:
+            return
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            messagebox.showinfo("提示", f"已保存到:\n{path}")
+        except OSError as e:
+            messagebox.showerror("错误", f"保存失败: {str(e)}")
     
     def copy_to_clipboard(self, text):
         """复制文本到剪贴板"""
@@ -828,96 +868,98 @@ class MedicineManager:
             messagebox.showerror("错误", f"复制失败: {str(e)}")
     
     def get_reminder_interval(self):
-        """获取提醒间隔时间（在主线程中调用）"""
+        """获取提醒间隔时间（从设置服务的内存中读取，默认5分钟）"""
+        return self.settings.get_int('reminder_interval', 5)
+    
+    def start_notifier(self):
+        """创建通知队列：提醒窗口和设置（notify_sinks）中启用的桌面通知、邮件、通知文件"""
+        from family_medicine.notify import DialogSink, NotificationQueue, build_sinks
+        dialog = DialogSink(lambda fn: self.root.after(0, fn), self.show_reminders)
         try:
-            self.cursor.execute('SELECT setting_value FROM settings WHERE setting_name = ?', ('reminder_interval',))
-            result = self.cursor.fetchone()
-            if result:
-                return int(result[0])
-            else:
-                return 5  # 默认5分钟
-        except Exception as e:
-            print(f"获取提醒间隔时间出错: {str(e)}")
-            return 5  # 默认5分钟
+            sinks = build_sinks(self.settings.get, default='dialog', dialog=dialog)
+        except ValueError as e:
+            print(f"通知设置有误，只使用提醒窗口: {str(e)}")
+            sinks = [dialog]
+        self.notifier = NotificationQueue(sinks)
     
     def start_reminder_thread(self):
-        """启动提醒线程"""
-        def reminder_loop():
-            # 在提醒线程中创建新的数据库连接
-            import os
-            home_dir = os.path.expanduser("~")
-            db_dir = os.path.join(home_dir, ".family-medicine-manager")
-            db_path = os.path.join(db_dir, "medicine.db")
-            
-            try:
-                thread_conn = sqlite3.connect(db_path)
-                thread_cursor = thread_conn.cursor()
-            except Exception as e:
-                print(f"提醒线程创建数据库连接失败: {str(e)}")
-                thread_conn = None
-                thread_cursor = None
-            
-            # 启动时立即检查一次
-            self.root.after(0, self.check_reminders)
-            
-            # 获取初始间隔时间
-            interval_minutes = 5  # 默认值
-            if thread_cursor:
-                try:
-                    thread_cursor.execute('SELECT setting_value FROM settings WHERE setting_name = ?', ('reminder_interval',))
-                    result = thread_cursor.fetchone()
-                    if result:
-                        interval_minutes = int(result[0])
-                        print(f"提醒线程: 当前间隔时间设置为 {interval_minutes}分钟")
-                    else:
-                        print(f"提醒线程: 数据库中未找到reminder_interval设置，使用默认间隔时间 {interval_minutes}分钟")
-                except Exception as e:
-                    print(f"提醒线程: 读取设置时出错 {str(e)}，使用默认间隔时间 {interval_minutes}分钟")
-            
-            while True:
-                try:
-                    interval_seconds = interval_minutes * 60
-                    
-                    # 分段睡眠，每10秒检查一次设置是否变化
-                    sleep_chunks = interval_seconds // 10
-                    for _ in range(sleep_chunks):
-                        time.sleep(10)
-                        # 检查设置是否发生变化
-                        if thread_cursor:
-                            try:
-                                thread_cursor.execute('SELECT setting_value FROM settings WHERE setting_name = ?', ('reminder_interval',))
-                                result = thread_cursor.fetchone()
-                                new_interval_minutes = int(result[0]) if result else 5
-                                if new_interval_minutes != interval_minutes:
-                                    print(f"检测到提醒间隔设置变化: {interval_minutes}分钟 -> {new_interval_minutes}分钟")
-                                    interval_minutes = new_interval_minutes  # 更新当前间隔时间
-                                    print(f"提醒线程: 更新间隔时间设置为 {interval_minutes}分钟")
-                                    break  # 跳出循环，重新开始
-                            except Exception as e:
-                                print(f"提醒线程: 检查设置变化时出错 {str(e)}")
-                    
-                    # 在主线程中执行提醒检查
-                    self.root.after(0, self.check_reminders)
-                except Exception as e:
-                    print(f"提醒检查出错: {str(e)}")
-                    time.sleep(60)  # 出错时等待1分钟再试
-            
-            # 关闭线程数据库连接
-            if thread_conn:
-                thread_conn.close()
-        
-        reminder_thread = threading.Thread(target=reminder_loop, daemon=True)
-        reminder_thread.start()
-        print("提醒线程已启动")
-    
-    def __del__(self):
-        """析构函数，关闭数据库连接"""
-        if hasattr(self, 'conn'):
-            self.conn.close()
+        """启动提醒调度线程（事件驱动，空闲时不访问数据库，启动时立即检查一次）"""
+        from family_medicine.scheduler import ReminderScheduler
+        self.start_notifier()
+        try:
+            reminder_days = int(self.reminder_days_var.get())
+        except ValueError:
+            reminder_days = 2
+        interval_minutes = self.get_reminder_interval()
+        self.scheduler = ReminderScheduler(self.repo,
+                                           on_due=lambda: self.root.after(0, self.check_reminders),
+                                           reminder_days=reminder_days,
+                                           interval_minutes=interval_minutes)
+        # 设置变化时由设置服务通知调度线程
+        self.settings.subscribe(self.scheduler.settings_changed, names=('reminder_days', 'reminder_interval'))
+        self.scheduler.start()
+    
+    def show_diagnostics(self):
+        """显示各操作的耗时统计（诊断信息窗口，已打开时提到前面）"""
+        from family_medicine.ui.diagnostics import DiagnosticsWindow
+        if self.diagnostics_window is not None and self.diagnostics_window.winfo_exists():
+            self.diagnostics_window.lift()
+            return
+        self.diagnostics_window = DiagnosticsWindow(self.root, self.trace)
+    
+    def close_when_idle(self):
+        """后台任务全部结束后关闭主窗口"""
+        from family_medicine.ui.progress import running_tasks
+        if running_tasks():
+            self.root.after(CLOSE_POLL_MS, self.close_when_idle)
+        else:
+            self.on_close()
+    
+    def on_close(self):
+        """关闭主窗口：停止后台线程，关闭全部数据库连接后退出
+
+        导入、导出等后台任务仍在使用数据库时先等它们结束（不能在界面线程中 join，
+        任务线程的进度更新要由界面线程处理），再关闭连接。
+        """
+        from family_medicine.ui.progress import running_tasks
+        if running_tasks():
+            if not self.close_pending and messagebox.askyesno("确认", "导入、导出或重新计算仍在进行，完成后自动退出吗？"):
+                self.close_pending = True
+                self.close_when_idle()
+            return
+        if self.search_after_id:
+            self.root.after_cancel(self.search_after_id)
+        # 窗口刚显示、还没有启动提醒线程时也可以关闭
+        if hasattr(self, 'scheduler'):
+            self.scheduler.stop()
+            # 最多等1秒发送剩余的通知
+            self.notifier.close(timeout=1)
+        if self.search_worker is not None:
+            self.search_worker.stop()
+        # 写入尚未保存的设置后再关闭数据库
+        self.settings.close()
+        self.repo.close()
+        # 设置了环境变量 FAMILY_MEDICINE_METRICS 时导出耗时统计
+        dump_if_requested(startup_ms={stage: round(elapsed, 1) for stage, elapsed in self.trace.marks})
+        if self.profiler:
+            self.profiler.close()
+        self.root.destroy()
 
 def main():
+    # 设置环境变量 FAMILY_MEDICINE_TRACE_STARTUP=1 可以输出启动各阶段耗时
+    trace = StartupTrace(STARTED)
+    trace.mark("导入模块")
+    profiler = None
+    if PROFILE:
+        from family_medicine.profiling import ActionProfiler
+        profiler = ActionProfiler()
+        # 按钮命令在创建界面时绑定，要在创建窗口之前替换
+        profiler.instrument(MedicineManager)
+        print(f"性能分析已开启，结果保存在: {profiler.directory}")
     root = tk.Tk()
-    app = MedicineManager(root)
+    app = MedicineManager(root, trace, profiler)
+    trace.mark("创建界面")
+    app.start()
     root.mainloop()
 
 if __name__ == "__main__":